@@ -1,14 +1,226 @@
+import re
+import sys
+import json
+import time
+import queue
+import random
+import bisect
 import sqlite3
+import logging
 import functools
-"from datetime import datetime"
+import inspect
+import threading
+import logging.handlers
+
+logger = logging.getLogger("query_log")
+
+_LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_IN_LISTS = re.compile(r"\(\s*\?(?:\s*,\s*\?)*\s*\)")
+_SPACES = re.compile(r"\s+")
+
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+def fingerprint(query):
+    """Normalize a query so calls differing only in literals group together."""
+    query = _LITERALS.sub("?", query)
+    query = _IN_LISTS.sub("(?+)", query)
+    return _SPACES.sub(" ", query).strip().rstrip(";").rstrip()
+
+class LatencyHistogram:
+    """Bucketed latencies (seconds) of one query fingerprint."""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.errors = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.rows = 0
+
+    def add(self, seconds, rows, failed=False):
+        self.counts[bisect.bisect_left(self.buckets, seconds)] += 1
+        self.count += 1
+        self.errors += failed
+        self.total += seconds
+        self.rows += rows
+        if seconds > self.max:
+            self.max = seconds
+
+    def quantile(self, q):
+        """Upper bucket bound below which a fraction ``q`` of calls fell."""
+        target = q * self.count
+        seen = 0
+        for bound, count in zip(self.buckets + (float("inf"),), self.counts):
+            seen += count
+            if seen >= target:
+                return min(bound, self.max)
+        return self.max
+
+    def as_dict(self):
+        return {
+            "count": self.count,
+            "errors": self.errors,
+            "rows": self.rows,
+            "total_seconds": self.total,
+            "mean_seconds": self.total / self.count if self.count else 0.0,
+            "p50_seconds": self.quantile(0.5),
+            "p99_seconds": self.quantile(0.99),
+            "max_seconds": self.max,
+            "buckets": dict(zip([f"le_{bound}" for bound in self.buckets] + ["inf"],
+                                self.counts)),
+        }
+
+class QueryProfiler:
+    """Per-fingerprint latency histograms plus sampled structured logging.
+
+    Every call is added to the histograms. A fraction ``sample_rate`` of the
+    calls is logged at DEBUG; calls slower than ``slow_threshold`` seconds
+    (or failing) are always logged at WARNING. Log records carry the event
+    dict as ``record.query_event``.
+    """
+
+    def __init__(self, sample_rate=1.0, slow_threshold=0.1, buckets=DEFAULT_BUCKETS,
+                 log=logger):
+        self.sample_rate = sample_rate
+        self.slow_threshold = slow_threshold
+        self.buckets = buckets
+        self.log = log
+        self._histograms = {}
+        self._fingerprints = {}
+        self._lock = threading.Lock()
+
+    def fingerprint(self, query):
+        cached = self._fingerprints.get(query)
+        if cached is None:
+            if len(self._fingerprints) > 10000:
+                self._fingerprints.clear()
+            cached = self._fingerprints[query] = fingerprint(query)
+        return cached
+
+    def record(self, query, params, seconds, rows, error=None):
+        key = self.fingerprint(query)
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = LatencyHistogram(self.buckets)
+            histogram.add(seconds, rows, error is not None)
+        slow = error is not None or (
+            self.slow_threshold is not None and seconds >= self.slow_threshold)
+        if not slow and (self.sample_rate <= 0 or (
+                self.sample_rate < 1 and random.random() >= self.sample_rate)):
+            return
+        level = logging.WARNING if slow else logging.DEBUG
+        if not self.log.isEnabledFor(level):
+            return
+        event = {
+            "fingerprint": key,
+            "params": len(params) if params is not None else 0,
+            "seconds": round(seconds, 6),
+            "rows": rows,
+        }
+        if error is not None:
+            event["error"] = repr(error)
+        self.log.log(level, "slow query" if slow else "query",
+                     extra={"query_event": event})
+
+    def histograms(self):
+        """Return ``{fingerprint: histogram dict}`` for every query seen."""
+        with self._lock:
+            return {key: histogram.as_dict() for key, histogram in self._histograms.items()}
+
+    def dump(self, file=None):
+        """Write the histograms as JSON, slowest total time first."""
+        stats = sorted(self.histograms().items(),
+                       key=lambda item: item[1]["total_seconds"], reverse=True)
+        json.dump(dict(stats), file or sys.stdout, indent=2)
+
+    def reset(self):
+        with self._lock:
+            self._histograms.clear()
+
+query_profiler = QueryProfiler()
+
+class JsonFormatter(logging.Formatter):
+    """Format query log records as one JSON object per line."""
+
+    def format(self, record):
+        event = dict(getattr(record, "query_event", {}))
+        event.update(time=record.created, level=record.levelname, message=record.getMessage())
+        return json.dumps(event)
+
+def start_logging(*handlers):
+    """Route ``query_log`` records through a queue to ``handlers`` (default:
+    JSON lines on stderr) on a background thread; returns the listener."""
+    if not handlers:
+        handler = logging.StreamHandler()
+        handler.setFormatter(JsonFormatter())
+        handlers = (handler,)
+    records = queue.SimpleQueue()
+    listener = logging.handlers.QueueListener(records, *handlers,
+                                              respect_handler_level=True)
+    for handler in list(logger.handlers):
+        if isinstance(handler, logging.handlers.QueueHandler):
+            logger.removeHandler(handler)
+    logger.addHandler(logging.handlers.QueueHandler(records))
+    logger.propagate = False
+    listener.start()
+    return listener
+
+def _row_count(result):
+    if result is None:
+        return 0
+    if isinstance(result, list):
+        return len(result)
+    return 1
+
+def query_arguments(args, kwargs, name=""):
+    """Return ``(query, params)`` of a call. A leading connection (passed by
+    ``with_db_connection``) is skipped; ``name`` stands in for the query of
+    functions that do not take one."""
+    if args and hasattr(args[0], "cursor"):
+        args = args[1:]
+    if "query" in kwargs:
+        query, params = kwargs["query"], kwargs.get("params")
+    else:
+        query = args[0] if args else None
+        params = kwargs.get("params", args[1] if len(args) > 1 else None)
+    return (query if isinstance(query, str) else name), params
+
+def log_queries(func=None, *, profiler=None):
+    """Decorator that profiles SQL queries: fingerprint, parameter count,
+    wall time and row count, recorded in ``profiler`` (default: the module's
+    ``query_profiler``)."""
+    if func is None:
+        return functools.partial(log_queries, profiler=profiler)
+    active = query_profiler if profiler is None else profiler
+    name = func.__qualname__
+
+    if inspect.iscoroutinefunction(func):
+        @functools.wraps(func)
+        async def async_wrapper(*args, **kwargs):
+            query, params = query_arguments(args, kwargs, name)
+            start = time.perf_counter()
+            try:
+                result = await func(*args, **kwargs)
+            except Exception as error:
+                active.record(query, params, time.perf_counter() - start, 0, error)
+                raise
+            active.record(query, params, time.perf_counter() - start, _row_count(result))
+            return result
+        return async_wrapper
 
-def log_queries(func):
-    """Decorator that logs SQL queries before execution."""
     @functools.wraps(func)
     def wrapper(*args, **kwargs):
-        query = kwargs.get("query", args[0] if args else "")
-        print(f"[LOG] Executing SQL Query: {query}")
-        return func(*args, **kwargs)
+        query, params = query_arguments(args, kwargs, name)
+        start = time.perf_counter()
+        try:
+            result = func(*args, **kwargs)
+        except Exception as error:
+            active.record(query, params, time.perf_counter() - start, 0, error)
+            raise
+        active.record(query, params, time.perf_counter() - start, _row_count(result))
+        return result
     return wrapper
 
 @log_queries
@@ -20,6 +232,11 @@ def fetch_all_users(query):
     conn.close()
     return results
 
-# Test run
-users = fetch_all_users(query="SELECT * FROM users")
-print(users)
+if __name__ == "__main__":
+    # Test run
+    logger.setLevel(logging.DEBUG)
+    listener = start_logging()
+    users = fetch_all_users(query="SELECT * FROM users")
+    print(users)
+    listener.stop()
+    query_profiler.dump()
@@ -1,15 +1,19 @@
-import sqlite3
 import functools
+import inspect
+from db_pool import get_async_pool, get_pool
 
 def with_db_connection(func):
     """Decorator that handles opening and closing database connections."""
+    if inspect.iscoroutinefunction(func):
+        @functools.wraps(func)
+        async def async_wrapper(*args, **kwargs):
+            async with get_async_pool().connection() as conn:
+                return await func(conn, *args, **kwargs)
+        return async_wrapper
     @functools.wraps(func)
     def wrapper(*args, **kwargs):
-        conn = sqlite3.connect('users.db')
-        try:
+        with get_pool().connection() as conn:
             return func(conn, *args, **kwargs)
-        finally:
-            conn.close()
     return wrapper
 
 @with_db_connection
@@ -18,6 +22,7 @@ def get_user_by_id(conn, user_id):
     cursor.execute("SELECT * FROM users WHERE id = ?", (user_id,))
     return cursor.fetchone()
 
-# Test run
-user = get_user_by_id(user_id=1)
-print(user)
+if __name__ == "__main__":
+    # Test run
+    user = get_user_by_id(user_id=1)
+    print(user)
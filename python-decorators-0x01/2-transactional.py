@@ -1,28 +1,333 @@
-import sqlite3
+import queue
+import time
 import functools
+import inspect
+import threading
+from concurrent.futures import Future
+from db_pool import DEFAULT_PRAGMAS, SQLitePool, get_async_pool, get_pool
 
 def with_db_connection(func):
+    if inspect.iscoroutinefunction(func):
+        @functools.wraps(func)
+        async def async_wrapper(*args, **kwargs):
+            async with get_async_pool().connection() as conn:
+                return await func(conn, *args, **kwargs)
+        return async_wrapper
     @functools.wraps(func)
     def wrapper(*args, **kwargs):
-        conn = sqlite3.connect('users.db')
-        try:
+        with get_pool().connection() as conn:
             return func(conn, *args, **kwargs)
-        finally:
-            conn.close()
     return wrapper
 
-def transactional(func):
-    """Decorator for automatic commit/rollback of database transactions."""
+class _Operation:
+    __slots__ = ("func", "args", "kwargs", "durable", "future")
+
+    def __init__(self, func, args, kwargs, durable):
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+        self.durable = durable
+        self.future = Future()
+
+_STOP = object()
+
+# Nesting depth of transactional calls per connection, keyed by id(conn)
+# (sqlite3 connections cannot be weakly referenced). Depth 0 is the
+# outermost call, which owns BEGIN/COMMIT; deeper calls use savepoints.
+_depths = {}
+
+def transaction_depth(conn):
+    return _depths.get(id(conn), 0)
+
+class GroupCommitter:
+    """Run transactional operations on one writer thread, many per commit.
+
+    Operations queued while the writer is busy (plus any arriving within
+    ``window`` seconds, up to ``max_batch`` in all) share one transaction:
+    each runs inside its own SAVEPOINT, so a failing operation is rolled
+    back alone, and all of them are committed together. Every caller gets
+    its own result or exception once the commit is done. A ``durable``
+    operation ends the batch at once and is committed with
+    ``PRAGMA synchronous=FULL`` (a no-op unless ``pragmas`` lower it, e.g.
+    ``db_pool.WAL_PRAGMAS``). If the writer thread fails (say the database
+    cannot be opened), everything it was given fails with that error and
+    the next ``submit`` starts a new writer.
+    """
+
+    def __init__(self, database="users.db", max_batch=64, window=0.0,
+                 pragmas=DEFAULT_PRAGMAS):
+        self.database = database
+        self.max_batch = max_batch
+        self.window = window
+        self.pragmas = pragmas
+        self._operations = queue.Queue()
+        self._thread = None
+        self._batch = []
+        self._writer = threading.local()
+        self._lock = threading.Lock()
+        self._counters = {"operations": 0, "batches": 0, "failed_commits": 0,
+                          "largest_batch": 0, "durable_batches": 0,
+                          "writer_failures": 0}
+
+    def submit(self, func, args=(), kwargs=None, durable=False):
+        """Queue ``func(conn, *args, **kwargs)``; returns a Future."""
+        operation = _Operation(func, args, kwargs or {}, durable)
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, daemon=True,
+                                                name="group-commit")
+                self._thread.start()
+            self._operations.put(operation)
+        return operation.future
+
+    def close(self):
+        """Commit everything queued so far and stop the writer thread."""
+        with self._lock:
+            thread, self._thread = self._thread, None
+            if thread is not None:
+                self._operations.put(_STOP)
+        if thread is not None:
+            thread.join()
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._counters)
+        stats["mean_batch"] = (stats["operations"] / stats["batches"]
+                               if stats["batches"] else 0.0)
+        return stats
+
+    def _run(self):
+        # Whatever kills the writer fails every operation it was given and
+        # lets the next submit() start a fresh one.
+        try:
+            pool = SQLitePool(self.database, size=1, pragmas=self.pragmas,
+                              isolation_level=None)
+            try:
+                conn = pool.acquire()
+                try:
+                    self._serve(conn)
+                finally:
+                    pool.release(conn)
+            finally:
+                pool.close()
+        except BaseException as error:
+            self._abort(error)
+
+    def writer_connection(self):
+        """The writer's connection when called from an operation running on
+        the writer thread, else None."""
+        return getattr(self._writer, "connection", None)
+
+    def _serve(self, conn):
+        self._writer.connection = conn
+        synchronous = conn.execute("PRAGMA synchronous").fetchone()[0]
+        stopping = False
+        while not stopping:
+            operation = self._operations.get()
+            if operation is _STOP:
+                break
+            self._batch = batch = [operation]
+            deadline = time.monotonic() + self.window
+            while len(batch) < self.max_batch and not batch[-1].durable:
+                remaining = deadline - time.monotonic()
+                try:
+                    if remaining > 0:
+                        operation = self._operations.get(timeout=remaining)
+                    else:
+                        operation = self._operations.get_nowait()
+                except queue.Empty:
+                    break
+                if operation is _STOP:
+                    stopping = True
+                    break
+                batch.append(operation)
+            self._commit(conn, batch, synchronous)
+            self._batch = []
+
+    def _abort(self, error):
+        failed = [operation for operation in self._batch if not operation.future.done()]
+        self._batch = []
+        with self._lock:
+            # close() may have detached this thread already: then only the
+            # operations queued before its _STOP are ours.
+            owner = self._thread is threading.current_thread()
+            if owner:
+                self._thread = None
+            while True:
+                try:
+                    operation = self._operations.get_nowait()
+                except queue.Empty:
+                    break
+                if operation is _STOP:
+                    if owner:
+                        continue
+                    break
+                failed.append(operation)
+            self._counters["writer_failures"] += 1
+        for operation in failed:
+            operation.future.set_exception(error)
+
+    def _commit(self, conn, batch, synchronous):
+        durable = any(operation.durable for operation in batch)
+        # Only switch when the connection runs below FULL (2).
+        switch = durable and synchronous < 2
+        outcomes = []
+        try:
+            if switch:
+                conn.execute("PRAGMA synchronous=FULL")
+            conn.execute("BEGIN IMMEDIATE")
+            _depths[id(conn)] = 1
+            for operation in batch:
+                conn.execute("SAVEPOINT group_operation")
+                try:
+                    value = operation.func(conn, *operation.args, **operation.kwargs)
+                except BaseException as e:
+                    conn.execute("ROLLBACK TO group_operation")
+                    conn.execute("RELEASE group_operation")
+                    outcomes.append((False, e))
+                else:
+                    conn.execute("RELEASE group_operation")
+                    outcomes.append((True, value))
+            conn.execute("COMMIT")
+        except Exception as e:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            outcomes = [(False, e)] * len(batch)
+            failed = True
+        else:
+            failed = False
+        finally:
+            _depths.pop(id(conn), None)
+            if switch:
+                conn.execute(f"PRAGMA synchronous={synchronous}")
+        with self._lock:
+            self._counters["operations"] += len(batch)
+            self._counters["batches"] += 1
+            self._counters["failed_commits"] += failed
+            self._counters["durable_batches"] += durable
+            self._counters["largest_batch"] = max(self._counters["largest_batch"],
+                                                  len(batch))
+        for operation, (ok, value) in zip(batch, outcomes):
+            if ok:
+                operation.future.set_result(value)
+            else:
+                operation.future.set_exception(value)
+
+group_committer = GroupCommitter()
+
+def transactional(func=None, *, group=None, durable=False):
+    """Decorator for automatic commit/rollback of database transactions.
+
+    Nested calls on the same connection (stacked decorators, or one
+    transactional function calling another) do not commit: the outermost
+    call begins and commits the transaction, inner calls run inside a
+    SAVEPOINT that is released on success and rolled back on error.
+
+    With ``group=`` a GroupCommitter the decorated function is called without
+    a connection (drop ``with_db_connection``): it runs on the committer's
+    writer and returns once its batch is committed. ``durable=True`` (or
+    calling ``func.durable(...)``) commits without waiting for a batch.
+    Coroutine functions get an aiosqlite version with the same nesting.
+    """
+    if func is None:
+        return functools.partial(transactional, group=group, durable=durable)
+    if inspect.iscoroutinefunction(func):
+        if group is not None:
+            raise TypeError("group commit runs synchronous functions only")
+        return _async_transactional(func)
+    if group is not None:
+        def call(args, kwargs, durable):
+            conn = group.writer_connection()
+            if conn is not None:
+                # Called from an operation of the same committer: waiting for
+                # the writer would deadlock it, so nest in a savepoint there.
+                return run_in_transaction(conn, func, args, kwargs)
+            try:
+                return group.submit(func, args, kwargs, durable).result()
+            except Exception as e:
+                print(f"[ERROR] Transaction failed: {e}")
+                raise
+
+        @functools.wraps(func)
+        def grouped(*args, **kwargs):
+            return call(args, kwargs, durable)
+        grouped.durable = lambda *args, **kwargs: call(args, kwargs, True)
+        return grouped
+
     @functools.wraps(func)
     def wrapper(conn, *args, **kwargs):
+        return run_in_transaction(conn, func, args, kwargs)
+    return wrapper
+
+def run_in_transaction(conn, func, args=(), kwargs=None):
+    """Call ``func(conn, *args, **kwargs)`` as one transactional unit: the
+    outermost unit on ``conn`` commits, nested ones use a savepoint."""
+    kwargs = kwargs or {}
+    key = id(conn)
+    depth = _depths.get(key, 0)
+    if depth:
+        savepoint = f"transactional_{depth}"
+        conn.execute(f"SAVEPOINT {savepoint}")
+        _depths[key] = depth + 1
         try:
             result = func(conn, *args, **kwargs)
-            conn.commit()
+        except BaseException:
+            conn.execute(f"ROLLBACK TO {savepoint}")
+            conn.execute(f"RELEASE {savepoint}")
+            raise
+        else:
+            conn.execute(f"RELEASE {savepoint}")
+            return result
+        finally:
+            _depths[key] = depth
+    if not conn.in_transaction:
+        conn.execute("BEGIN")
+    _depths[key] = 1
+    try:
+        result = func(conn, *args, **kwargs)
+        conn.commit()
+        return result
+    except Exception as e:
+        conn.rollback()
+        print(f"[ERROR] Transaction failed: {e}")
+        raise
+    finally:
+        del _depths[key]
+
+def _async_transactional(func):
+    # aiosqlite counterpart of the per-call wrapper, with the same nesting.
+    @functools.wraps(func)
+    async def wrapper(conn, *args, **kwargs):
+        key = id(conn)
+        depth = _depths.get(key, 0)
+        if depth:
+            savepoint = f"transactional_{depth}"
+            await conn.execute(f"SAVEPOINT {savepoint}")
+            _depths[key] = depth + 1
+            try:
+                result = await func(conn, *args, **kwargs)
+            except BaseException:
+                await conn.execute(f"ROLLBACK TO {savepoint}")
+                await conn.execute(f"RELEASE {savepoint}")
+                raise
+            else:
+                await conn.execute(f"RELEASE {savepoint}")
+                return result
+            finally:
+                _depths[key] = depth
+        if not conn.in_transaction:
+            await conn.execute("BEGIN")
+        _depths[key] = 1
+        try:
+            result = await func(conn, *args, **kwargs)
+            await conn.commit()
             return result
         except Exception as e:
-            conn.rollback()
+            await conn.rollback()
             print(f"[ERROR] Transaction failed: {e}")
             raise
+        finally:
+            del _depths[key]
     return wrapper
 
 @with_db_connection
@@ -31,5 +336,13 @@ def update_user_email(conn, user_id, new_email):
     cursor = conn.cursor()
     cursor.execute("UPDATE users SET email = ? WHERE id = ?", (new_email, user_id))
 
-# Test run
-update_user_email(user_id=1, new_email='Crawford_Cartwright@hotmail.com')
+@transactional(group=group_committer)
+def update_user_email_grouped(conn, user_id, new_email):
+    cursor = conn.cursor()
+    cursor.execute("UPDATE users SET email = ? WHERE id = ?", (new_email, user_id))
+
+if __name__ == "__main__":
+    # Test run
+    update_user_email(user_id=1, new_email='Crawford_Cartwright@hotmail.com')
+    update_user_email_grouped(user_id=1, new_email='Crawford_Cartwright@hotmail.com')
+    group_committer.close()
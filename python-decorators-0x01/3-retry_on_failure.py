@@ -1,31 +1,293 @@
 import time
+import asyncio
+import random
 import sqlite3
 import functools
+import inspect
+import threading
+from db_pool import get_async_pool, get_pool
+
+# MySQL: deadlock, lock wait timeout, server gone away, lost connection.
+RETRYABLE_ERRNOS = {1205, 1213, 2006, 2013}
+RETRYABLE_MESSAGES = ("database is locked", "database is busy", "database table is locked",
+                      "deadlock", "lock wait timeout", "server has gone away",
+                      "lost connection")
+
+def is_retryable(error):
+    """True for transient errors worth retrying (locks, deadlocks, dropped
+    connections); False for everything else, e.g. syntax errors."""
+    if isinstance(error, (ConnectionError, TimeoutError)):
+        return True
+    if getattr(error, "errno", None) in RETRYABLE_ERRNOS:
+        return True
+    if isinstance(error, sqlite3.OperationalError) or type(error).__name__ in (
+            "OperationalError", "InternalError"):
+        message = str(error).lower()
+        return any(text in message for text in RETRYABLE_MESSAGES)
+    return False
+
+class CircuitOpenError(Exception):
+    """The circuit breaker is open: the database is failing, calls fail fast."""
+
+class RetryBudget:
+    """Token bucket shared by every function using it.
+
+    Each call deposits ``ratio`` tokens (up to ``capacity``) and each retry
+    spends one, so retries stay below roughly ``ratio`` of the traffic and a
+    failing database is not hit with ``retries`` times the normal load.
+    """
+
+    def __init__(self, ratio=0.2, capacity=10):
+        self.ratio = ratio
+        self.capacity = capacity
+        self._tokens = float(capacity)
+        self._lock = threading.Lock()
+
+    def deposit(self):
+        with self._lock:
+            self._tokens = min(self.capacity, self._tokens + self.ratio)
+
+    def withdraw(self):
+        with self._lock:
+            if self._tokens < 1:
+                return False
+            self._tokens -= 1
+            return True
+
+    @property
+    def tokens(self):
+        return self._tokens
+
+class CircuitBreaker:
+    """Open after ``failure_threshold`` consecutive retryable failures.
+
+    While open, calls raise CircuitOpenError without touching the database.
+    After ``reset_timeout`` seconds one trial call is let through (half
+    open): success closes the circuit, failure opens it again.
+    """
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0, clock=time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.clock = clock
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = None
+        self._trial = False
+        self._lock = threading.Lock()
+
+    def allow(self):
+        """Raise CircuitOpenError unless a call may go ahead; return True if
+        it is the half-open trial, which must end in ``record_success``,
+        ``record_failure`` or ``release``."""
+        with self._lock:
+            if self.state == "closed":
+                return False
+            if self.state == "open" and self.clock() - self.opened_at >= self.reset_timeout:
+                self.state = "half_open"
+                self._trial = False
+            if self.state == "half_open" and not self._trial:
+                self._trial = True
+                return True
+            raise CircuitOpenError(f"Circuit open after {self.failures} failures")
+
+    def release(self):
+        """Give back the trial of a call that ended without an outcome (e.g.
+        interrupted), so that the next call is let through as the trial."""
+        with self._lock:
+            self._trial = False
+
+    def record_success(self):
+        with self._lock:
+            self.state = "closed"
+            self.failures = 0
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == "half_open" or self.failures >= self.failure_threshold:
+                self.state = "open"
+                self.opened_at = self.clock()
+
+class RetryStats:
+    """Counters for one retrying function."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counters = {
+            "calls": 0,
+            "attempts": 0,
+            "retries": 0,
+            "successes": 0,
+            "failures": 0,
+            "not_retryable": 0,
+            "budget_exhausted": 0,
+            "short_circuited": 0,
+            "sleep_seconds": 0.0,
+            "latency_seconds": 0.0,
+        }
+
+    def add(self, **amounts):
+        with self._lock:
+            for name, amount in amounts.items():
+                self.counters[name] += amount
+
+    def as_dict(self):
+        with self._lock:
+            return dict(self.counters)
+
+retry_budget = RetryBudget()
+circuit_breaker = CircuitBreaker()
+
+def backoff(attempt, delay, max_delay, jitter=True):
+    """Delay before retry ``attempt`` (1-based): exponential, capped, and with
+    full jitter a uniform draw between 0 and that bound."""
+    bound = min(max_delay, delay * 2 ** (attempt - 1))
+    return random.uniform(0, bound) if jitter else bound
 
 def with_db_connection(func):
+    if inspect.iscoroutinefunction(func):
+        @functools.wraps(func)
+        async def async_wrapper(*args, **kwargs):
+            async with get_async_pool().connection() as conn:
+                return await func(conn, *args, **kwargs)
+        return async_wrapper
     @functools.wraps(func)
     def wrapper(*args, **kwargs):
-        conn = sqlite3.connect('users.db')
-        try:
+        with get_pool().connection() as conn:
             return func(conn, *args, **kwargs)
-        finally:
-            conn.close()
     return wrapper
 
-def retry_on_failure(retries=3, delay=1):
-    """Decorator to retry function on failure."""
-    def decorator(func):
-        @functools.wraps(func)
-        def wrapper(*args, **kwargs):
-            for attempt in range(1, retries + 1):
+class RetryPolicy:
+    """Retry loop, budget, breaker and counters for one retrying function.
+
+    Up to ``retries`` attempts, sleeping ``backoff()`` between them. Errors
+    for which ``retryable(error)`` is false are raised at once. Retries draw
+    on ``budget`` and failures feed ``breaker`` (the shared module defaults
+    unless given; pass False to disable).
+    """
+
+    def __init__(self, retries=3, delay=1, max_delay=30, jitter=True,
+                 retryable=is_retryable, budget=None, breaker=None):
+        self.retries = retries
+        self.delay = delay
+        self.max_delay = max_delay
+        self.jitter = jitter
+        self.retryable = retryable
+        self.budget = retry_budget if budget is None else budget
+        self.breaker = circuit_breaker if breaker is None else breaker
+        self.stats = RetryStats()
+
+    def call(self, func, *args, **kwargs):
+        start = time.perf_counter()
+        self._begin()
+        try:
+            for attempt in range(1, self.retries + 1):
+                trial = self._before_attempt()
+                try:
+                    result = func(*args, **kwargs)
+                except Exception as e:
+                    pause = self._failed(e, attempt)
+                except BaseException:
+                    self._abandoned(trial)
+                    raise
+                else:
+                    self._succeeded()
+                    return result
+                time.sleep(pause)
+        finally:
+            self.stats.add(latency_seconds=time.perf_counter() - start)
+
+    async def call_async(self, func, *args, **kwargs):
+        start = time.perf_counter()
+        self._begin()
+        try:
+            for attempt in range(1, self.retries + 1):
+                trial = self._before_attempt()
                 try:
-                    return func(*args, **kwargs)
+                    result = await func(*args, **kwargs)
                 except Exception as e:
-                    print(f"[WARNING] Attempt {attempt} failed: {e}")
-                    if attempt == retries:
-                        print("[ERROR] All retries failed.")
-                        raise
-                    time.sleep(delay)
+                    pause = self._failed(e, attempt)
+                except BaseException:
+                    # Including asyncio.CancelledError, e.g. from wait_for().
+                    self._abandoned(trial)
+                    raise
+                else:
+                    self._succeeded()
+                    return result
+                await asyncio.sleep(pause)
+        finally:
+            self.stats.add(latency_seconds=time.perf_counter() - start)
+
+    def _begin(self):
+        self.stats.add(calls=1)
+        if self.budget:
+            self.budget.deposit()
+
+    def _before_attempt(self):
+        # Returns True if this attempt holds the breaker's half-open trial.
+        trial = False
+        if self.breaker:
+            try:
+                trial = self.breaker.allow()
+            except CircuitOpenError:
+                self.stats.add(short_circuited=1, failures=1)
+                raise
+        self.stats.add(attempts=1)
+        return trial
+
+    def _abandoned(self, trial):
+        # KeyboardInterrupt, SystemExit and the like: no outcome to report.
+        if trial:
+            self.breaker.release()
+        self.stats.add(failures=1)
+
+    def _succeeded(self):
+        if self.breaker:
+            self.breaker.record_success()
+        self.stats.add(successes=1)
+
+    def _failed(self, e, attempt):
+        # Returns the pause before the next attempt, or raises e.
+        if not self.retryable(e):
+            # The database answered, so this says nothing about its health.
+            if self.breaker:
+                self.breaker.record_success()
+            self.stats.add(not_retryable=1, failures=1)
+            raise e
+        if self.breaker:
+            self.breaker.record_failure()
+        print(f"[WARNING] Attempt {attempt} failed: {e}")
+        if attempt == self.retries:
+            print("[ERROR] All retries failed.")
+            self.stats.add(failures=1)
+            raise e
+        if self.budget and not self.budget.withdraw():
+            print("[ERROR] Retry budget exhausted.")
+            self.stats.add(budget_exhausted=1, failures=1)
+            raise e
+        pause = backoff(attempt, self.delay, self.max_delay, self.jitter)
+        self.stats.add(retries=1, sleep_seconds=pause)
+        return pause
+
+def retry_on_failure(retries=3, delay=1, max_delay=30, jitter=True,
+                     retryable=is_retryable, budget=None, breaker=None):
+    """Decorator to retry function on transient failure.
+
+    See RetryPolicy for the options. Counters are on ``wrapper.stats``.
+    Coroutine functions are retried with ``asyncio.sleep``.
+    """
+    def decorator(func):
+        policy = RetryPolicy(retries, delay, max_delay, jitter, retryable, budget, breaker)
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def wrapper(*args, **kwargs):
+                return await policy.call_async(func, *args, **kwargs)
+        else:
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                return policy.call(func, *args, **kwargs)
+        wrapper.stats = policy.stats
         return wrapper
     return decorator
 
@@ -36,6 +298,7 @@ def fetch_users_with_retry(conn):
     cursor.execute("SELECT * FROM users")
     return cursor.fetchall()
 
-# Test run
-users = fetch_users_with_retry()
-print(users)
+if __name__ == "__main__":
+    # Test run
+    users = fetch_users_with_retry()
+    print(users)
@@ -1,32 +1,401 @@
-import sqlite3
+import re
+import sys
+import asyncio
+import time
 import functools
+import inspect
+import threading
+from collections import OrderedDict
+from db_pool import get_async_pool, get_pool
 
-query_cache = {}
+_TABLES = re.compile(r"\b(?:FROM|JOIN|INTO|UPDATE)\s+[`\"\[]?(\w+)", re.IGNORECASE)
+_WRITE = re.compile(r"^\s*(?:INSERT|UPDATE|DELETE|REPLACE)\b", re.IGNORECASE)
+_SPACE_OUTSIDE_QUOTES = re.compile(r"('(?:[^']|'')*'|\"(?:[^\"]|\"\")*\")|\s+")
+
+@functools.lru_cache(maxsize=1024)
+def normalize_query(query):
+    """Collapse whitespace outside string literals and drop a trailing ';'."""
+    query = _SPACE_OUTSIDE_QUOTES.sub(lambda match: match.group(1) or " ", query)
+    return query.strip().rstrip(";").rstrip()
+
+def _freeze(value):
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(item) for item in value)
+    if isinstance(value, dict):
+        return tuple(sorted((key, _freeze(item)) for key, item in value.items()))
+    if isinstance(value, set):
+        return frozenset(_freeze(item) for item in value)
+    return value
+
+def _key(namespace, values, position, others=()):
+    # The argument at ``position`` (-1: none) is the query if it is a string.
+    at = position if position >= 0 and isinstance(values[position], str) else -1
+    query = values[at] if at >= 0 else ""
+    params = _freeze(tuple(value for index, value in enumerate(values) if index != at))
+    key = (namespace, normalize_query(query), params, others)
+    try:
+        hash(key)
+    except TypeError:
+        key = None
+    return query, key
+
+def cache_key(args, kwargs, signature=None, namespace=None):
+    """Return ``(query, key)`` for a call, keyed on ``namespace`` (the
+    decorated function), the normalized query and every other argument (the
+    bound parameters); key is None if unhashable.
+
+    With the decorated function's ``signature`` (first parameter being the
+    connection) the query is the string passed as its ``query`` parameter,
+    if it has one, and positional and keyword spellings of a call share one
+    key. Without it the arguments are taken as ``(query, *params)``.
+    """
+    if signature is not None:
+        try:
+            bound = signature.bind(None, *args, **kwargs)
+        except TypeError:
+            pass
+        else:
+            bound.apply_defaults()
+            names = list(bound.arguments)[1:]
+            values = list(bound.arguments.values())[1:]
+            return _key(namespace, values, names.index("query") if "query" in names else -1)
+    others = tuple(sorted((name, _freeze(value)) for name, value in kwargs.items()
+                          if name != "query"))
+    if "query" in kwargs:
+        return _key(namespace, [kwargs["query"], *args], 0, others)
+    return _key(namespace, list(args), 0 if args else -1, others)
+
+def key_builder(func):
+    """Return ``build(args, kwargs) -> (query, key)`` for calls of ``func``,
+    giving the same keys as ``cache_key`` but resolving the parameter layout
+    once instead of binding the signature on every call."""
+    signature = inspect.signature(func)
+    namespace = f"{func.__module__}.{func.__qualname__}"
+    parameters = list(signature.parameters.values())[1:]
+    if any(parameter.kind is not parameter.POSITIONAL_OR_KEYWORD for parameter in parameters):
+        return lambda args, kwargs: cache_key(args, kwargs, signature, namespace)
+    names = [parameter.name for parameter in parameters]
+    defaults = [parameter.default for parameter in parameters]
+    position = names.index("query") if "query" in names else -1
+    empty = inspect.Parameter.empty
+
+    def build(args, kwargs):
+        if len(args) > len(names) or (kwargs and not kwargs.keys() <= set(names[len(args):])):
+            return cache_key(args, kwargs, signature, namespace)
+        values = list(args)
+        for index in range(len(args), len(names)):
+            values.append(kwargs.get(names[index], defaults[index]) if kwargs
+                          else defaults[index])
+        if any(value is empty for value in values):
+            return cache_key(args, kwargs, signature, namespace)
+        return _key(namespace, values, position)
+    return build
+
+def query_tables(query):
+    """Return the lower-cased table names a query reads or writes."""
+    return frozenset(name.lower() for name in _TABLES.findall(query))
+
+def result_size(value):
+    """Approximate size in bytes of a query result (rows of scalars)."""
+    size = sys.getsizeof(value)
+    if isinstance(value, (list, tuple)):
+        for row in value:
+            size += sys.getsizeof(row)
+            if isinstance(row, (list, tuple)):
+                size += sum(sys.getsizeof(item) for item in row)
+    return size
+
+class QueryCache:
+    """Thread-safe LRU cache of query results.
+
+    Entries are evicted least recently used first once there are more than
+    ``maxsize`` of them or their sizes add up to more than ``maxbytes``, and
+    expire ``ttl`` seconds after being stored. Every entry is tagged with the
+    tables its query reads, so ``invalidate("users")`` drops all of them.
+    """
+
+    def __init__(self, maxsize=128, maxbytes=None, ttl=None, clock=time.monotonic):
+        self.maxsize = maxsize
+        self.maxbytes = maxbytes
+        self.ttl = ttl
+        self.clock = clock
+        self._entries = OrderedDict()
+        self._tags = {}
+        self._bytes = 0
+        self._lock = threading.RLock()
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+        self.coalesced = 0
+        self._flights = {}
+        self._async_flights = {}
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return self.lookup(key, count=False)[0]
+
+    def lookup(self, key, count=True):
+        """Return ``(True, value)`` for a live entry, else ``(False, None)``."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] is not None and entry[1] <= self.clock():
+                self._remove(key)
+                self.expirations += 1
+                entry = None
+            if entry is None:
+                if count:
+                    self.misses += 1
+                return False, None
+            self._entries.move_to_end(key)
+            if count:
+                self.hits += 1
+            return True, entry[0]
+
+    def store(self, key, value, tables=(), ttl=None, generation=None):
+        """Store ``value``; skipped if anything was invalidated since
+        ``generation`` (read before running the query), as it may be stale."""
+        ttl = self.ttl if ttl is None else ttl
+        tables = frozenset(table.lower() for table in tables)
+        size = result_size(value)
+        with self._lock:
+            if generation is not None and generation != self.generation:
+                return
+            if key in self._entries:
+                self._remove(key)
+            if self.maxbytes is not None and size > self.maxbytes:
+                return
+            expires = None if ttl is None else self.clock() + ttl
+            self._entries[key] = (value, expires, size, tables)
+            self._bytes += size
+            for table in tables:
+                self._tags.setdefault(table, set()).add(key)
+            while self._entries and (
+                    (self.maxsize is not None and len(self._entries) > self.maxsize)
+                    or (self.maxbytes is not None and self._bytes > self.maxbytes)):
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def get_or_load(self, key, load, tables=(), ttl=None):
+        """Return ``(hit, value)``, calling ``load()`` on a miss.
+
+        Concurrent misses on the same key are coalesced: one caller runs
+        ``load`` and the others wait for and share its result (or error).
+        """
+        with self._lock:
+            hit, value = self.lookup(key)
+            if hit:
+                return True, value
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+                generation = self.generation
+            else:
+                self.coalesced += 1
+        if not leader:
+            return False, flight.wait()
+        try:
+            flight.value = load()
+        except BaseException as error:
+            flight.error = error
+            raise
+        else:
+            # Stored before the flight is dropped, so a caller arriving in
+            # between finds one or the other and does not load again.
+            self.store(key, flight.value, tables, ttl, generation)
+        finally:
+            with self._lock:
+                del self._flights[key]
+            flight.done.set()
+        return False, flight.value
+
+    async def get_or_load_async(self, key, load, tables=(), ttl=None):
+        """Coroutine version of ``get_or_load``: ``load`` is a coroutine
+        function, and callers on the same event loop share one load. If the
+        loading caller is cancelled, a waiting caller takes over the load
+        instead of being cancelled with it."""
+        loop = asyncio.get_running_loop()
+        while True:
+            with self._lock:
+                hit, value = self.lookup(key)
+                if hit:
+                    return True, value
+                flight = self._async_flights.get((loop, key))
+                leader = flight is None
+                if leader:
+                    flight = self._async_flights[(loop, key)] = loop.create_future()
+                    generation = self.generation
+                else:
+                    self.coalesced += 1
+            if leader:
+                break
+            value = await asyncio.shield(flight)
+            if value is not _ABANDONED:
+                return False, value
+        try:
+            value = await load()
+        except asyncio.CancelledError:
+            flight.set_result(_ABANDONED)
+            raise
+        except BaseException as error:
+            flight.set_exception(error)
+            # Retrieved here so an unawaited flight does not log a warning.
+            flight.exception()
+            raise
+        else:
+            # Stored before the flight is dropped, as in get_or_load.
+            self.store(key, value, tables, ttl, generation)
+            flight.set_result(value)
+        finally:
+            with self._lock:
+                del self._async_flights[(loop, key)]
+        return False, value
+
+    def invalidate(self, *tables):
+        """Drop every entry whose query touches one of ``tables``."""
+        with self._lock:
+            self.generation += 1
+            for table in tables:
+                for key in self._tags.pop(table.lower(), ()):
+                    if key in self._entries:
+                        self._remove(key)
+                        self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._tags.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "invalidations": self.invalidations,
+                "coalesced": self.coalesced,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+            }
+
+    def _remove(self, key):
+        value, expires, size, tables = self._entries.pop(key)
+        self._bytes -= size
+        for table in tables:
+            keys = self._tags.get(table)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tags[table]
+
+# Result of an async flight whose loader was cancelled: waiters retry.
+_ABANDONED = object()
+
+class _Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+    def wait(self):
+        self.done.wait()
+        if self.error is not None:
+            raise self.error
+        return self.value
+
+query_cache = QueryCache(maxsize=256, maxbytes=64 * 1024 * 1024, ttl=300)
 
 def with_db_connection(func):
+    if inspect.iscoroutinefunction(func):
+        @functools.wraps(func)
+        async def async_wrapper(*args, **kwargs):
+            async with get_async_pool().connection() as conn:
+                return await func(conn, *args, **kwargs)
+        return async_wrapper
     @functools.wraps(func)
     def wrapper(*args, **kwargs):
-        conn = sqlite3.connect('users.db')
-        try:
+        with get_pool().connection() as conn:
             return func(conn, *args, **kwargs)
-        finally:
-            conn.close()
     return wrapper
 
-def cache_query(func):
-    """Decorator that caches query results."""
+def cache_query(func=None, *, cache=None, ttl=None, tables=None):
+    """Decorator that caches query results.
+
+    Use bare (``@cache_query``) for the shared ``query_cache`` or with
+    options: ``cache=`` another QueryCache, ``ttl=`` seconds for these
+    entries, ``tables=`` tags to use instead of those parsed from the query.
+    Results are keyed on the function, the normalized query (the ``query``
+    argument) and every other argument, so bound parameters get their own
+    entries; concurrent identical misses run the query once. Write queries
+    run uncached and invalidate the tables they touch.
+    """
+    if func is None:
+        return functools.partial(cache_query, cache=cache, ttl=ttl, tables=tables)
+    cache = query_cache if cache is None else cache
+    build_key = key_builder(func)
+
+    if inspect.iscoroutinefunction(func):
+        @functools.wraps(func)
+        async def async_wrapper(conn, *args, **kwargs):
+            query, key = build_key(args, kwargs)
+            if _WRITE.match(query):
+                try:
+                    return await func(conn, *args, **kwargs)
+                finally:
+                    cache.invalidate(*query_tables(query))
+            if key is None:
+                return await func(conn, *args, **kwargs)
+            hit, result = await cache.get_or_load_async(
+                key, lambda: func(conn, *args, **kwargs),
+                query_tables(query) if tables is None else tables, ttl)
+            print("[CACHE] Returning cached result." if hit else "[CACHE] Query result cached.")
+            return result
+        return async_wrapper
+
     @functools.wraps(func)
     def wrapper(conn, *args, **kwargs):
-        query = kwargs.get("query", "")
-        if query in query_cache:
-            print("[CACHE] Returning cached result.")
-            return query_cache[query]
-        result = func(conn, *args, **kwargs)
-        query_cache[query] = result
-        print("[CACHE] Query result cached.")
+        query, key = build_key(args, kwargs)
+        if _WRITE.match(query):
+            try:
+                return func(conn, *args, **kwargs)
+            finally:
+                cache.invalidate(*query_tables(query))
+        if key is None:
+            return func(conn, *args, **kwargs)
+        hit, result = cache.get_or_load(
+            key, lambda: func(conn, *args, **kwargs),
+            query_tables(query) if tables is None else tables, ttl)
+        print("[CACHE] Returning cached result." if hit else "[CACHE] Query result cached.")
         return result
     return wrapper
 
+def invalidates(*tables, cache=None):
+    """Decorator for writes: evict cached queries on ``tables`` after each call."""
+    def decorator(func):
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                try:
+                    return await func(*args, **kwargs)
+                finally:
+                    (query_cache if cache is None else cache).invalidate(*tables)
+            return async_wrapper
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            try:
+                return func(*args, **kwargs)
+            finally:
+                (query_cache if cache is None else cache).invalidate(*tables)
+        return wrapper
+    return decorator
+
 @with_db_connection
 @cache_query
 def fetch_users_with_cache(conn, query):
@@ -34,10 +403,24 @@ def fetch_users_with_cache(conn, query):
     cursor.execute(query)
     return cursor.fetchall()
 
-# First call: caches the result
-users = fetch_users_with_cache(query="SELECT * FROM users")
-print(users)
+@with_db_connection
+@invalidates("users")
+def update_user_email(conn, user_id, new_email):
+    cursor = conn.cursor()
+    cursor.execute("UPDATE users SET email = ? WHERE id = ?", (new_email, user_id))
+    conn.commit()
+
+if __name__ == "__main__":
+    # First call: caches the result
+    users = fetch_users_with_cache(query="SELECT * FROM users")
+    print(users)
+
+    # Second call: uses cached result
+    users_again = fetch_users_with_cache(query="SELECT * FROM users")
+    print(users_again)
 
-# Second call: uses cached result
-users_again = fetch_users_with_cache(query="SELECT * FROM users")
-print(users_again)
+    # A write to users evicts the cached result
+    update_user_email(user_id=1, new_email='Crawford_Cartwright@hotmail.com')
+    users_fresh = fetch_users_with_cache(query="SELECT * FROM users")
+    print(users_fresh)
+    print(query_cache.stats())
@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+"""Benchmarks for the database decorators, run against a scratch SQLite file.
+
+    python3 benchmarks.py group_commit 8 4000
+    python3 benchmarks.py overhead 20000 5
+"""
+import contextlib
+import importlib
+import os
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+
+import db_pool
+from db_op import db_op
+
+log_module = importlib.import_module("0-log_queries")
+connection_module = importlib.import_module("1-with_db_connection")
+transactional_module = importlib.import_module("2-transactional")
+retry_module = importlib.import_module("3-retry_on_failure")
+cache_module = importlib.import_module("4-cache_query")
+
+
+def create_users(database, count=1000):
+    """Create a users table with ``count`` rows in ``database``."""
+    conn = sqlite3.connect(database)
+    conn.execute("CREATE TABLE IF NOT EXISTS users "
+                 "(id INTEGER PRIMARY KEY, name TEXT, email TEXT)")
+    conn.executemany("INSERT OR IGNORE INTO users VALUES (?, ?, ?)",
+                     [(number, f"User {number}", f"user{number}@example.com")
+                      for number in range(count)])
+    conn.commit()
+    conn.close()
+
+
+def update_email(conn, user_id, new_email):
+    conn.execute("UPDATE users SET email = ? WHERE id = ?", (new_email, user_id))
+
+
+def run_threads(threads, operations, call):
+    """Split ``operations`` calls of ``call(number)`` over ``threads``; return ops/s."""
+    def worker(offset):
+        for number in range(offset, operations, threads):
+            call(number)
+
+    workers = [threading.Thread(target=worker, args=(offset,))
+               for offset in range(threads)]
+    start = time.perf_counter()
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    return operations / (time.perf_counter() - start)
+
+
+def bench_group_commit(threads=8, operations=4000, *batch_sizes):
+    """Concurrent update throughput: one commit per call vs group commit."""
+    batch_sizes = batch_sizes or (1, 8, 32, 128)
+    results = {}
+    with tempfile.TemporaryDirectory() as tmpdir:
+        database = os.path.join(tmpdir, "users.db")
+        create_users(database)
+        pool = db_pool.SQLitePool(database, size=threads)
+
+        @transactional_module.transactional
+        def update_per_call(conn, user_id, new_email):
+            update_email(conn, user_id, new_email)
+
+        def per_call(number):
+            with pool.connection() as conn:
+                update_per_call(conn, number % 1000, f"{number}@example.com")
+
+        print(f"{'mode':>12} {'ops/s':>10} {'mean batch':>11}")
+        results["per_call"] = run_threads(threads, operations, per_call)
+        print(f"{'per_call':>12} {results['per_call']:>10.0f} {1:>11.1f}")
+        pool.close()
+
+        for size in batch_sizes:
+            committer = transactional_module.GroupCommitter(database, max_batch=size)
+            grouped = transactional_module.transactional(group=committer)(update_email)
+            rate = run_threads(threads, operations, lambda number: grouped(
+                number % 1000, f"{number}@example.com"))
+            committer.close()
+            results[f"group_{size}"] = rate
+            print(f"{f'group_{size}':>12} {rate:>10.0f} "
+                  f"{committer.stats()['mean_batch']:>11.1f}")
+    return results
+
+
+def fetch_user(conn, query, params=()):
+    return conn.execute(query, params).fetchall()
+
+
+def overhead_stacks():
+    """(name, stacked, fused) decorated versions of ``fetch_user`` to compare."""
+    with_db_connection = connection_module.with_db_connection
+    retry = {"retries": 3, "delay": 0.01}
+    yield ("connection", with_db_connection(fetch_user), db_op(fetch_user))
+    yield ("cache",
+           with_db_connection(cache_module.cache_query(
+               cache=cache_module.QueryCache())(fetch_user)),
+           db_op(cache=cache_module.QueryCache())(fetch_user))
+    yield ("retry",
+           with_db_connection(retry_module.retry_on_failure(**retry)(fetch_user)),
+           db_op(retry=retry)(fetch_user))
+    yield ("all",
+           with_db_connection(
+               log_module.log_queries(profiler=log_module.QueryProfiler(sample_rate=0))(
+                   cache_module.cache_query(cache=cache_module.QueryCache())(
+                       retry_module.retry_on_failure(**retry)(
+                           transactional_module.transactional(fetch_user))))),
+           db_op(fetch_user, cache=cache_module.QueryCache(), retry=retry,
+                 transactional=True,
+                 log=log_module.QueryProfiler(sample_rate=0)))
+
+
+def bench_overhead(calls=20000, rounds=5):
+    """Per-call time of stacked decorators vs the fused db_op for point lookups.
+
+    Lookups cycle over 100 ids, so cached stacks serve nearly every call from
+    the cache. The two forms alternate for ``rounds`` rounds and the best
+    round of each is reported. stdout is discarded: cache_query prints on
+    every call.
+    """
+    results = {}
+    with tempfile.TemporaryDirectory() as tmpdir:
+        cwd = os.getcwd()
+        os.chdir(tmpdir)
+        try:
+            create_users("users.db")
+            db_pool.configure_pool()
+            query = "SELECT * FROM users WHERE id = ?"
+            print(f"{'stack':>12} {'stacked us':>11} {'fused us':>9} {'saved':>7}")
+            for name, stacked, fused in overhead_stacks():
+                timings = [float("inf"), float("inf")]
+                with open(os.devnull, "w") as null, contextlib.redirect_stdout(null):
+                    for _ in range(rounds):
+                        for index, function in enumerate((stacked, fused)):
+                            for number in range(100):
+                                function(query, (number,))
+                            start = time.perf_counter()
+                            for number in range(calls):
+                                function(query, (number % 100,))
+                            timings[index] = min(timings[index], (
+                                time.perf_counter() - start) / calls * 1e6)
+                results[name] = tuple(timings)
+                print(f"{name:>12} {timings[0]:>11.2f} {timings[1]:>9.2f} "
+                      f"{1 - timings[1] / timings[0]:>7.0%}")
+            db_pool.get_pool().close()
+        finally:
+            os.chdir(cwd)
+    return results
+
+
+BENCHMARKS = {
+    "group_commit": bench_group_commit,
+    "overhead": bench_overhead,
+}
+
+
+if __name__ == "__main__":
+    name = sys.argv[1] if len(sys.argv) > 1 else "group_commit"
+    BENCHMARKS[name](*[int(arg) for arg in sys.argv[2:]])
@@ -0,0 +1,411 @@
+"""Thread-safe SQLite connection pool shared by the ``with_db_connection`` decorators.
+
+Opening a connection (and running its PRAGMAs) costs more than a point
+lookup such as ``get_user_by_id``; the pool keeps up to ``size`` connections
+open and lends them out. A thread gets back the connection it used last when
+that one is idle, so its page cache and prepared statements stay warm.
+
+New connections keep SQLite's default rollback journal and
+``synchronous=FULL``, so a commit that returned survives a power failure.
+``pragmas=WAL_PRAGMAS`` opts into write-ahead logging with
+``synchronous=NORMAL``: readers no longer block the writer and commits skip
+the fsync, but the last commits can be lost on power failure, and WAL mode
+is stored in the database file, so it stays on for every later connection.
+
+``AsyncSQLitePool`` is the ``aiosqlite`` counterpart used by the decorators
+when they wrap coroutine functions; aiosqlite is only imported then.
+"""
+import asyncio
+import sqlite3
+import threading
+import time
+import weakref
+
+DEFAULT_PRAGMAS = (
+    "PRAGMA foreign_keys=ON",
+    "PRAGMA busy_timeout=5000",
+)
+
+WAL_PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+) + DEFAULT_PRAGMAS
+
+
+class PoolTimeout(Exception):
+    """No connection became available within the checkout timeout."""
+
+
+class _Slot:
+    __slots__ = ("connection", "created", "released", "uses")
+
+    def __init__(self, connection):
+        self.connection = connection
+        self.created = self.released = time.monotonic()
+        self.uses = 0
+
+
+class SQLitePool:
+    """Keep up to ``size`` connections to ``database`` open and lend them out.
+
+    Every new connection runs ``pragmas``. Connections older than
+    ``max_age`` seconds or used more than ``max_uses`` times are closed and
+    replaced on checkout; one idle for more than ``check_idle`` seconds is
+    checked with ``SELECT 1`` first. Returned connections are rolled back
+    if a transaction was left open. ``acquire`` blocks while all connections
+    are lent out, for at most ``timeout`` seconds if one is given.
+    """
+
+    def __init__(self, database="users.db", size=5, timeout=None, max_age=None,
+                 max_uses=None, check_idle=30.0, pragmas=DEFAULT_PRAGMAS,
+                 **connect_options):
+        self.database = database
+        self.size = size
+        self.timeout = timeout
+        self.max_age = max_age
+        self.max_uses = max_uses
+        self.check_idle = check_idle
+        self.pragmas = tuple(pragmas)
+        self.connect_options = dict(connect_options, check_same_thread=False)
+        self._idle = []
+        self._slots = {}
+        self._open = 0
+        self._closed = False
+        self._local = threading.local()
+        self._condition = threading.Condition()
+        self._counters = {
+            "created": 0,
+            "checkouts": 0,
+            "reused": 0,
+            "affinity_hits": 0,
+            "waits": 0,
+            "wait_seconds": 0.0,
+            "max_wait_seconds": 0.0,
+            "recycled": 0,
+            "failed_checks": 0,
+        }
+
+    def connect(self):
+        connection = sqlite3.connect(self.database, **self.connect_options)
+        for pragma in self.pragmas:
+            connection.execute(pragma).fetchall()
+        return connection
+
+    def acquire(self):
+        deadline = None if self.timeout is None else time.monotonic() + self.timeout
+        while True:
+            slot = self._checkout(deadline)
+            if slot is None:
+                slot = self._create()
+            elif not self._usable(slot):
+                self._discard(slot)
+                continue
+            slot.uses += 1
+            self._local.connection = slot.connection
+            return slot.connection
+
+    def _checkout(self, deadline):
+        # Returns an idle slot, or None after reserving room for a new one.
+        with self._condition:
+            waited = None
+            while True:
+                if self._closed:
+                    raise RuntimeError("Connection pool is closed")
+                if self._idle:
+                    slot = self._take_idle()
+                    break
+                if self._open < self.size:
+                    self._open += 1
+                    slot = None
+                    break
+                if waited is None:
+                    waited = time.monotonic()
+                    self._counters["waits"] += 1
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    self._record_wait(waited)
+                    raise PoolTimeout(f"No connection available after {self.timeout}s")
+                self._condition.wait(remaining)
+            if waited is not None:
+                self._record_wait(waited)
+            self._counters["checkouts"] += 1
+            if slot is not None:
+                self._counters["reused"] += 1
+            return slot
+
+    def _take_idle(self):
+        preferred = getattr(self._local, "connection", None)
+        for index in range(len(self._idle) - 1, -1, -1):
+            if self._idle[index].connection is preferred:
+                self._counters["affinity_hits"] += 1
+                return self._idle.pop(index)
+        return self._idle.pop()
+
+    def _record_wait(self, waited):
+        seconds = time.monotonic() - waited
+        self._counters["wait_seconds"] += seconds
+        self._counters["max_wait_seconds"] = max(
+            self._counters["max_wait_seconds"], seconds)
+
+    def _usable(self, slot):
+        now = time.monotonic()
+        if ((self.max_age is not None and now - slot.created >= self.max_age)
+                or (self.max_uses is not None and slot.uses >= self.max_uses)):
+            with self._condition:
+                self._counters["recycled"] += 1
+            return False
+        if self.check_idle is not None and now - slot.released >= self.check_idle:
+            try:
+                slot.connection.execute("SELECT 1").fetchall()
+            except sqlite3.Error:
+                with self._condition:
+                    self._counters["failed_checks"] += 1
+                return False
+        return True
+
+    def _create(self):
+        try:
+            slot = _Slot(self.connect())
+        except BaseException:
+            with self._condition:
+                self._open -= 1
+                self._condition.notify()
+            raise
+        with self._condition:
+            self._slots[id(slot.connection)] = slot
+            self._counters["created"] += 1
+        return slot
+
+    def release(self, connection):
+        with self._condition:
+            slot = self._slots.get(id(connection))
+        if slot is None or slot.connection is not connection:
+            raise ValueError("Connection does not belong to this pool")
+        try:
+            if connection.in_transaction:
+                connection.rollback()
+        except sqlite3.Error:
+            self._discard(slot)
+            return
+        slot.released = time.monotonic()
+        with self._condition:
+            if self._closed:
+                self._forget(slot)
+                connection.close()
+            else:
+                self._idle.append(slot)
+            self._condition.notify()
+
+    def _forget(self, slot):
+        del self._slots[id(slot.connection)]
+        self._open -= 1
+
+    def _discard(self, slot):
+        try:
+            slot.connection.close()
+        except sqlite3.Error:
+            pass
+        with self._condition:
+            self._forget(slot)
+            self._condition.notify()
+
+    def connection(self):
+        """Context manager lending a connection for the ``with`` block."""
+        return _Lease(self)
+
+    def close(self):
+        with self._condition:
+            self._closed = True
+            idle, self._idle = self._idle, []
+            for slot in idle:
+                self._forget(slot)
+            self._condition.notify_all()
+        for slot in idle:
+            slot.connection.close()
+
+    @property
+    def closed(self):
+        return self._closed
+
+    def stats(self):
+        with self._condition:
+            stats = dict(self._counters)
+            stats.update(size=self.size, open=self._open,
+                         idle=len(self._idle),
+                         in_use=self._open - len(self._idle))
+        return stats
+
+
+class _Lease:
+    def __init__(self, pool):
+        self._pool = pool
+
+    def __enter__(self):
+        self._connection = self._pool.acquire()
+        return self._connection
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self._pool.release(self._connection)
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(database="users.db", **options):
+    """Return the shared pool for ``database``, creating it with ``options``
+    (also when the previous one was closed)."""
+    with _pools_lock:
+        pool = _pools.get(database)
+        if pool is None or pool.closed:
+            pool = _pools[database] = SQLitePool(database, **options)
+        return pool
+
+
+def configure_pool(database="users.db", **options):
+    """Replace the shared pool for ``database`` with one built from ``options``."""
+    with _pools_lock:
+        old = _pools.pop(database, None)
+        pool = _pools[database] = SQLitePool(database, **options)
+    if old is not None:
+        old.close()
+    return pool
+
+
+class AsyncSQLitePool:
+    """Keep up to ``size`` aiosqlite connections open for one event loop.
+
+    Same PRAGMAs and rollback-on-release as SQLitePool; ``acquire`` waits
+    (without blocking the loop) while all connections are lent out. The pool
+    closes itself when ``asyncio.run`` shuts the loop down, as aiosqlite's
+    connection threads would otherwise keep the interpreter from exiting.
+    """
+
+    def __init__(self, database="users.db", size=5, pragmas=DEFAULT_PRAGMAS,
+                 **connect_options):
+        self.database = database
+        self.size = size
+        self.pragmas = tuple(pragmas)
+        self.connect_options = connect_options
+        self._idle = []
+        self._open = 0
+        self._closed = False
+        self._condition = asyncio.Condition()
+        self._counters = {"created": 0, "checkouts": 0, "reused": 0,
+                          "waits": 0, "wait_seconds": 0.0}
+        self._lifetime = None
+
+    async def _live_until_shutdown(self):
+        # An async generator left suspended is closed by the loop's
+        # shutdown_asyncgens(), which asyncio.run() calls before closing.
+        try:
+            yield
+        finally:
+            await self.close()
+
+    async def connect(self):
+        import aiosqlite
+
+        connection = await aiosqlite.connect(self.database, **self.connect_options)
+        for pragma in self.pragmas:
+            async with connection.execute(pragma) as cursor:
+                await cursor.fetchall()
+        return connection
+
+    async def acquire(self):
+        if self._lifetime is None:
+            self._lifetime = self._live_until_shutdown()
+            await self._lifetime.asend(None)
+        async with self._condition:
+            waited = None
+            while not self._idle and self._open >= self.size:
+                if self._closed:
+                    raise RuntimeError("Connection pool is closed")
+                if waited is None:
+                    waited = time.monotonic()
+                    self._counters["waits"] += 1
+                await self._condition.wait()
+            if waited is not None:
+                self._counters["wait_seconds"] += time.monotonic() - waited
+            if self._closed:
+                raise RuntimeError("Connection pool is closed")
+            self._counters["checkouts"] += 1
+            if self._idle:
+                self._counters["reused"] += 1
+                return self._idle.pop()
+            self._open += 1
+        try:
+            connection = await self.connect()
+        except BaseException:
+            async with self._condition:
+                self._open -= 1
+                self._condition.notify()
+            raise
+        self._counters["created"] += 1
+        return connection
+
+    async def release(self, connection):
+        try:
+            if connection.in_transaction:
+                await connection.rollback()
+        except sqlite3.Error:
+            await connection.close()
+            async with self._condition:
+                self._open -= 1
+                self._condition.notify()
+            return
+        async with self._condition:
+            if self._closed:
+                self._open -= 1
+                await connection.close()
+            else:
+                self._idle.append(connection)
+            self._condition.notify()
+
+    def connection(self):
+        """Async context manager lending a connection for the block."""
+        return _AsyncLease(self)
+
+    async def close(self):
+        async with self._condition:
+            self._closed = True
+            idle, self._idle = self._idle, []
+            self._open -= len(idle)
+            self._condition.notify_all()
+        for connection in idle:
+            await connection.close()
+
+    @property
+    def closed(self):
+        return self._closed
+
+    def stats(self):
+        stats = dict(self._counters)
+        stats.update(size=self.size, open=self._open, idle=len(self._idle),
+                     in_use=self._open - len(self._idle))
+        return stats
+
+
+class _AsyncLease:
+    def __init__(self, pool):
+        self._pool = pool
+
+    async def __aenter__(self):
+        self._connection = await self._pool.acquire()
+        return self._connection
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self._pool.release(self._connection)
+
+
+# aiosqlite connections belong to the loop that opened them.
+_async_pools = weakref.WeakKeyDictionary()
+
+
+def get_async_pool(database="users.db", **options):
+    """Return the running loop's shared async pool for ``database``."""
+    pools = _async_pools.setdefault(asyncio.get_running_loop(), {})
+    pool = pools.get(database)
+    if pool is None or pool.closed:
+        pool = pools[database] = AsyncSQLitePool(database, **options)
+    return pool
@@ -0,0 +1,216 @@
+#!/usr/bin/env python3
+"""Unit tests for the coroutine versions of the database decorators"""
+
+import asyncio
+import importlib
+import os
+import sqlite3
+import tempfile
+import unittest
+from unittest import mock
+
+try:
+    import aiosqlite
+except ImportError:
+    aiosqlite = None
+
+log_queries = importlib.import_module("0-log_queries")
+with_connection = importlib.import_module("1-with_db_connection")
+transactional_module = importlib.import_module("2-transactional")
+retry_module = importlib.import_module("3-retry_on_failure")
+cache_module = importlib.import_module("4-cache_query")
+
+
+class FakeClock:
+    """Manually advanced clock for the circuit breaker"""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+@mock.patch("builtins.print")
+class TestAsyncRetry(unittest.TestCase):
+    """Async retries that need no database"""
+
+    def test_cancelled_trial_is_released(self, _print):
+        """A half-open trial cancelled by wait_for does not wedge the breaker"""
+        clock = FakeClock()
+        breaker = retry_module.CircuitBreaker(failure_threshold=1, reset_timeout=10,
+                                              clock=clock)
+        delays = [None, 1.0]
+
+        @retry_module.retry_on_failure(retries=1, budget=False, breaker=breaker)
+        async def query():
+            delay = delays.pop(0) if delays else 0
+            if delay is None:
+                raise sqlite3.OperationalError("database is locked")
+            await asyncio.sleep(delay)
+            return "ok"
+
+        async def main():
+            with self.assertRaises(sqlite3.OperationalError):
+                await query()
+            clock.now = 10
+            with self.assertRaises(asyncio.TimeoutError):
+                await asyncio.wait_for(query(), 0.01)
+            self.assertEqual(breaker.state, "half_open")
+            return await query()
+
+        self.assertEqual(asyncio.run(main()), "ok")
+        self.assertEqual(breaker.state, "closed")
+
+
+class TestAsyncCache(unittest.TestCase):
+    """Async coalescing on QueryCache alone"""
+
+    def test_cancelled_leader_does_not_cancel_followers(self):
+        """A follower takes over the load when the leading caller is cancelled"""
+        cache = cache_module.QueryCache()
+        loads = []
+
+        async def load():
+            loads.append(1)
+            await asyncio.sleep(0.05)
+            return [(1,)]
+
+        async def main():
+            leader = asyncio.create_task(cache.get_or_load_async("key", load))
+            await asyncio.sleep(0)
+            follower = asyncio.create_task(cache.get_or_load_async("key", load))
+            await asyncio.sleep(0)
+            leader.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await leader
+            return await follower
+
+        self.assertEqual(asyncio.run(main()), (False, [(1,)]))
+        self.assertEqual(len(loads), 2)
+        self.assertIn("key", cache)
+        self.assertEqual(cache.stats()["coalesced"], 1)
+
+
+@unittest.skipIf(aiosqlite is None, "aiosqlite is not installed")
+@mock.patch("builtins.print")
+class TestAsyncDecorators(unittest.TestCase):
+    """Each decorator awaits coroutine functions on aiosqlite connections"""
+
+    def setUp(self):
+        """Create users.db in a temporary working directory"""
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.cwd = os.getcwd()
+        os.chdir(self.tmpdir.name)
+        conn = sqlite3.connect("users.db")
+        conn.execute("CREATE TABLE users (id INTEGER PRIMARY KEY, email TEXT UNIQUE)")
+        conn.executemany("INSERT INTO users VALUES (?, ?)",
+                         [(number, f"{number}@x.com") for number in range(1, 4)])
+        conn.commit()
+        conn.close()
+
+    def tearDown(self):
+        """Restore the working directory"""
+        os.chdir(self.cwd)
+        self.tmpdir.cleanup()
+
+    def emails(self):
+        """Return {id: email} as committed"""
+        conn = sqlite3.connect("users.db")
+        try:
+            return dict(conn.execute("SELECT id, email FROM users"))
+        finally:
+            conn.close()
+
+    def test_connection_and_nested_transactions(self, _print):
+        """Async transactional nests with savepoints on a pooled connection"""
+        transactional = transactional_module.transactional
+
+        @transactional
+        async def set_email(conn, user_id, email):
+            await conn.execute("UPDATE users SET email = ? WHERE id = ?", (email, user_id))
+
+        @with_connection.with_db_connection
+        @transactional
+        async def set_emails(conn, emails):
+            for user_id, email in emails:
+                try:
+                    await set_email(conn, user_id, email)
+                except sqlite3.IntegrityError:
+                    pass
+            return conn
+
+        async def main():
+            first = await set_emails([(1, "a@x.com"), (2, "a@x.com"), (3, "c@x.com")])
+            second = await set_emails([])
+            return first is second
+
+        self.assertTrue(asyncio.run(main()))
+        self.assertEqual(self.emails(), {1: "a@x.com", 2: "2@x.com", 3: "c@x.com"})
+
+    def test_async_retry(self, _print):
+        """Transient errors are retried with asyncio.sleep"""
+        calls = []
+
+        @retry_module.retry_on_failure(retries=3, delay=0.5, budget=False, breaker=False)
+        async def flaky():
+            calls.append(1)
+            if len(calls) < 3:
+                raise sqlite3.OperationalError("database is locked")
+            return "ok"
+
+        with mock.patch("asyncio.sleep", new=mock.AsyncMock()) as sleep:
+            self.assertEqual(asyncio.run(flaky()), "ok")
+        self.assertEqual(sleep.await_count, 2)
+        self.assertEqual(flaky.stats.as_dict()["retries"], 2)
+
+    def test_async_cache_coalesces(self, _print):
+        """Concurrent identical misses await a single query"""
+        cache = cache_module.QueryCache()
+        loads = []
+
+        @with_connection.with_db_connection
+        @cache_module.cache_query(cache=cache)
+        async def fetch(conn, query, params=()):
+            loads.append(query)
+            await asyncio.sleep(0.01)
+            async with conn.execute(query, params) as cursor:
+                return await cursor.fetchall()
+
+        async def main():
+            query = "SELECT email FROM users WHERE id = ?"
+            results = await asyncio.gather(*[fetch(query, (1,)) for _ in range(5)])
+            results.append(await fetch(query, (1,)))
+            return results
+
+        results = asyncio.run(main())
+        self.assertEqual(results, [[("1@x.com",)]] * 6)
+        self.assertEqual(len(loads), 1)
+        stats = cache.stats()
+        self.assertEqual((stats["coalesced"], stats["hits"]), (4, 1))
+
+    def test_async_log_queries(self, _print):
+        """Async calls are recorded in the profiler"""
+        profiler = log_queries.QueryProfiler(sample_rate=0, slow_threshold=None)
+
+        @log_queries.log_queries(profiler=profiler)
+        async def fetch(query):
+            async with aiosqlite.connect("users.db") as conn:
+                async with conn.execute(query) as cursor:
+                    return await cursor.fetchall()
+
+        asyncio.run(fetch("SELECT * FROM users WHERE id > 1"))
+        self.assertEqual(profiler.histograms()["SELECT * FROM users WHERE id > ?"]["rows"], 2)
+
+    def test_group_commit_rejects_coroutines(self, _print):
+        """Group commit only accepts synchronous functions"""
+        async def update(conn):
+            pass
+
+        with self.assertRaises(TypeError):
+            transactional_module.transactional(
+                group=transactional_module.GroupCommitter())(update)
+
+
+if __name__ == "__main__":
+    unittest.main()
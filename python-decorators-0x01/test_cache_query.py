@@ -0,0 +1,306 @@
+#!/usr/bin/env python3
+"""Unit tests for the cache_query decorator and QueryCache"""
+
+import importlib
+import inspect
+import sqlite3
+import threading
+import time
+import unittest
+
+cache_query_module = importlib.import_module("4-cache_query")
+QueryCache = cache_query_module.QueryCache
+cache_query = cache_query_module.cache_query
+cache_key = cache_query_module.cache_key
+invalidates = cache_query_module.invalidates
+
+
+class FakeClock:
+    """Manually advanced clock for TTL tests"""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestQueryCache(unittest.TestCase):
+    """Tests for eviction, expiry and invalidation"""
+
+    def test_lru_eviction(self):
+        """The least recently used entry is evicted past maxsize"""
+        cache = QueryCache(maxsize=2)
+        cache.store("a", 1)
+        cache.store("b", 2)
+        cache.lookup("a")
+        cache.store("c", 3)
+        self.assertIn("a", cache)
+        self.assertNotIn("b", cache)
+        self.assertEqual(cache.stats()["evictions"], 1)
+
+    def test_byte_budget(self):
+        """Entries are evicted to stay within maxbytes"""
+        rows = [(number, "x" * 100) for number in range(10)]
+        size = cache_query_module.result_size(rows)
+        cache = QueryCache(maxsize=None, maxbytes=int(size * 2.5))
+        for key in "abc":
+            cache.store(key, rows)
+        self.assertEqual(len(cache), 2)
+        self.assertLessEqual(cache.stats()["bytes"], size * 2.5)
+
+    def test_ttl(self):
+        """Entries expire ttl seconds after being stored"""
+        clock = FakeClock()
+        cache = QueryCache(ttl=10, clock=clock)
+        cache.store("a", 1)
+        clock.now = 9
+        self.assertEqual(cache.lookup("a"), (True, 1))
+        clock.now = 10
+        self.assertEqual(cache.lookup("a"), (False, None))
+        self.assertEqual(cache.stats()["expirations"], 1)
+
+    def test_table_invalidation(self):
+        """invalidate() drops only the entries tagged with the table"""
+        cache = QueryCache()
+        cache.store("users", 1, {"users"})
+        cache.store("joined", 2, {"users", "orders"})
+        cache.store("orders", 3, {"orders"})
+        cache.invalidate("USERS")
+        self.assertEqual(len(cache), 1)
+        self.assertIn("orders", cache)
+
+    def test_store_skipped_after_invalidation(self):
+        """A result read before a write to its table is not cached"""
+        cache = QueryCache()
+        generation = cache.generation
+        cache.invalidate("users")
+        cache.store("users", 1, {"users"}, generation=generation)
+        self.assertNotIn("users", cache)
+
+
+class TestCacheDecorator(unittest.TestCase):
+    """Tests for cache_query and invalidates on an in-memory database"""
+
+    def setUp(self):
+        """Create a users table and a private cache"""
+        self.conn = sqlite3.connect(":memory:")
+        self.conn.execute("CREATE TABLE users (id INTEGER, email TEXT)")
+        self.conn.execute("INSERT INTO users VALUES (1, 'a@x.com')")
+        self.cache = QueryCache()
+        self.calls = 0
+
+        @cache_query(cache=self.cache)
+        def fetch(conn, query):
+            self.calls += 1
+            return conn.execute(query).fetchall()
+
+        @invalidates("users", cache=self.cache)
+        def update_email(conn, user_id, new_email):
+            conn.execute("UPDATE users SET email = ? WHERE id = ?",
+                         (new_email, user_id))
+
+        self.fetch = fetch
+        self.update_email = update_email
+
+    def tearDown(self):
+        """Close the database"""
+        self.conn.close()
+
+    def test_hit_then_write_invalidates(self):
+        """A write to users makes the next read go to the database"""
+        query = "SELECT email FROM users"
+        self.assertEqual(self.fetch(self.conn, query=query), [("a@x.com",)])
+        self.fetch(self.conn, query=query)
+        self.assertEqual(self.calls, 1)
+        self.update_email(self.conn, 1, "b@x.com")
+        self.assertEqual(self.fetch(self.conn, query=query), [("b@x.com",)])
+        self.assertEqual(self.calls, 2)
+        stats = self.cache.stats()
+        self.assertEqual((stats["hits"], stats["misses"]), (1, 2))
+
+    def test_write_queries_bypass_and_invalidate(self):
+        """Write queries run every time and evict their table's entries"""
+        self.fetch(self.conn, query="SELECT * FROM users")
+        self.fetch(self.conn, query="DELETE FROM users")
+        self.assertEqual(self.fetch(self.conn, query="SELECT * FROM users"), [])
+        self.assertEqual(self.calls, 3)
+
+    def test_keys_include_params(self):
+        """Positional queries and bound parameters get their own entries"""
+        @cache_query(cache=self.cache)
+        def fetch_email(conn, query, params=()):
+            self.calls += 1
+            return conn.execute(query, params).fetchall()
+
+        self.conn.execute("INSERT INTO users VALUES (2, 'c@x.com')")
+        query = "SELECT email FROM users WHERE id = ?"
+        self.assertEqual(fetch_email(self.conn, query, (1,)), [("a@x.com",)])
+        self.assertEqual(fetch_email(self.conn, query, (2,)), [("c@x.com",)])
+        self.assertEqual(fetch_email(self.conn, query="SELECT  email\n FROM users "
+                                     "WHERE id = ?;", params=[2]), [("c@x.com",)])
+        self.assertEqual(self.calls, 2)
+
+    def test_mutable_defaults(self):
+        """Functions with list or dict defaults can be decorated and cached"""
+        @cache_query(cache=self.cache)
+        def fetch_list(conn, query, params=[]):
+            self.calls += 1
+            return conn.execute(query, params).fetchall()
+
+        @cache_query(cache=self.cache)
+        def fetch_named(conn, query, params={}):
+            self.calls += 1
+            return conn.execute(query, params).fetchall()
+
+        for _ in range(2):
+            self.assertEqual(fetch_list(self.conn, "SELECT id FROM users"), [(1,)])
+            self.assertEqual(fetch_named(self.conn, "SELECT id FROM users"), [(1,)])
+        self.assertEqual(self.calls, 2)
+
+    def test_functions_do_not_share_entries(self):
+        """Functions called with the same arguments get their own entries"""
+        self.conn.execute("CREATE TABLE orders (id INTEGER, item TEXT)")
+        self.conn.execute("INSERT INTO orders VALUES (1, 'book')")
+
+        @cache_query(cache=self.cache)
+        def get_user(conn, user_id):
+            return conn.execute("SELECT email FROM users WHERE id = ?",
+                                (user_id,)).fetchall()
+
+        @cache_query(cache=self.cache)
+        def get_order(conn, order_id):
+            return conn.execute("SELECT item FROM orders WHERE id = ?",
+                                (order_id,)).fetchall()
+
+        self.assertEqual(get_user(self.conn, 1), [("a@x.com",)])
+        self.assertEqual(get_order(self.conn, 1), [("book",)])
+        self.assertEqual(get_user(self.conn, 1), [("a@x.com",)])
+        self.assertEqual(len(self.cache), 2)
+
+    def test_only_the_query_parameter_is_the_query(self):
+        """A leading string argument not named query is a parameter"""
+        @cache_query(cache=self.cache)
+        def find(conn, email):
+            self.calls += 1
+            return conn.execute("SELECT id FROM users WHERE email = ?",
+                                (email,)).fetchall()
+
+        self.assertEqual(find(self.conn, "a@x.com"), [(1,)])
+        self.assertEqual(find(self.conn, "a@x.com "), [])
+        self.assertEqual(find(self.conn, "DELETE FROM users"), [])
+        self.assertEqual(find(self.conn, "a@x.com"), [(1,)])
+        self.assertEqual(self.calls, 3)
+
+
+class TestCacheKey(unittest.TestCase):
+    """Tests for query normalization and key construction"""
+
+    def test_normalization(self):
+        """Whitespace is collapsed outside string literals only"""
+        self.assertEqual(cache_key(("SELECT *\n  FROM users ;",), {})[1],
+                         cache_key((), {"query": "SELECT * FROM users"})[1])
+        self.assertNotEqual(cache_key(("SELECT 'a  b'",), {})[1],
+                            cache_key(("SELECT 'a b'",), {})[1])
+
+    def test_key_builder_matches_cache_key(self):
+        """The per-function builder gives the keys Signature.bind gives"""
+        def fetch(conn, query, params=(), limit=10):
+            pass
+
+        build = cache_query_module.key_builder(fetch)
+        signature = inspect.signature(fetch)
+        namespace = f"{fetch.__module__}.{fetch.__qualname__}"
+        for args, kwargs in [(("SELECT 1",), {}), (("SELECT 1", (2,)), {"limit": 5}),
+                             ((), {"query": "SELECT  1;", "params": [2]}),
+                             (("SELECT 1",), {"other": 1})]:
+            self.assertEqual(build(args, kwargs),
+                             cache_key(args, kwargs, signature, namespace))
+
+    def test_unhashable_params(self):
+        """Lists and dicts are frozen; other unhashables disable caching"""
+        self.assertIsNotNone(cache_key(("q", [1, {"a": [2]}]), {})[1])
+        self.assertIsNone(cache_key(("q", bytearray(b"x")), {})[1])
+
+
+class TestCoalescing(unittest.TestCase):
+    """Tests for single-flight loading"""
+
+    def test_concurrent_misses_load_once(self):
+        """Concurrent misses on one key share a single load"""
+        cache = QueryCache()
+        loads = []
+        results = []
+
+        def load():
+            loads.append(1)
+            time.sleep(0.05)
+            return [(1,)]
+
+        def worker():
+            results.append(cache.get_or_load("key", load)[1])
+
+        threads = [threading.Thread(target=worker) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(loads), 1)
+        self.assertEqual(results, [[(1,)]] * 8)
+        self.assertEqual(cache.stats()["coalesced"], 7)
+
+    def test_no_reload_while_leader_stores(self):
+        """A caller arriving while the leader stores its result does not load again"""
+        loads = []
+        results = []
+
+        class SlowStore(QueryCache):
+            def store(self, *args, **kwargs):
+                # Another caller misses while the result is on its way in.
+                late = threading.Thread(
+                    target=lambda: results.append(cache.get_or_load("key", load)))
+                late.start()
+                late.join(0.1)
+                super().store(*args, **kwargs)
+                self.late = late
+
+        def load():
+            loads.append(1)
+            return [(1,)]
+
+        cache = SlowStore()
+        self.assertEqual(cache.get_or_load("key", load), (False, [(1,)]))
+        cache.late.join()
+        self.assertEqual(len(loads), 1)
+        self.assertEqual(results[0][1], [(1,)])
+
+    def test_errors_are_shared_and_not_cached(self):
+        """Waiting callers receive the loader's error; nothing is cached"""
+        cache = QueryCache()
+        started = threading.Event()
+        errors = []
+
+        def load():
+            started.set()
+            time.sleep(0.05)
+            raise sqlite3.OperationalError("boom")
+
+        def worker():
+            try:
+                cache.get_or_load("key", load)
+            except sqlite3.OperationalError as error:
+                errors.append(error)
+
+        leader = threading.Thread(target=worker)
+        leader.start()
+        started.wait()
+        follower = threading.Thread(target=worker)
+        follower.start()
+        leader.join()
+        follower.join()
+        self.assertEqual(len(errors), 2)
+        self.assertNotIn("key", cache)
+
+
+if __name__ == "__main__":
+    unittest.main()
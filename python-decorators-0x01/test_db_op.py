@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""Unit tests for the fused db_op decorator"""
+
+import os
+import sqlite3
+import tempfile
+import unittest
+from unittest import mock
+
+import db_pool
+from db_op import cache_query, db_op, log_queries, retry_module
+
+
+@mock.patch("builtins.print")
+class TestDbOp(unittest.TestCase):
+    """db_op behaves like the stacked decorators"""
+
+    def setUp(self):
+        """Point the shared pool at a temporary users.db"""
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.cwd = os.getcwd()
+        os.chdir(self.tmpdir.name)
+        self.pool = db_pool.configure_pool(size=2)
+        with self.pool.connection() as conn:
+            conn.execute("CREATE TABLE users (id INTEGER PRIMARY KEY, email TEXT UNIQUE)")
+            conn.executemany("INSERT INTO users VALUES (?, ?)",
+                             [(number, f"{number}@x.com") for number in range(1, 4)])
+            conn.commit()
+
+    def tearDown(self):
+        """Close the pool and restore the working directory"""
+        self.pool.close()
+        os.chdir(self.cwd)
+        self.tmpdir.cleanup()
+
+    def test_cache_and_log(self, _print):
+        """Cached reads hit the database once and every call is profiled"""
+        cache = cache_query.QueryCache()
+        profiler = log_queries.QueryProfiler(sample_rate=0, slow_threshold=None)
+        calls = []
+
+        @db_op(cache=cache, log=profiler)
+        def fetch(conn, query, params=()):
+            calls.append(query)
+            return conn.execute(query, params).fetchall()
+
+        query = "SELECT email FROM users WHERE id = ?"
+        self.assertEqual(fetch(query, (1,)), [("1@x.com",)])
+        self.assertEqual(fetch(query=query, params=(1,)), [("1@x.com",)])
+        self.assertEqual(fetch(query, (2,)), [("2@x.com",)])
+        self.assertEqual(len(calls), 2)
+        self.assertEqual(cache.stats()["hits"], 1)
+        self.assertEqual(profiler.histograms()[query]["count"], 3)
+        self.assertEqual(self.pool.stats()["in_use"], 0)
+
+    def test_transactional_retry(self, _print):
+        """Transient failures are retried and each attempt is rolled back"""
+        attempts = []
+
+        @db_op(retry={"retries": 3, "delay": 0, "budget": False, "breaker": False},
+               transactional=True)
+        def update(conn, user_id, email):
+            conn.execute("UPDATE users SET email = ? WHERE id = ?", (email, user_id))
+            attempts.append(1)
+            if len(attempts) < 2:
+                raise sqlite3.OperationalError("database is locked")
+
+        update(1, "new@x.com")
+        self.assertEqual(len(attempts), 2)
+        self.assertEqual(update.stats.as_dict()["retries"], 1)
+        with self.pool.connection() as conn:
+            self.assertEqual(conn.execute("SELECT email FROM users WHERE id = 1")
+                             .fetchone(), ("new@x.com",))
+
+    def test_write_invalidates(self, _print):
+        """Write queries bypass the cache and evict their table"""
+        cache = cache_query.QueryCache()
+
+        @db_op(cache=cache, transactional=True)
+        def run(conn, query, params=()):
+            return conn.execute(query, params).fetchall()
+
+        run("SELECT COUNT(*) FROM users")
+        run("DELETE FROM users WHERE id = ?", (3,))
+        self.assertEqual(run("SELECT COUNT(*) FROM users"), [(2,)])
+
+    def test_defaults_and_coroutines(self, _print):
+        """True selects the shared defaults; coroutine functions are rejected"""
+        wrapped = db_op(retry=True)(lambda conn: None)
+        self.assertIsInstance(wrapped.stats, retry_module.RetryStats)
+
+        async def fetch(conn):
+            pass
+        self.assertRaises(TypeError, db_op(cache=True), fetch)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""Unit tests for the SQLite connection pool behind with_db_connection"""
+
+import importlib
+import os
+import tempfile
+import threading
+import unittest
+
+import db_pool
+from db_pool import WAL_PRAGMAS, PoolTimeout, SQLitePool
+
+
+class TestSQLitePool(unittest.TestCase):
+    """Tests for checkout, recycling and metrics"""
+
+    def setUp(self):
+        """Create a temporary database file"""
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.database = os.path.join(self.tmpdir.name, "users.db")
+
+    def tearDown(self):
+        """Remove the temporary database"""
+        self.tmpdir.cleanup()
+
+    def test_reuse_and_pragmas(self):
+        """Released connections are reused and were initialized once"""
+        pool = SQLitePool(self.database, size=2)
+        with pool.connection() as conn:
+            first = conn
+            self.assertEqual(conn.execute("PRAGMA journal_mode").fetchone()[0], "delete")
+            self.assertEqual(conn.execute("PRAGMA synchronous").fetchone()[0], 2)
+            self.assertEqual(conn.execute("PRAGMA foreign_keys").fetchone()[0], 1)
+        with pool.connection() as conn:
+            self.assertIs(conn, first)
+        stats = pool.stats()
+        self.assertEqual((stats["created"], stats["reused"]), (1, 1))
+        pool.close()
+
+    def test_wal_preset(self):
+        """WAL_PRAGMAS switches to WAL with synchronous=NORMAL"""
+        pool = SQLitePool(self.database, pragmas=WAL_PRAGMAS)
+        with pool.connection() as conn:
+            self.assertEqual(conn.execute("PRAGMA journal_mode").fetchone()[0], "wal")
+            self.assertEqual(conn.execute("PRAGMA synchronous").fetchone()[0], 1)
+            self.assertEqual(conn.execute("PRAGMA busy_timeout").fetchone()[0], 5000)
+        pool.close()
+
+    def test_thread_affinity(self):
+        """A thread gets back the connection it used last"""
+        pool = SQLitePool(self.database, size=3)
+        a, b = pool.acquire(), pool.acquire()
+        pool.release(a)
+        pool.release(b)
+        self.assertIs(pool.acquire(), b)
+        pool.release(b)
+        seen = []
+
+        def worker():
+            conn = pool.acquire()
+            seen.append(conn)
+            pool.release(conn)
+            seen.append(pool.acquire())
+            pool.release(seen[-1])
+
+        thread = threading.Thread(target=worker)
+        thread.start()
+        thread.join()
+        self.assertIs(seen[0], seen[1])
+        self.assertGreaterEqual(pool.stats()["affinity_hits"], 2)
+        pool.close()
+
+    def test_recycling(self):
+        """Connections past max_uses are closed and replaced"""
+        pool = SQLitePool(self.database, size=1, max_uses=2)
+        conns = []
+        for _ in range(3):
+            with pool.connection() as conn:
+                conns.append(conn)
+        self.assertIs(conns[0], conns[1])
+        self.assertIsNot(conns[1], conns[2])
+        self.assertEqual(pool.stats()["recycled"], 1)
+        self.assertEqual(pool.stats()["open"], 1)
+        pool.close()
+
+    def test_rollback_on_release(self):
+        """An open transaction is rolled back when the connection returns"""
+        pool = SQLitePool(self.database, size=1)
+        with pool.connection() as conn:
+            conn.execute("CREATE TABLE users (id INTEGER)")
+            conn.commit()
+            conn.execute("INSERT INTO users VALUES (1)")
+        with pool.connection() as conn:
+            self.assertFalse(conn.in_transaction)
+            self.assertEqual(conn.execute("SELECT COUNT(*) FROM users").fetchone()[0], 0)
+        pool.close()
+
+    def test_wait_metrics_and_timeout(self):
+        """Waiting checkouts are counted and time out"""
+        pool = SQLitePool(self.database, size=1, timeout=0.05)
+        conn = pool.acquire()
+        self.assertRaises(PoolTimeout, pool.acquire)
+        threading.Timer(0.02, pool.release, (conn,)).start()
+        pool.release(pool.acquire())
+        stats = pool.stats()
+        self.assertEqual(stats["waits"], 2)
+        self.assertGreater(stats["max_wait_seconds"], 0.01)
+        pool.close()
+
+
+class TestWithDbConnection(unittest.TestCase):
+    """with_db_connection borrows from the shared pool"""
+
+    def test_decorator_uses_shared_pool(self):
+        """Repeated calls reuse one pooled connection"""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            cwd = os.getcwd()
+            os.chdir(tmpdir)
+            try:
+                pool = db_pool.configure_pool(size=2)
+                with pool.connection() as conn:
+                    conn.execute("CREATE TABLE users (id INTEGER, name TEXT)")
+                    conn.execute("INSERT INTO users VALUES (1, 'Ada')")
+                    conn.commit()
+                module = importlib.import_module("1-with_db_connection")
+                for _ in range(3):
+                    self.assertEqual(module.get_user_by_id(user_id=1), (1, "Ada"))
+                self.assertEqual(pool.stats()["created"], 1)
+                self.assertEqual(pool.stats()["in_use"], 0)
+                pool.close()
+            finally:
+                os.chdir(cwd)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+"""Unit tests for the log_queries profiler"""
+
+import importlib
+import io
+import json
+import logging
+import os
+import sqlite3
+import tempfile
+import unittest
+
+import db_pool
+
+log_queries_module = importlib.import_module("0-log_queries")
+QueryProfiler = log_queries_module.QueryProfiler
+fingerprint = log_queries_module.fingerprint
+log_queries = log_queries_module.log_queries
+with_db_connection = importlib.import_module("1-with_db_connection").with_db_connection
+
+
+class ListHandler(logging.Handler):
+    """Collect log records in a list"""
+
+    def __init__(self):
+        super().__init__()
+        self.records = []
+
+    def emit(self, record):
+        self.records.append(record)
+
+
+class TestProfiler(unittest.TestCase):
+    """Tests for fingerprints, histograms and sampling"""
+
+    def setUp(self):
+        """Profile queries against an in-memory database"""
+        self.conn = sqlite3.connect(":memory:")
+        self.conn.execute("CREATE TABLE users (id INTEGER, name TEXT)")
+        self.conn.executemany("INSERT INTO users VALUES (?, ?)",
+                              [(1, "Ada"), (2, "Bob")])
+        self.log = logging.getLogger("test_query_log")
+        self.log.setLevel(logging.DEBUG)
+        self.log.propagate = False
+        self.handler = ListHandler()
+        self.log.addHandler(self.handler)
+
+    def tearDown(self):
+        """Close the database and detach the handler"""
+        self.log.removeHandler(self.handler)
+        self.conn.close()
+
+    def profiled(self, profiler):
+        """Return a fetch function decorated with ``profiler``"""
+        @log_queries(profiler=profiler)
+        def fetch(query, params=()):
+            return self.conn.execute(query, params).fetchall()
+        return fetch
+
+    def test_fingerprint(self):
+        """Literals, numbers and IN lists are replaced by placeholders"""
+        self.assertEqual(fingerprint("SELECT * FROM users WHERE id = 12 AND "
+                                     "name = 'O''Hara'  AND id IN (?, ?, ?);"),
+                         "SELECT * FROM users WHERE id = ? AND name = ? AND id IN (?+)")
+
+    def test_histograms(self):
+        """Calls are grouped by fingerprint with counts and rows"""
+        profiler = QueryProfiler(log=self.log)
+        fetch = self.profiled(profiler)
+        fetch("SELECT * FROM users WHERE id = 1")
+        fetch("SELECT * FROM users WHERE id = 2")
+        fetch(query="SELECT * FROM users")
+        histograms = profiler.histograms()
+        self.assertEqual(histograms["SELECT * FROM users WHERE id = ?"]["count"], 2)
+        self.assertEqual(histograms["SELECT * FROM users"]["rows"], 2)
+        output = io.StringIO()
+        profiler.dump(output)
+        self.assertEqual(len(json.loads(output.getvalue())), 2)
+
+    def test_sampling_and_slow_log(self):
+        """Unsampled fast calls are not logged; slow and failed calls are"""
+        profiler = QueryProfiler(sample_rate=0, slow_threshold=None, log=self.log)
+        fetch = self.profiled(profiler)
+        fetch("SELECT * FROM users WHERE id = ?", (1,))
+        self.assertEqual(self.handler.records, [])
+        with self.assertRaises(sqlite3.OperationalError):
+            fetch("SELECT * FROM missing")
+        profiler.slow_threshold = 0
+        fetch("SELECT * FROM users WHERE id = ?", (1,))
+        events = [record.query_event for record in self.handler.records]
+        self.assertEqual([record.levelno for record in self.handler.records],
+                         [logging.WARNING, logging.WARNING])
+        self.assertIn("error", events[0])
+        self.assertEqual((events[1]["params"], events[1]["rows"]), (1, 1))
+
+    def test_queue_listener(self):
+        """start_logging forwards records to handlers via a background listener"""
+        handler = ListHandler()
+        logger = log_queries_module.logger
+        level, propagate = logger.level, logger.propagate
+        logger.setLevel(logging.DEBUG)
+        listener = log_queries_module.start_logging(handler)
+        try:
+            fetch = self.profiled(QueryProfiler())
+            fetch("SELECT * FROM users")
+        finally:
+            listener.stop()
+            for queue_handler in list(logger.handlers):
+                logger.removeHandler(queue_handler)
+            logger.setLevel(level)
+            logger.propagate = propagate
+        self.assertEqual(len(handler.records), 1)
+        formatted = log_queries_module.JsonFormatter().format(handler.records[0])
+        self.assertEqual(json.loads(formatted)["fingerprint"], "SELECT * FROM users")
+
+
+class TestStackedProfiler(unittest.TestCase):
+    """log_queries under with_db_connection, on a pooled users.db"""
+
+    def setUp(self):
+        """Point the shared pool at a temporary users.db"""
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.cwd = os.getcwd()
+        os.chdir(self.tmpdir.name)
+        self.pool = db_pool.configure_pool(size=1)
+        with self.pool.connection() as conn:
+            conn.execute("CREATE TABLE users (id INTEGER, name TEXT)")
+            conn.executemany("INSERT INTO users VALUES (?, ?)",
+                             [(1, "Ada"), (2, "Bob")])
+            conn.commit()
+
+    def tearDown(self):
+        """Close the pool and restore the working directory"""
+        self.pool.close()
+        os.chdir(self.cwd)
+        self.tmpdir.cleanup()
+
+    def test_positional_query_after_connection(self):
+        """The connection passed in front of the query is skipped"""
+        profiler = QueryProfiler(sample_rate=0, slow_threshold=None)
+
+        @with_db_connection
+        @log_queries(profiler=profiler)
+        def fetch(conn, query, params=()):
+            return conn.execute(query, params).fetchall()
+
+        @with_db_connection
+        @log_queries(profiler=profiler)
+        def count_users(conn):
+            return conn.execute("SELECT COUNT(*) FROM users").fetchone()
+
+        self.assertEqual(fetch("SELECT name FROM users WHERE id = ?", (2,)),
+                         [("Bob",)])
+        fetch(query="SELECT name FROM users WHERE id = 1")
+        self.assertEqual(count_users(), (2,))
+        histograms = profiler.histograms()
+        self.assertEqual(set(histograms),
+                         {"SELECT name FROM users WHERE id = ?",
+                          "TestStackedProfiler.test_positional_query_after_connection"
+                          ".<locals>.count_users"})
+        self.assertEqual(histograms["SELECT name FROM users WHERE id = ?"]["count"], 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
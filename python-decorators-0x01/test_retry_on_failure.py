@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""Unit tests for the retry_on_failure policy"""
+
+import importlib
+import sqlite3
+import unittest
+from unittest import mock
+
+retry_module = importlib.import_module("3-retry_on_failure")
+CircuitBreaker = retry_module.CircuitBreaker
+CircuitOpenError = retry_module.CircuitOpenError
+RetryBudget = retry_module.RetryBudget
+retry_on_failure = retry_module.retry_on_failure
+
+
+class FakeClock:
+    """Manually advanced clock for the circuit breaker"""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class MySQLError(Exception):
+    """Stand-in for mysql.connector errors carrying an errno"""
+
+    def __init__(self, errno, message):
+        super().__init__(message)
+        self.errno = errno
+
+
+def flaky(failures, error):
+    """Return a function raising ``error`` ``failures`` times, then succeeding"""
+    calls = []
+
+    def func():
+        calls.append(1)
+        if len(calls) <= failures:
+            raise error
+        return "ok"
+    return func, calls
+
+
+@mock.patch("time.sleep")
+@mock.patch("builtins.print")
+class TestRetryOnFailure(unittest.TestCase):
+    """Tests for classification, backoff, budget and breaker"""
+
+    def test_classification(self, _print, _sleep):
+        """Locks and deadlocks are retryable, syntax errors are not"""
+        is_retryable = retry_module.is_retryable
+        self.assertTrue(is_retryable(sqlite3.OperationalError("database is locked")))
+        self.assertTrue(is_retryable(MySQLError(1213, "Deadlock found")))
+        self.assertFalse(is_retryable(sqlite3.OperationalError('near "SELEC": syntax error')))
+        self.assertFalse(is_retryable(MySQLError(1064, "You have an error in your SQL")))
+        self.assertFalse(is_retryable(ValueError("bad")))
+
+    def test_retries_transient_errors(self, _print, sleep):
+        """Transient errors are retried with jittered exponential backoff"""
+        func, calls = flaky(2, sqlite3.OperationalError("database is locked"))
+        wrapped = retry_on_failure(retries=3, delay=0.1, budget=False,
+                                   breaker=False)(func)
+        with mock.patch("random.uniform", side_effect=lambda low, high: high):
+            self.assertEqual(wrapped(), "ok")
+        self.assertEqual(len(calls), 3)
+        self.assertEqual([call.args[0] for call in sleep.call_args_list], [0.1, 0.2])
+        stats = wrapped.stats.as_dict()
+        self.assertEqual((stats["attempts"], stats["retries"], stats["successes"]),
+                         (3, 2, 1))
+
+    def test_backoff_is_capped(self, _print, _sleep):
+        """Backoff bounds double up to max_delay and jitter stays below them"""
+        backoff = retry_module.backoff
+        self.assertEqual([backoff(n, 1, 5, jitter=False) for n in range(1, 5)],
+                         [1, 2, 4, 5])
+        self.assertTrue(all(0 <= backoff(4, 1, 5) <= 5 for _ in range(50)))
+
+    def test_non_retryable_raises_at_once(self, _print, sleep):
+        """A syntax error is raised without retrying"""
+        func, calls = flaky(5, sqlite3.OperationalError("syntax error"))
+        wrapped = retry_on_failure(retries=3, budget=False, breaker=False)(func)
+        self.assertRaises(sqlite3.OperationalError, wrapped)
+        self.assertEqual(len(calls), 1)
+        sleep.assert_not_called()
+
+    def test_budget_limits_retries(self, _print, _sleep):
+        """An empty budget stops retries"""
+        budget = RetryBudget(ratio=0, capacity=1)
+        func, calls = flaky(10, sqlite3.OperationalError("database is locked"))
+        wrapped = retry_on_failure(retries=5, delay=0, budget=budget,
+                                   breaker=False)(func)
+        self.assertRaises(sqlite3.OperationalError, wrapped)
+        self.assertEqual(len(calls), 2)
+        self.assertEqual(wrapped.stats.as_dict()["budget_exhausted"], 1)
+
+    def test_circuit_breaker(self, _print, _sleep):
+        """The breaker opens, fails fast, then closes after a good trial call"""
+        clock = FakeClock()
+        breaker = CircuitBreaker(failure_threshold=2, reset_timeout=10, clock=clock)
+        func, calls = flaky(2, sqlite3.OperationalError("database is locked"))
+        wrapped = retry_on_failure(retries=2, delay=0, budget=False,
+                                   breaker=breaker)(func)
+        self.assertRaises(sqlite3.OperationalError, wrapped)
+        self.assertEqual(breaker.state, "open")
+        self.assertRaises(CircuitOpenError, wrapped)
+        self.assertEqual(len(calls), 2)
+        clock.now = 10
+        self.assertEqual(wrapped(), "ok")
+        self.assertEqual(breaker.state, "closed")
+        self.assertEqual(wrapped.stats.as_dict()["short_circuited"], 1)
+
+    def test_interrupted_trial_is_released(self, _print, _sleep):
+        """A trial call ending in KeyboardInterrupt does not wedge the breaker"""
+        clock = FakeClock()
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=10, clock=clock)
+        outcomes = [sqlite3.OperationalError("database is locked"),
+                    KeyboardInterrupt()]
+
+        @retry_on_failure(retries=1, budget=False, breaker=breaker)
+        def func():
+            if outcomes:
+                raise outcomes.pop(0)
+            return "ok"
+
+        self.assertRaises(sqlite3.OperationalError, func)
+        clock.now = 10
+        self.assertRaises(KeyboardInterrupt, func)
+        self.assertEqual(breaker.state, "half_open")
+        self.assertEqual(func(), "ok")
+        self.assertEqual(breaker.state, "closed")
+
+
+if __name__ == "__main__":
+    unittest.main()
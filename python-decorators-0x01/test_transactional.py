@@ -0,0 +1,265 @@
+#!/usr/bin/env python3
+"""Unit tests for the transactional decorator and group commit"""
+
+import importlib
+import os
+import sqlite3
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+transactional_module = importlib.import_module("2-transactional")
+GroupCommitter = transactional_module.GroupCommitter
+transactional = transactional_module.transactional
+
+
+def update_email(conn, user_id, new_email):
+    """Update one user's email; fails on the UNIQUE constraint for dupes"""
+    conn.execute("UPDATE users SET email = ? WHERE id = ?", (new_email, user_id))
+
+
+@mock.patch("builtins.print")
+class TestGroupCommit(unittest.TestCase):
+    """Tests for GroupCommitter through transactional(group=...)"""
+
+    def setUp(self):
+        """Create a users table with unique emails"""
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.database = os.path.join(self.tmpdir.name, "users.db")
+        conn = sqlite3.connect(self.database)
+        conn.execute("CREATE TABLE users (id INTEGER PRIMARY KEY, email TEXT UNIQUE)")
+        conn.executemany("INSERT INTO users VALUES (?, ?)",
+                         [(number, f"{number}@x.com") for number in range(100)])
+        conn.commit()
+        conn.close()
+        self.committer = GroupCommitter(self.database, max_batch=16)
+        self.update = transactional(group=self.committer)(update_email)
+
+    def tearDown(self):
+        """Stop the writer and remove the database"""
+        self.committer.close()
+        self.tmpdir.cleanup()
+
+    def emails(self):
+        """Return {id: email} read on a fresh connection"""
+        conn = sqlite3.connect(self.database)
+        try:
+            return dict(conn.execute("SELECT id, email FROM users"))
+        finally:
+            conn.close()
+
+    def test_concurrent_calls_share_commits(self, _print):
+        """Concurrent updates are committed in batches and all persist"""
+        barrier = threading.Barrier(8)
+
+        def worker(offset):
+            barrier.wait()
+            for user_id in range(offset, 100, 8):
+                self.update(user_id, f"new{user_id}@x.com")
+
+        threads = [threading.Thread(target=worker, args=(offset,)) for offset in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(self.emails()[42], "new42@x.com")
+        stats = self.committer.stats()
+        self.assertEqual(stats["operations"], 100)
+        self.assertLessEqual(stats["largest_batch"], 16)
+
+    def test_failures_are_isolated(self, _print):
+        """A failing operation is rolled back alone and raises in its caller"""
+        futures = [self.committer.submit(update_email, (1, "one@x.com")),
+                   self.committer.submit(update_email, (2, "one@x.com")),
+                   self.committer.submit(update_email, (3, "three@x.com"))]
+        self.assertIsNone(futures[0].result())
+        self.assertRaises(sqlite3.IntegrityError, futures[1].result)
+        self.assertIsNone(futures[2].result())
+        emails = self.emails()
+        self.assertEqual((emails[1], emails[2], emails[3]),
+                         ("one@x.com", "2@x.com", "three@x.com"))
+        self.assertRaises(sqlite3.IntegrityError, self.update, 4, "one@x.com")
+
+    def test_durable_commits_immediately(self, _print):
+        """A durable call ends its batch and is counted"""
+        self.update.durable(5, "five@x.com")
+        self.assertEqual(self.emails()[5], "five@x.com")
+        self.assertEqual(self.committer.stats()["durable_batches"], 1)
+
+    def test_unopenable_database_fails_callers(self, _print):
+        """A writer that cannot open the database fails its callers and restarts"""
+        directory = os.path.join(self.tmpdir.name, "missing")
+        committer = GroupCommitter(os.path.join(directory, "users.db"))
+        future = committer.submit(update_email, (1, "one@x.com"))
+        self.assertRaises(sqlite3.OperationalError, future.result, 5)
+        future = committer.submit(update_email, (1, "one@x.com"))
+        self.assertRaises(sqlite3.OperationalError, future.result, 5)
+        self.assertEqual(committer.stats()["writer_failures"], 2)
+
+        os.mkdir(directory)
+        conn = sqlite3.connect(os.path.join(directory, "users.db"))
+        conn.execute("CREATE TABLE users (id INTEGER PRIMARY KEY, email TEXT)")
+        conn.close()
+        self.assertIsNone(committer.submit(update_email, (1, "one@x.com")).result(5))
+        committer.close()
+
+    def test_base_exceptions_stay_with_their_caller(self, _print):
+        """An operation raising SystemExit fails alone; the writer carries on"""
+        def exit_midway(conn):
+            update_email(conn, 1, "one@x.com")
+            raise SystemExit(1)
+
+        failed = self.committer.submit(exit_midway)
+        self.assertRaises(SystemExit, failed.result, 5)
+        self.update(2, "two@x.com")
+        emails = self.emails()
+        self.assertEqual((emails[1], emails[2]), ("1@x.com", "two@x.com"))
+        self.assertEqual(self.committer.stats()["writer_failures"], 0)
+
+
+class TestTransactional(unittest.TestCase):
+    """Tests for the per-call transactional decorator"""
+
+    @mock.patch("builtins.print")
+    def test_rollback_on_error(self, _print):
+        """An exception rolls back the call's changes"""
+        conn = sqlite3.connect(":memory:")
+        conn.execute("CREATE TABLE users (id INTEGER, email TEXT)")
+        conn.execute("INSERT INTO users VALUES (1, 'a@x.com')")
+        conn.commit()
+
+        @transactional
+        def failing_update(conn):
+            update_email(conn, 1, "b@x.com")
+            raise ValueError("boom")
+
+        self.assertRaises(ValueError, failing_update, conn)
+        self.assertEqual(conn.execute("SELECT email FROM users").fetchone(), ("a@x.com",))
+        conn.close()
+
+
+@mock.patch("builtins.print")
+class TestNestedTransactions(unittest.TestCase):
+    """Tests for savepoint-based nesting"""
+
+    def setUp(self):
+        """Open a database with one user and a second connection to observe it"""
+        self.tmpdir = tempfile.TemporaryDirectory()
+        database = os.path.join(self.tmpdir.name, "users.db")
+        self.conn = sqlite3.connect(database)
+        self.conn.execute("CREATE TABLE users (id INTEGER PRIMARY KEY, email TEXT UNIQUE)")
+        self.conn.execute("INSERT INTO users VALUES (1, 'a@x.com')")
+        self.conn.commit()
+        self.observer = sqlite3.connect(database)
+
+    def tearDown(self):
+        """Close both connections"""
+        self.conn.close()
+        self.observer.close()
+        self.tmpdir.cleanup()
+
+    def count(self):
+        """Committed user count, as seen from another connection"""
+        return self.observer.execute("SELECT COUNT(*) FROM users").fetchone()[0]
+
+    def test_outermost_call_commits(self, _print):
+        """Inner calls do not commit; the outermost one does"""
+        counts = []
+
+        @transactional
+        def add(conn, user_id):
+            conn.execute("INSERT INTO users VALUES (?, ?)", (user_id, f"{user_id}@x.com"))
+
+        @transactional
+        def add_many(conn, user_ids):
+            for user_id in user_ids:
+                add(conn, user_id)
+                counts.append(self.count())
+
+        add_many(self.conn, [2, 3, 4])
+        self.assertEqual(counts, [1, 1, 1])
+        self.assertEqual(self.count(), 4)
+        self.assertEqual(transactional_module.transaction_depth(self.conn), 0)
+
+    def test_inner_failure_rolls_back_savepoint(self, _print):
+        """A failed inner unit is undone alone when the outer call handles it"""
+        @transactional
+        def add(conn, user_id, email):
+            conn.execute("INSERT INTO users VALUES (?, ?)", (user_id, email))
+
+        @transactional
+        def add_all(conn, users):
+            for user_id, email in users:
+                try:
+                    add(conn, user_id, email)
+                except sqlite3.IntegrityError:
+                    pass
+
+        add_all(self.conn, [(2, "b@x.com"), (3, "b@x.com"), (4, "d@x.com")])
+        ids = [row[0] for row in self.observer.execute("SELECT id FROM users ORDER BY id")]
+        self.assertEqual(ids, [1, 2, 4])
+
+    def test_stacked_decorators_and_outer_failure(self, _print):
+        """Stacked decorators nest, and an outer failure undoes everything"""
+        @transactional
+        @transactional
+        def add_then_fail(conn):
+            conn.execute("INSERT INTO users VALUES (2, 'b@x.com')")
+            raise ValueError("boom")
+
+        self.assertRaises(ValueError, add_then_fail, self.conn)
+        self.assertEqual(self.count(), 1)
+        self.assertFalse(self.conn.in_transaction)
+
+    def test_group_commit_operations_nest(self, _print):
+        """transactional functions called inside a group operation use savepoints"""
+        @transactional
+        def add(conn, user_id):
+            conn.execute("INSERT INTO users VALUES (?, ?)", (user_id, f"{user_id}@x.com"))
+
+        def add_pair(conn, first, second):
+            add(conn, first)
+            add(conn, second)
+
+        committer = GroupCommitter(self.conn.execute("PRAGMA database_list")
+                                   .fetchone()[2])
+        try:
+            committer.submit(add_pair, (2, 3)).result()
+        finally:
+            committer.close()
+        self.assertEqual(self.count(), 3)
+
+    def test_grouped_calls_nest_in_grouped_calls(self, _print):
+        """A grouped function calling another on the same committer nests inline"""
+        committer = GroupCommitter(self.conn.execute("PRAGMA database_list")
+                                   .fetchone()[2])
+
+        @transactional(group=committer)
+        def add(conn, user_id, email):
+            conn.execute("INSERT INTO users VALUES (?, ?)", (user_id, email))
+
+        @transactional(group=committer)
+        def add_pair(conn, first, second):
+            add(first, f"{first}@x.com")
+            try:
+                add(second, "a@x.com")
+            except sqlite3.IntegrityError:
+                pass
+            return transactional_module.transaction_depth(conn)
+
+        depths = []
+        # On a thread, so that a deadlocked writer fails the test instead of hanging it.
+        caller = threading.Thread(
+            target=lambda: depths.extend([add_pair(2, 3), add_pair(4, 5)]), daemon=True)
+        caller.start()
+        caller.join(5)
+        self.assertFalse(caller.is_alive())
+        committer.close()
+        self.assertEqual(depths, [1, 1])
+        self.assertEqual(self.count(), 3)
+        self.assertEqual(committer.stats()["operations"], 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
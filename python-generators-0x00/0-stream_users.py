@@ -1,16 +1,97 @@
-import mysql.connector
 from seed import connect_to_prodev
+from streaming import fetch_chunks, merge_in_background
+from filters import UserId, where_clause
+from rows import convert_rows, row_factory
+
+def stream_users(arraysize=None, stats=None, output="dicts"):
+    # output="tuples", "rows" or "records" avoids a dict per row (rows.py).
+    if arraysize:
+        yield from stream_users_chunked(arraysize, stats, output)
+        return
 
-def stream_users():
     connection = connect_to_prodev()
     if connection:
-        cursor = connection.cursor(dictionary=True)
-        cursor.execute("SELECT * FROM user_data")
-        
-        row = cursor.fetchone()
-        while row is not None:
-            yield row
+        try:
+            cursor = connection.cursor(dictionary=(output == "dicts"))
+            cursor.execute("SELECT * FROM user_data")
+            make = None
+            if output != "dicts":
+                make = row_factory([column[0] for column in cursor.description],
+                                   output)
+
             row = cursor.fetchone()
-        
-        cursor.close()
-        connection.close()
\ No newline at end of file
+            while row is not None:
+                yield row if make is None else make(row)
+                row = cursor.fetchone()
+
+            cursor.close()
+        finally:
+            connection.close()
+
+def stream_users_chunked(arraysize=1000, stats=None, output="dicts"):
+    # Unbuffered cursor: rows stay on the server until fetchmany() asks for
+    # the next chunk, so client memory does not grow with the table.
+    connection = connect_to_prodev()
+    if connection:
+        try:
+            cursor = connection.cursor(dictionary=(output == "dicts"),
+                                       buffered=False)
+            cursor.execute("SELECT * FROM user_data")
+            names = [column[0] for column in cursor.description]
+            for chunk in fetch_chunks(cursor, arraysize, stats):
+                if output != "dicts":
+                    chunk = convert_rows(chunk, names, output)
+                yield from chunk
+            cursor.close()
+        finally:
+            connection.close()
+
+def key_ranges(connection, partitions):
+    # Split user_id into ranges holding roughly the same number of rows:
+    # boundary keys are read from the primary-key index at even offsets.
+    cursor = connection.cursor()
+    cursor.execute("SELECT COUNT(*) FROM user_data")
+    total = cursor.fetchone()[0]
+    bounds = []
+    for index in range(1, partitions):
+        cursor.execute(
+            "SELECT user_id FROM user_data ORDER BY user_id LIMIT 1 OFFSET %s",
+            (total * index // partitions,))
+        row = cursor.fetchone()
+        if row is not None and (not bounds or row[0] > bounds[-1]):
+            bounds.append(row[0])
+    cursor.close()
+    return list(zip([None] + bounds, bounds + [None]))
+
+def stream_user_range(low, high, arraysize=1000, ordered=False):
+    # Chunks of users with low <= user_id < high (None leaves a side open).
+    # Long scans use their own connection rather than holding a pooled one.
+    connection = connect_to_prodev(pooled=False)
+    if connection:
+        try:
+            condition, params = where_clause(
+                UserId >= low if low is not None else None,
+                UserId < high if high is not None else None)
+            order = " ORDER BY user_id" if ordered else ""
+            cursor = connection.cursor(dictionary=True, buffered=False)
+            cursor.execute(f"SELECT * FROM user_data{condition}{order}", params)
+            yield from fetch_chunks(cursor, arraysize)
+            cursor.close()
+        finally:
+            connection.close()
+
+def stream_users_partitioned(partitions=4, ordered=False, arraysize=1000,
+                             buffer=4):
+    # Each key range streams over its own connection and thread; chunks are
+    # merged through bounded queues. ordered=True yields users by user_id.
+    connection = connect_to_prodev()
+    if not connection:
+        return
+    ranges = key_ranges(connection, partitions)
+    connection.close()
+
+    streams = [stream_user_range(low, high, arraysize, ordered)
+               for low, high in ranges]
+    for chunk in merge_in_background(streams, buffer, ordered):
+        yield from chunk
+
@@ -1,26 +1,97 @@
-import mysql.connector
 from seed import connect_to_prodev
+from filters import Age, UserId, projection, where_clause
+from columnar import convert
+from rows import ROW_OUTPUTS, convert_rows
+from checkpoint import checkpointed
+
+def stream_users_in_batches(batch_size, keyset=False, where=None, columns=None,
+                            output="dicts"):
+    # output="tuples", "rows" or "records" yields lighter row objects
+    # (rows.py); "numpy" or "arrow" yields columnar batches (columnar.py).
+    if keyset:
+        yield from stream_users_by_key(batch_size, where, columns, output)
+        return
 
-def stream_users_in_batches(batch_size):
     offset = 0
     connection = connect_to_prodev()
+    select = projection(columns)
+    condition, params = where_clause(where)
     
-    while True:
-        cursor = connection.cursor(dictionary=True)
-        cursor.execute(f"SELECT * FROM user_data LIMIT {batch_size} OFFSET {offset}")
-        batch = cursor.fetchall()
-        cursor.close()
-        
-        if not batch:
-            connection.close()
-            break
-            
-        yield batch
-        offset += batch_size
-
-def batch_processing(batch_size):
-    for batch in stream_users_in_batches(batch_size):
+    try:
+        while True:
+            batch, names = fetch_batch(
+                connection,
+                f"SELECT {select} FROM user_data{condition} LIMIT %s OFFSET %s",
+                params + (batch_size, offset), output)
+
+            if not batch:
+                break
+
+            yield shape_batch(batch, names, output)
+            offset += batch_size
+    finally:
+        connection.close()
+
+def stream_users_by_key(batch_size, where=None, columns=None, output="dicts",
+                        after=None):
+    # Seek past the last user_id seen instead of skipping `offset` rows, so
+    # every page is a primary-key range read of the same cost. `after`
+    # resumes a scan from a previously seen user_id.
+    last_user_id = after
+    connection = connect_to_prodev()
+    select = projection(columns, required=("user_id",))
+
+    try:
+        while True:
+            after = UserId > last_user_id if last_user_id is not None else None
+            condition, params = where_clause(where, after)
+            batch, names = fetch_batch(
+                connection,
+                f"SELECT {select} FROM user_data{condition} "
+                "ORDER BY user_id LIMIT %s",
+                params + (batch_size,), output)
+
+            if not batch:
+                break
+
+            if output == "dicts":
+                last_user_id = batch[-1]['user_id']
+            else:
+                last_user_id = batch[-1][names.index('user_id')]
+            yield shape_batch(batch, names, output)
+    finally:
+        connection.close()
+
+def fetch_batch(connection, query, params, output="dicts"):
+    # Every output except dicts is built from plain tuples.
+    cursor = connection.cursor(dictionary=(output == "dicts"))
+    cursor.execute(query, params)
+    batch = cursor.fetchall()
+    names = [column[0] for column in cursor.description or ()]
+    cursor.close()
+    return batch, names
+
+def shape_batch(batch, names, output):
+    if output == "dicts":
+        return batch
+    if output in ROW_OUTPUTS:
+        return convert_rows(batch, names, output)
+    return convert(batch, names, output)
+
+def batch_processing(batch_size, keyset=False, where=Age > 25, columns=None,
+                     checkpoint=None):
+    # The age filter is evaluated by the database; only matching rows and
+    # the requested columns are fetched. With a checkpoint (see
+    # checkpoint.py) the scan runs in keyset order and resumes where the
+    # last run stopped.
+    if checkpoint is not None:
+        batches = checkpointed(
+            lambda after: stream_users_by_key(batch_size, where, columns,
+                                              after=after),
+            checkpoint)
+    else:
+        batches = stream_users_in_batches(batch_size, keyset, where, columns)
+    for batch in batches:
         for user in batch:
-            if user['age'] > 25:
-                yield user
-                ["return"]
+            yield user
+            ["return"]
@@ -1,5 +1,6 @@
-import mysql.connector
 from seed import connect_to_prodev
+from streaming import prefetch as prefetch_pages
+from checkpoint import checkpointed
 
 def paginate_users(page_size, offset):
     connection = connect_to_prodev()
@@ -9,11 +10,53 @@ def paginate_users(page_size, offset):
     connection.close()
     return rows
 
-def lazy_pagination(page_size):
+def paginate_users_after(page_size, last_user_id=None):
+    connection = connect_to_prodev()
+    cursor = connection.cursor(dictionary=True)
+    if last_user_id is None:
+        cursor.execute(
+            "SELECT * FROM user_data ORDER BY user_id LIMIT %s",
+            (page_size,))
+    else:
+        cursor.execute(
+            "SELECT * FROM user_data WHERE user_id > %s "
+            "ORDER BY user_id LIMIT %s",
+            (last_user_id, page_size))
+    rows = cursor.fetchall()
+    connection.close()
+    return rows
+
+def lazy_pagination(page_size, keyset=False, prefetch=0, checkpoint=None,
+                    after=None):
+    if checkpoint is not None:
+        # Keyset pages resumed from, and acknowledged to, the checkpoint.
+        yield from checkpointed(
+            lambda after: lazy_pagination(page_size, True, prefetch,
+                                          after=after),
+            checkpoint)
+        return
+
+    if prefetch:
+        # The next `prefetch` pages are fetched on a background thread while
+        # the consumer works on the current one.
+        yield from prefetch_pages(
+            lazy_pagination(page_size, keyset, after=after), prefetch)
+        return
+
+    if keyset or after is not None:
+        last_user_id = after
+        while True:
+            page = paginate_users_after(page_size, last_user_id)
+            if not page:
+                break
+            yield page
+            last_user_id = page[-1]['user_id']
+        return
+
     offset = 0
     while True:
         page = paginate_users(page_size, offset)
         if not page:
             break
         yield page
-        offset += page_size
\ No newline at end of file
+        offset += page_size
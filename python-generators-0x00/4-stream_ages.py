@@ -1,19 +1,71 @@
-import mysql.connector
 from seed import connect_to_prodev
+from streaming import fetch_chunks
+from filters import projection
+
+def stream_user_ages(arraysize=None, stats=None):
+    if arraysize:
+        yield from stream_user_ages_chunked(arraysize, stats)
+        return
 
-def stream_user_ages():
     connection = connect_to_prodev()
     if connection:
-        cursor = connection.cursor()
-        cursor.execute("SELECT age FROM user_data")
-        
-        row = cursor.fetchone()
-        while row is not None:
-            yield row[0]
+        try:
+            cursor = connection.cursor()
+            cursor.execute("SELECT age FROM user_data")
+
             row = cursor.fetchone()
-        
-        cursor.close()
+            while row is not None:
+                yield row[0]
+                row = cursor.fetchone()
+
+            cursor.close()
+        finally:
+            connection.close()
+
+def stream_user_ages_chunked(arraysize=1000, stats=None):
+    connection = connect_to_prodev()
+    if connection:
+        try:
+            cursor = connection.cursor(buffered=False)
+            cursor.execute("SELECT age FROM user_data")
+            for chunk in fetch_chunks(cursor, arraysize, stats):
+                for row in chunk:
+                    yield row[0]
+            cursor.close()
+        finally:
+            connection.close()
+
+def stream_column_chunks(columns=("age",), arraysize=10000, stats=None):
+    # Whole fetchmany() chunks of row tuples, for vectorized consumers.
+    connection = connect_to_prodev()
+    if connection:
+        try:
+            cursor = connection.cursor(buffered=False)
+            cursor.execute(f"SELECT {projection(columns)} FROM user_data")
+            yield from fetch_chunks(cursor, arraysize, stats)
+            cursor.close()
+        finally:
+            connection.close()
+
+def calculate_age_stats(columns=("age",), arraysize=10000, pushdown=False):
+    from aggregates import StreamingAggregator, sql_summary
+
+    if pushdown:
+        # Moments come from the database; only quantiles need a scan.
+        connection = connect_to_prodev()
+        summary = sql_summary(connection, columns)
         connection.close()
+        sketches = StreamingAggregator(columns, moments=False)
+        for chunk in stream_column_chunks(columns, arraysize):
+            sketches.update(chunk)
+        for name, quantiles in sketches.summary().items():
+            summary[name].update(quantiles)
+        return summary
+
+    aggregator = StreamingAggregator(columns)
+    for chunk in stream_column_chunks(columns, arraysize):
+        aggregator.update(chunk)
+    return aggregator.summary()
 
 def calculate_average_age():
     total = 0
@@ -0,0 +1,47 @@
+from seed import connect_to_prodev
+from filters import projection
+
+def stream_users_changed_since(watermark=None, batch_size=1000, columns=None):
+    # Yields users inserted or updated after `watermark`, oldest change
+    # first, and returns the watermark to pass to the next run. A watermark
+    # is the (updated_at, user_id) of the last change seen; None streams the
+    # whole table. Each page is a range read on the (updated_at, user_id)
+    # index, so a run costs the size of the change set, not of the table.
+    last = watermark
+    connection = connect_to_prodev()
+    select = projection(columns, required=("user_id", "updated_at"))
+
+    try:
+        while True:
+            cursor = connection.cursor(dictionary=True)
+            if last is None:
+                cursor.execute(
+                    f"SELECT {select} FROM user_data "
+                    "ORDER BY updated_at, user_id LIMIT %s",
+                    (batch_size,))
+            else:
+                cursor.execute(
+                    f"SELECT {select} FROM user_data "
+                    "WHERE (updated_at, user_id) > (%s, %s) "
+                    "ORDER BY updated_at, user_id LIMIT %s",
+                    (last[0], last[1], batch_size))
+            rows = cursor.fetchall()
+            cursor.close()
+
+            if not rows:
+                break
+
+            yield from rows
+            last = (rows[-1]['updated_at'], rows[-1]['user_id'])
+    finally:
+        connection.close()
+    return last
+
+def sync_changes(watermark, handle, batch_size=1000):
+    # Calls handle(user) for every change and returns the new watermark.
+    changes = stream_users_changed_since(watermark, batch_size)
+    while True:
+        try:
+            handle(next(changes))
+        except StopIteration as done:
+            return done.value
@@ -0,0 +1,233 @@
+"""Single-pass, mergeable statistics over numeric user_data columns.
+
+Each aggregator consumes whole chunks of rows as NumPy arrays: moments are
+combined with Welford/Chan updates and quantiles come from a KLL sketch, so
+partial states computed on separate streams can be merged.
+"""
+import math
+
+import numpy as np
+
+from filters import Column
+from seed import get_backend
+
+QUANTILES = (0.5, 0.95, 0.99)
+
+
+class Moments:
+    """Count, mean, variance, min and max, updated a chunk at a time."""
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def update(self, values):
+        values = np.asarray(values, dtype=float)
+        if not values.size:
+            return self
+        other = Moments()
+        other.count = values.size
+        other.mean = float(values.mean())
+        other.m2 = float(((values - other.mean) ** 2).sum())
+        other.min = float(values.min())
+        other.max = float(values.max())
+        return self.merge(other)
+
+    def merge(self, other):
+        # Chan et al. pairwise combination of two Welford states.
+        if not other.count:
+            return self
+        total = self.count + other.count
+        delta = other.mean - self.mean
+        self.mean += delta * other.count / total
+        self.m2 += other.m2 + delta * delta * self.count * other.count / total
+        self.count = total
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        return self
+
+    @property
+    def variance(self):
+        return self.m2 / self.count if self.count else math.nan
+
+    @property
+    def sample_variance(self):
+        return self.m2 / (self.count - 1) if self.count > 1 else math.nan
+
+    @property
+    def std(self):
+        return math.sqrt(self.variance) if self.count else math.nan
+
+
+class KLLSketch:
+    """KLL quantile sketch; ``k`` trades memory for rank accuracy.
+
+    Level ``h`` holds items of weight ``2 ** h``. A level that outgrows its
+    capacity is sorted and every other item (random offset) is promoted.
+    A returned quantile's rank is within ``3 / k`` of the requested one
+    (1.5% of the count for the default ``k=200``) with high probability.
+    """
+
+    def __init__(self, k=200, seed=None):
+        self.k = k
+        self.count = 0
+        self._levels = [np.empty(0)]
+        self._rng = np.random.default_rng(seed)
+
+    def _capacity(self, level):
+        depth = len(self._levels) - 1 - level
+        return max(2, math.ceil(self.k * (2 / 3) ** depth))
+
+    def update(self, values):
+        values = np.asarray(values, dtype=float).ravel()
+        if values.size:
+            self.count += values.size
+            self._levels[0] = np.concatenate((self._levels[0], values))
+            self._compress()
+        return self
+
+    def merge(self, other):
+        for level, items in enumerate(other._levels):
+            if level == len(self._levels):
+                self._levels.append(np.empty(0))
+            self._levels[level] = np.concatenate((self._levels[level], items))
+        self.count += other.count
+        self._compress()
+        return self
+
+    def _compress(self):
+        level = 0
+        while level < len(self._levels):
+            items = self._levels[level]
+            if items.size > self._capacity(level):
+                if level + 1 == len(self._levels):
+                    self._levels.append(np.empty(0))
+                items = np.sort(items)
+                even = items.size - items.size % 2
+                offset = int(self._rng.integers(2))
+                self._levels[level + 1] = np.concatenate(
+                    (self._levels[level + 1], items[offset:even:2]))
+                self._levels[level] = items[even:]
+            level += 1
+
+    def quantiles(self, qs=QUANTILES):
+        if not self.count:
+            return [math.nan for _ in qs]
+        values = np.concatenate(self._levels)
+        weights = np.concatenate([
+            np.full(items.size, 2.0 ** level)
+            for level, items in enumerate(self._levels)])
+        order = np.argsort(values, kind="stable")
+        values = values[order]
+        ranks = np.cumsum(weights[order])
+        targets = np.asarray(qs, dtype=float) * ranks[-1]
+        positions = np.searchsorted(ranks, targets, side="left")
+        positions = np.minimum(positions, values.size - 1)
+        return [float(value) for value in values[positions]]
+
+    def quantile(self, q):
+        return self.quantiles((q,))[0]
+
+
+class ColumnStats:
+    """Moments plus a quantile sketch for one numeric column.
+
+    With ``moments=False`` only the sketch is kept, for when the moments are
+    computed by the database (see :func:`sql_summary`). Merging such a state
+    into one with moments drops the moments, which no longer cover every
+    value.
+    """
+
+    def __init__(self, k=200, seed=None, moments=True):
+        self.moments = Moments() if moments else None
+        self.sketch = KLLSketch(k, seed)
+
+    def update(self, values):
+        values = np.asarray(values, dtype=float)
+        if self.moments is not None:
+            self.moments.update(values)
+        self.sketch.update(values)
+        return self
+
+    def merge(self, other):
+        if other.moments is None:
+            self.moments = None
+        elif self.moments is not None:
+            self.moments.merge(other.moments)
+        self.sketch.merge(other.sketch)
+        return self
+
+    def summary(self, qs=QUANTILES):
+        summary = {}
+        moments = self.moments
+        if moments is not None:
+            summary = {
+                "count": moments.count,
+                "mean": moments.mean if moments.count else math.nan,
+                "variance": moments.variance,
+                "std": moments.std,
+                "min": moments.min if moments.count else math.nan,
+                "max": moments.max if moments.count else math.nan,
+            }
+        for q, value in zip(qs, self.sketch.quantiles(qs)):
+            summary[f"p{q * 100:g}"] = value
+        return summary
+
+
+class StreamingAggregator:
+    """Per-column :class:`ColumnStats` fed by chunks of row tuples.
+
+    ``update`` takes a chunk as returned by ``fetchmany()`` with one value
+    per entry of ``columns`` in each row; NULLs are skipped.
+    """
+
+    def __init__(self, columns=("age",), k=200, seed=None, moments=True):
+        self.columns = tuple(Column(name).name for name in columns)
+        self.stats = {name: ColumnStats(k, seed, moments)
+                      for name in self.columns}
+
+    def update(self, chunk):
+        if not chunk:
+            return self
+        table = np.array(chunk, dtype=float).reshape(len(chunk), -1)
+        for index, name in enumerate(self.columns):
+            values = table[:, index]
+            self.stats[name].update(values[~np.isnan(values)])
+        return self
+
+    def merge(self, other):
+        for name in self.columns:
+            self.stats[name].merge(other.stats[name])
+        return self
+
+    def summary(self, qs=QUANTILES):
+        return {name: stats.summary(qs) for name, stats in self.stats.items()}
+
+
+def sql_summary(connection, columns=("age",)):
+    """Compute count/mean/variance/std/min/max in the database instead."""
+    names = [Column(name).name for name in columns]
+    variance = get_backend().variance_sql
+    select = ", ".join(
+        f"COUNT({name}), AVG({name}), {variance(name)}, MIN({name}), MAX({name})"
+        for name in names)
+    cursor = connection.cursor()
+    cursor.execute(f"SELECT {select} FROM user_data")
+    row = cursor.fetchone()
+    cursor.close()
+
+    summary = {}
+    for index, name in enumerate(names):
+        count, mean, variance, low, high = row[index * 5:index * 5 + 5]
+        summary[name] = {
+            "count": count,
+            "mean": float(mean) if count else math.nan,
+            "variance": float(variance) if count else math.nan,
+            "std": math.sqrt(float(variance)) if count else math.nan,
+            "min": float(low) if count else math.nan,
+            "max": float(high) if count else math.nan,
+        }
+    return summary
@@ -0,0 +1,266 @@
+"""Database backends for the user_data generators.
+
+The generator modules are written against the ``mysql.connector`` subset
+they use: ``connection.cursor(dictionary=..., buffered=...)``, ``%s``
+placeholders, ``fetchone``/``fetchmany``/``fetchall``, ``commit`` and
+``rollback``. ``MySQLBackend`` hands out real ``mysql.connector``
+connections; ``SQLiteBackend`` wraps ``sqlite3`` in the same API so the
+generators, tests and benchmarks run without a MySQL server. Dialect
+differences (DDL, upserts, aggregates) are exposed as backend attributes.
+"""
+import re
+import sqlite3
+
+
+class MySQLBackend:
+    name = "mysql"
+    supports_load_data = True
+
+    create_table_sql = """
+        CREATE TABLE IF NOT EXISTS user_data (
+            user_id VARCHAR(36) PRIMARY KEY,
+            name VARCHAR(255) NOT NULL,
+            email VARCHAR(255) NOT NULL,
+            age DECIMAL(10,0) NOT NULL,
+            updated_at TIMESTAMP(6) NOT NULL
+                DEFAULT CURRENT_TIMESTAMP(6) ON UPDATE CURRENT_TIMESTAMP(6),
+            INDEX (user_id),
+            INDEX (updated_at, user_id)
+        )
+    """
+
+    insert_sql = {
+        "ignore": """
+            INSERT IGNORE INTO user_data (user_id, name, email, age)
+            VALUES (%s, %s, %s, %s)
+        """,
+        "update": """
+            INSERT INTO user_data (user_id, name, email, age)
+            VALUES (%s, %s, %s, %s)
+            ON DUPLICATE KEY UPDATE
+                name = VALUES(name), email = VALUES(email), age = VALUES(age)
+        """,
+    }
+
+    def __init__(self, host='localhost', user='root', password='',
+                 database='ALX_prodev'):
+        import mysql.connector
+
+        self._driver = mysql.connector
+        self.Error = mysql.connector.Error
+        self.host = host
+        self.user = user
+        self.password = password
+        self.database = database
+
+    def connect_server(self):
+        return self._driver.connect(host=self.host, user=self.user,
+                                    password=self.password)
+
+    def connect(self, **options):
+        return self._driver.connect(host=self.host, user=self.user,
+                                    password=self.password,
+                                    database=self.database, **options)
+
+    def create_database(self, connection):
+        cursor = connection.cursor()
+        try:
+            cursor.execute(f"CREATE DATABASE IF NOT EXISTS {self.database}")
+        finally:
+            cursor.close()
+
+    def variance_sql(self, column):
+        return f"VAR_POP({column})"
+
+    def ensure_change_tracking(self, connection):
+        # Adds updated_at to tables created before change tracking existed.
+        cursor = connection.cursor()
+        try:
+            cursor.execute("""
+                SELECT COUNT(*) FROM information_schema.columns
+                WHERE table_schema = DATABASE() AND table_name = 'user_data'
+                    AND column_name = 'updated_at'
+            """)
+            if not cursor.fetchone()[0]:
+                cursor.execute("""
+                    ALTER TABLE user_data
+                        ADD COLUMN updated_at TIMESTAMP(6) NOT NULL
+                            DEFAULT CURRENT_TIMESTAMP(6)
+                            ON UPDATE CURRENT_TIMESTAMP(6),
+                        ADD INDEX (updated_at, user_id)
+                """)
+        finally:
+            cursor.close()
+
+
+class SQLiteBackend:
+    name = "sqlite"
+    supports_load_data = False
+    Error = sqlite3.Error
+
+    create_table_sql = """
+        CREATE TABLE IF NOT EXISTS user_data (
+            user_id VARCHAR(36) PRIMARY KEY,
+            name VARCHAR(255) NOT NULL,
+            email VARCHAR(255) NOT NULL,
+            age DECIMAL(10,0) NOT NULL,
+            updated_at TEXT NOT NULL
+                DEFAULT (strftime('%Y-%m-%d %H:%M:%f', 'now'))
+        )
+    """
+
+    change_tracking_sql = (
+        """
+        CREATE INDEX IF NOT EXISTS user_data_updated_at
+            ON user_data (updated_at, user_id)
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS user_data_touch
+            AFTER UPDATE OF user_id, name, email, age ON user_data
+        BEGIN
+            UPDATE user_data
+                SET updated_at = strftime('%Y-%m-%d %H:%M:%f', 'now')
+                WHERE user_id = NEW.user_id;
+        END
+        """,
+    )
+
+    insert_sql = {
+        "ignore": """
+            INSERT OR IGNORE INTO user_data (user_id, name, email, age)
+            VALUES (%s, %s, %s, %s)
+        """,
+        "update": """
+            INSERT INTO user_data (user_id, name, email, age)
+            VALUES (%s, %s, %s, %s)
+            ON CONFLICT (user_id) DO UPDATE SET
+                name = excluded.name, email = excluded.email, age = excluded.age
+        """,
+    }
+
+    def __init__(self, path='ALX_prodev.db'):
+        self.path = path
+
+    def connect_server(self):
+        return self.connect()
+
+    def connect(self, **options):
+        options.setdefault("check_same_thread", False)
+        return SQLiteConnection(sqlite3.connect(self.path, **options))
+
+    def create_database(self, connection):
+        # The database file is created by connect().
+        pass
+
+    def variance_sql(self, column):
+        return f"(AVG({column} * {column}) - AVG({column}) * AVG({column}))"
+
+    def ensure_change_tracking(self, connection):
+        # SQLite cannot add a column with a non-constant default, so older
+        # tables get a constant one and existing rows are stamped now.
+        cursor = connection.cursor()
+        try:
+            cursor.execute("SELECT name FROM pragma_table_info('user_data')")
+            if "updated_at" not in {row[0] for row in cursor.fetchall()}:
+                cursor.execute("""
+                    ALTER TABLE user_data ADD COLUMN updated_at TEXT NOT NULL
+                        DEFAULT '1970-01-01 00:00:00.000'
+                """)
+                cursor.execute("""
+                    UPDATE user_data
+                        SET updated_at = strftime('%Y-%m-%d %H:%M:%f', 'now')
+                """)
+            for statement in self.change_tracking_sql:
+                cursor.execute(statement)
+            connection.commit()
+        finally:
+            cursor.close()
+
+
+_PLACEHOLDER = re.compile(r"%(s|%)")
+
+
+def _qmark(query):
+    return _PLACEHOLDER.sub(lambda match: "?" if match.group(1) == "s" else "%",
+                            query)
+
+
+def _dict_row(cursor, row):
+    return {column[0]: value for column, value in zip(cursor.description, row)}
+
+
+class SQLiteConnection:
+    """``sqlite3`` connection with the mysql.connector calls the repo uses."""
+
+    def __init__(self, connection):
+        self._connection = connection
+
+    def cursor(self, dictionary=False, buffered=None):
+        # SQLite cursors already step through results lazily, so
+        # ``buffered`` needs no special handling.
+        cursor = self._connection.cursor()
+        if dictionary:
+            cursor.row_factory = _dict_row
+        return SQLiteCursor(cursor)
+
+    def ping(self):
+        self._connection.execute("SELECT 1").fetchall()
+
+    def is_connected(self):
+        try:
+            self.ping()
+        except sqlite3.Error:
+            return False
+        return True
+
+    def commit(self):
+        self._connection.commit()
+
+    def rollback(self):
+        self._connection.rollback()
+
+    def close(self):
+        self._connection.close()
+
+
+class SQLiteCursor:
+    """``sqlite3`` cursor accepting ``%s`` placeholders."""
+
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    @property
+    def arraysize(self):
+        return self._cursor.arraysize
+
+    @arraysize.setter
+    def arraysize(self, value):
+        self._cursor.arraysize = value
+
+    @property
+    def description(self):
+        return self._cursor.description
+
+    @property
+    def rowcount(self):
+        return self._cursor.rowcount
+
+    def execute(self, query, params=()):
+        self._cursor.execute(_qmark(query), tuple(params))
+        return self
+
+    def executemany(self, query, seq_of_params):
+        self._cursor.executemany(_qmark(query), seq_of_params)
+        return self
+
+    def fetchone(self):
+        return self._cursor.fetchone()
+
+    def fetchmany(self, size=None):
+        return self._cursor.fetchmany(self.arraysize if size is None else size)
+
+    def fetchall(self):
+        return self._cursor.fetchall()
+
+    def close(self):
+        self._cursor.close()
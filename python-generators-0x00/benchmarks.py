@@ -0,0 +1,398 @@
+#!/usr/bin/env python3
+"""Benchmarks for the user_data streaming generators.
+
+Run against the MySQL ALX_prodev database, or pass ``--sqlite[=PATH]`` to use
+a local SQLite file instead, e.g.::
+
+    python3 benchmarks.py pagination 1000
+    python3 benchmarks.py --sqlite suite 100000
+"""
+import contextlib
+import csv
+import importlib
+import io
+import multiprocessing
+import os
+import random
+import resource
+import sys
+import tempfile
+import time
+import tracemalloc
+import uuid
+
+import columnar
+import seed
+from backends import MySQLBackend, SQLiteBackend
+from filters import Age
+from streaming import StreamStats
+
+stream_users = importlib.import_module("0-stream_users")
+batch_processing = importlib.import_module("1-batch_processing")
+lazy_paginate = importlib.import_module("2-lazy_paginate")
+
+
+def timed_pages(pages):
+    """Yield (page_number, rows, seconds) for every page of a generator."""
+    number = 0
+    start = time.perf_counter()
+    for page in pages:
+        elapsed = time.perf_counter() - start
+        yield number, len(page), elapsed
+        number += 1
+        start = time.perf_counter()
+
+
+def bench_pagination(page_size=1000, samples=5):
+    """Compare the cost of each page for OFFSET and keyset pagination.
+
+    OFFSET pages get slower the further into the table they are, because
+    the server reads and discards every skipped row; keyset pages should
+    stay flat.
+    """
+    results = {}
+    for mode, keyset in (("offset", False), ("keyset", True)):
+        timings = [seconds for _, _, seconds in timed_pages(
+            batch_processing.stream_users_in_batches(page_size, keyset=keyset))]
+        results[mode] = timings
+
+    print(f"page_size={page_size}")
+    print(f"{'page':>8} {'offset ms':>12} {'keyset ms':>12}")
+    count = len(results["offset"])
+    if not count:
+        print("user_data is empty")
+        return results
+    step = max(1, (count - 1) // max(1, samples - 1))
+    for number in range(0, count, step):
+        print(f"{number:>8} {results['offset'][number] * 1000:>12.2f} "
+              f"{results['keyset'][number] * 1000:>12.2f}")
+    for mode, timings in results.items():
+        print(f"{mode}: {len(timings)} pages in {sum(timings):.3f}s")
+    return results
+
+
+def bench_streaming(*arraysizes):
+    """Compare row-at-a-time fetchone() with fetchmany() chunk sizes."""
+    arraysizes = arraysizes or (100, 1000, 10000)
+    start = time.perf_counter()
+    rows = sum(1 for _ in stream_users.stream_users())
+    elapsed = time.perf_counter() - start
+    print(f"{'arraysize':>10} {'rows':>10} {'rows/s':>12} {'peak KiB':>10}")
+    print(f"{'fetchone':>10} {rows:>10} "
+          f"{rows / elapsed if elapsed else 0:>12.0f} {'-':>10}")
+
+    results = {}
+    for arraysize in arraysizes:
+        # tracemalloc slows allocation down, so time and trace separately.
+        stats = StreamStats()
+        for _ in stream_users.stream_users(arraysize=arraysize, stats=stats):
+            pass
+        traced = StreamStats(trace_memory=True)
+        for _ in stream_users.stream_users(arraysize=arraysize, stats=traced):
+            pass
+        stats.peak_memory = traced.peak_memory
+        results[arraysize] = stats
+        print(f"{arraysize:>10} {stats.rows:>10} {stats.rows_per_sec:>12.0f} "
+              f"{stats.peak_memory / 1024:>10.1f}")
+    return results
+
+
+def payload_bytes(rows):
+    """Rough wire size of rows: the text length of every value fetched."""
+    return sum(len(str(value)) for row in rows for value in row.values())
+
+
+def bench_pushdown(batch_size=1000, min_age=25):
+    """Compare fetching SELECT * and filtering in Python with pushdown."""
+    start = time.perf_counter()
+    fetched = kept = size = 0
+    for batch in batch_processing.stream_users_in_batches(batch_size):
+        fetched += len(batch)
+        size += payload_bytes(batch)
+        kept += sum(1 for user in batch if user["age"] > min_age)
+    client_elapsed = time.perf_counter() - start
+
+    start = time.perf_counter()
+    pushed = pushed_size = 0
+    for batch in batch_processing.stream_users_in_batches(
+            batch_size, where=Age > min_age, columns=["name", "email"]):
+        pushed += len(batch)
+        pushed_size += payload_bytes(batch)
+    pushed_elapsed = time.perf_counter() - start
+
+    print(f"{'mode':>10} {'rows':>10} {'bytes':>12} {'seconds':>10}")
+    print(f"{'client':>10} {fetched:>10} {size:>12} {client_elapsed:>10.3f}")
+    print(f"{'pushdown':>10} {pushed:>10} {pushed_size:>12} "
+          f"{pushed_elapsed:>10.3f}")
+    if size:
+        print(f"pushdown transfers {pushed_size / size:.1%} of the bytes "
+              f"({kept} matching rows)")
+    return {"client": size, "pushdown": pushed_size}
+
+
+def bench_partitioned(*partition_counts):
+    """Full-table scan throughput for different partition counts."""
+    partition_counts = partition_counts or (1, 2, 4, 8)
+    print(f"{'partitions':>10} {'rows':>10} {'seconds':>10} {'rows/s':>12}")
+    results = {}
+    for partitions in partition_counts:
+        start = time.perf_counter()
+        rows = sum(1 for _ in stream_users.stream_users_partitioned(partitions))
+        elapsed = time.perf_counter() - start
+        results[partitions] = elapsed
+        print(f"{partitions:>10} {rows:>10} {elapsed:>10.3f} "
+              f"{rows / elapsed if elapsed else 0:>12.0f}")
+    return results
+
+
+def bench_prefetch(page_size=100, work_ms=2, *depths):
+    """Full pagination with simulated per-page work, with and without prefetch.
+
+    Without prefetch the total is fetch time plus work time; with it the
+    two overlap and the total approaches the larger of the two.
+    """
+    depths = depths or (0, 1, 4)
+    print(f"page_size={page_size} work={work_ms}ms per page")
+    print(f"{'prefetch':>10} {'pages':>8} {'seconds':>10}")
+    results = {}
+    for depth in depths:
+        start = time.perf_counter()
+        pages = 0
+        for _ in lazy_paginate.lazy_pagination(page_size, keyset=True,
+                                               prefetch=depth):
+            time.sleep(work_ms / 1000)
+            pages += 1
+        results[depth] = time.perf_counter() - start
+        print(f"{depth:>10} {pages:>8} {results[depth]:>10.3f}")
+    return results
+
+
+def bench_columnar(batch_size=10000):
+    """Memory per row of materialized batches for each output format."""
+    print(f"{'output':>8} {'rows':>10} {'bytes/row':>10} {'seconds':>10}")
+    results = {}
+    for output in ("dicts", "numpy", "arrow"):
+        if output != "dicts":
+            # Import numpy/pyarrow outside the traced region.
+            columnar.convert([], [], output)
+        tracemalloc.start()
+        start = time.perf_counter()
+        batches = list(batch_processing.stream_users_in_batches(
+            batch_size, keyset=True, output=output))
+        elapsed = time.perf_counter() - start
+        size = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        if output == "arrow":
+            # Arrow buffers live outside the Python allocator.
+            size += sum(batch.nbytes for batch in batches)
+        rows = sum(len(batch) for batch in batches)
+        results[output] = size / rows if rows else 0
+        print(f"{output:>8} {rows:>10} {results[output]:>10.0f} "
+              f"{elapsed:>10.3f}")
+        del batches
+    return results
+
+
+def seed_synthetic_users(count, batch_size=10000):
+    """Top user_data up to ``count`` rows of random users."""
+    connection = seed.connect_to_prodev()
+    seed.create_table(connection)
+    cursor = connection.cursor()
+    cursor.execute("SELECT COUNT(*) FROM user_data")
+    existing = cursor.fetchone()[0]
+    insert_sql = seed.get_backend().insert_sql["ignore"]
+    for start in range(existing, count, batch_size):
+        cursor.executemany(insert_sql, [
+            (str(uuid.uuid4()), f"User {number}", f"user{number}@example.com",
+             random.randint(18, 100))
+            for number in range(start, min(count, start + batch_size))])
+        connection.commit()
+    cursor.close()
+    connection.close()
+    return max(existing, count)
+
+
+def _flatten(batches):
+    for batch in batches:
+        yield from batch
+
+
+def _count_batches(batches):
+    for batch in batches:
+        yield range(len(batch))
+
+
+STRATEGIES = {
+    "fetchone": lambda: stream_users.stream_users(),
+    "fetchmany": lambda: stream_users.stream_users(arraysize=1000),
+    "partitioned": lambda: stream_users.stream_users_partitioned(4),
+    "partitioned_ordered":
+        lambda: stream_users.stream_users_partitioned(4, ordered=True),
+    "batches_offset":
+        lambda: _flatten(batch_processing.stream_users_in_batches(1000)),
+    "batches_keyset": lambda: _flatten(
+        batch_processing.stream_users_in_batches(1000, keyset=True)),
+    "batches_numpy": lambda: _flatten(_count_batches(
+        batch_processing.stream_users_in_batches(
+            1000, keyset=True, output="numpy"))),
+    "batches_arrow": lambda: _flatten(_count_batches(
+        batch_processing.stream_users_in_batches(
+            1000, keyset=True, output="arrow"))),
+    "lazy_offset": lambda: _flatten(lazy_paginate.lazy_pagination(1000)),
+    "lazy_keyset":
+        lambda: _flatten(lazy_paginate.lazy_pagination(1000, keyset=True)),
+    "lazy_prefetch": lambda: _flatten(
+        lazy_paginate.lazy_pagination(1000, keyset=True, prefetch=2)),
+}
+
+
+def use_backend(spec):
+    """Select the backend described by ``spec``: ("mysql",) or ("sqlite", path)."""
+    if spec[0] == "sqlite":
+        seed.set_backend(SQLiteBackend(spec[1]))
+    else:
+        seed.set_backend(MySQLBackend())
+
+
+def _run_strategy(spec, name, results):
+    use_backend(spec)
+    start = time.perf_counter()
+    first_row = None
+    rows = 0
+    for _ in STRATEGIES[name]():
+        if first_row is None:
+            first_row = time.perf_counter() - start
+        rows += 1
+    elapsed = time.perf_counter() - start
+    results.send({
+        "rows": rows,
+        "seconds": elapsed,
+        "rows_per_sec": rows / elapsed if elapsed else 0.0,
+        "first_row_ms": (first_row or 0.0) * 1000,
+        # ru_maxrss is in KiB on Linux.
+        "peak_rss_kib": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+    })
+    results.close()
+
+
+def bench_suite(count=100000, *names):
+    """Seed ``count`` users, then run every strategy in a fresh process.
+
+    A separate process per strategy keeps peak RSS figures independent.
+    """
+    rows = seed_synthetic_users(count)
+    print(f"{seed.get_backend().name}: {rows} users")
+    print(f"{'strategy':>20} {'rows':>9} {'rows/s':>10} "
+          f"{'first row ms':>13} {'peak RSS MiB':>13}")
+    context = multiprocessing.get_context("spawn")
+    results = {}
+    for name in names or STRATEGIES:
+        receiver, sender = context.Pipe(duplex=False)
+        process = context.Process(target=_run_strategy,
+                                  args=(BACKEND_SPEC, name, sender))
+        process.start()
+        sender.close()
+        result = receiver.recv()
+        process.join()
+        results[name] = result
+        print(f"{name:>20} {result['rows']:>9} {result['rows_per_sec']:>10.0f} "
+              f"{result['first_row_ms']:>13.2f} "
+              f"{result['peak_rss_kib'] / 1024:>13.1f}")
+    return results
+
+
+def bench_row_formats(count=1000000, retained=100000):
+    """Throughput over ``count`` users and memory of ``retained`` rows per format.
+
+    Memory and live allocation blocks are measured with tracemalloc on the
+    first ``retained`` rows held in a list; throughput streams them all.
+    """
+    seed_synthetic_users(count)
+    print(f"{'output':>8} {'rows/s':>10} {'bytes/row':>10} {'blocks/row':>11}")
+    results = {}
+    for output in ("dicts", "tuples", "rows", "records"):
+        start = time.perf_counter()
+        rows = sum(1 for _ in stream_users.stream_users(
+            arraysize=1000, output=output))
+        elapsed = time.perf_counter() - start
+
+        users = stream_users.stream_users(arraysize=1000, output=output)
+        tracemalloc.start()
+        held = [user for _, user in zip(range(retained), users)]
+        snapshot = tracemalloc.take_snapshot()
+        size = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        users.close()
+        blocks = sum(stat.count for stat in snapshot.statistics("filename"))
+        results[output] = {
+            "rows_per_sec": rows / elapsed if elapsed else 0.0,
+            "bytes_per_row": size / len(held) if held else 0.0,
+            "blocks_per_row": blocks / len(held) if held else 0.0,
+        }
+        print(f"{output:>8} {results[output]['rows_per_sec']:>10.0f} "
+              f"{results[output]['bytes_per_row']:>10.0f} "
+              f"{results[output]['blocks_per_row']:>11.1f}")
+        del held
+    return results
+
+
+def bench_seed(count=200000, *workers):
+    """Load a ``count``-row CSV serially and with each number of ``workers``.
+
+    The file carries its own user_ids and every load upserts, so after an
+    untimed first load each run writes the same rows.
+    """
+    workers = workers or (0, 2, 4)
+    with tempfile.TemporaryDirectory() as tmpdir:
+        filename = os.path.join(tmpdir, "user_data.csv")
+        with open(filename, "w", newline="") as file:
+            writer = csv.writer(file)
+            writer.writerow(["user_id", "name", "email", "age"])
+            for number in range(count):
+                writer.writerow([uuid.uuid4(), f"User {number}",
+                                 f"user{number}@example.com",
+                                 random.randint(18, 100)])
+        connection = seed.connect_to_prodev()
+        seed.create_table(connection)
+        with contextlib.redirect_stdout(io.StringIO()):
+            seed.insert_data_bulk(connection, filename, 10000)
+        print(f"{'workers':>8} {'rows/s':>10} {'seconds':>10}")
+        results = {}
+        for count_workers in workers:
+            with contextlib.redirect_stdout(io.StringIO()):
+                stats = seed.insert_data_bulk(
+                    connection, filename, 10000, on_duplicate="update",
+                    workers=count_workers)
+            results[count_workers] = stats["rows_per_sec"]
+            print(f"{count_workers:>8} {stats['rows_per_sec']:>10.0f} "
+                  f"{stats['seconds']:>10.3f}")
+        connection.close()
+    return results
+
+
+BENCHMARKS = {
+    "pagination": bench_pagination,
+    "streaming": bench_streaming,
+    "pushdown": bench_pushdown,
+    "partitioned": bench_partitioned,
+    "prefetch": bench_prefetch,
+    "columnar": bench_columnar,
+    "suite": bench_suite,
+    "rows": bench_row_formats,
+    "seed": bench_seed,
+}
+
+BACKEND_SPEC = ("mysql",)
+
+
+if __name__ == "__main__":
+    argv = sys.argv[1:]
+    if argv and argv[0].startswith("--sqlite"):
+        path = argv.pop(0).partition("=")[2]
+        BACKEND_SPEC = ("sqlite", path or os.path.join(
+            tempfile.gettempdir(), "alx_prodev_bench.db"))
+    use_backend(BACKEND_SPEC)
+    name = argv[0] if argv else "pagination"
+    args = [arg if name == "suite" and not arg.isdigit() else int(arg)
+            for arg in argv[1:]]
+    BENCHMARKS[name](*args)
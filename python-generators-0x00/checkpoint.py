@@ -0,0 +1,131 @@
+"""Durable checkpoints for resumable keyset streams over user_data.
+
+A checkpoint stores the last ``user_id`` of the last batch the consumer has
+acknowledged, i.e. the batch before the one it asks for next. A restarted
+job resumes right after that key, so acknowledged batches are not delivered
+again and unacknowledged ones are. With ``every=N`` the key is persisted
+every N batches (and when the stream is closed), so a hard crash can replay
+at most N - 1 acknowledged batches. A finished pass clears the checkpoint.
+"""
+import json
+import os
+import tempfile
+
+from seed import connect_to_prodev
+
+
+class FileCheckpoint:
+    """Checkpoint kept in a small JSON state file shared by several jobs."""
+
+    def __init__(self, path, job, every=1):
+        self.path = path
+        self.job = job
+        self.every = every
+
+    def _read(self):
+        try:
+            with open(self.path) as file:
+                return json.load(file)
+        except FileNotFoundError:
+            return {}
+
+    def _write(self, state):
+        # Write a temporary file and rename it over the old one, so a crash
+        # leaves either the previous or the new state on disk.
+        directory = os.path.dirname(os.path.abspath(self.path))
+        descriptor, temporary = tempfile.mkstemp(dir=directory)
+        try:
+            with os.fdopen(descriptor, "w") as file:
+                json.dump(state, file)
+                file.flush()
+                os.fsync(file.fileno())
+            os.replace(temporary, self.path)
+        except BaseException:
+            os.unlink(temporary)
+            raise
+
+    def load(self):
+        return self._read().get(self.job)
+
+    def save(self, key):
+        state = self._read()
+        state[self.job] = key
+        self._write(state)
+
+    def clear(self):
+        state = self._read()
+        if state.pop(self.job, None) is not None:
+            self._write(state)
+
+
+class TableCheckpoint:
+    """Checkpoint kept in the stream_checkpoints table of the database."""
+
+    def __init__(self, job, every=1):
+        self.job = job
+        self.every = every
+        self._execute(("""
+            CREATE TABLE IF NOT EXISTS stream_checkpoints (
+                job VARCHAR(255) PRIMARY KEY,
+                last_key VARCHAR(36) NOT NULL
+            )
+        """, ()))
+
+    def _execute(self, *statements):
+        # (query, params) pairs run in one transaction on a borrowed
+        # connection; returns the rows of the last SELECT.
+        connection = connect_to_prodev()
+        try:
+            cursor = connection.cursor()
+            rows = None
+            for query, params in statements:
+                cursor.execute(query, params)
+                if cursor.description:
+                    rows = cursor.fetchall()
+            cursor.close()
+            connection.commit()
+            return rows
+        finally:
+            connection.close()
+
+    def load(self):
+        rows = self._execute(
+            ("SELECT last_key FROM stream_checkpoints WHERE job = %s",
+             (self.job,)))
+        return rows[0][0] if rows else None
+
+    def save(self, key):
+        self._execute(
+            ("DELETE FROM stream_checkpoints WHERE job = %s", (self.job,)),
+            ("INSERT INTO stream_checkpoints (job, last_key) VALUES (%s, %s)",
+             (self.job, key)))
+
+    def clear(self):
+        self._execute(
+            ("DELETE FROM stream_checkpoints WHERE job = %s", (self.job,)))
+
+
+def checkpointed(stream, checkpoint):
+    """Resume ``stream(after)`` from ``checkpoint`` and record progress.
+
+    ``stream`` is called with the last acknowledged ``user_id`` (or None)
+    and must yield lists of user dicts in ``user_id`` order.
+    """
+    acknowledged = checkpoint.load()
+    pending = 0
+    finished = False
+    try:
+        for batch in stream(acknowledged):
+            yield batch
+            # The consumer asked for more, so it is done with this batch.
+            acknowledged = batch[-1]['user_id']
+            pending += 1
+            if pending >= checkpoint.every:
+                checkpoint.save(acknowledged)
+                pending = 0
+        finished = True
+    finally:
+        if finished:
+            checkpoint.clear()
+        elif pending:
+            checkpoint.save(acknowledged)
@@ -0,0 +1,73 @@
+"""Columnar batch formats for the user_data generators.
+
+Rows fetched as tuples are transposed once per batch into NumPy structured
+arrays or ``pyarrow.RecordBatch`` objects, with ``age`` stored as a number,
+``updated_at`` as a microsecond timestamp and the other columns as strings.
+NumPy has no compact variable-length string, so its string fields are
+UTF-8 ``bytes`` (``S`` dtype, as wide as the longest value in the batch);
+``<U`` would spend four bytes per character. NumPy and pyarrow are only
+imported when the corresponding format is requested.
+"""
+
+OUTPUTS = ("dicts", "numpy", "arrow")
+NUMERIC_COLUMNS = ("age",)
+TIMESTAMP_COLUMNS = ("updated_at",)
+
+
+def _transpose(rows, names):
+    if not rows:
+        return [() for _ in names]
+    return list(zip(*rows))
+
+
+def to_numpy(rows, names):
+    """Return ``rows`` as a NumPy structured array with one field per name."""
+    import numpy as np
+
+    fields = []
+    arrays = []
+    for name, values in zip(names, _transpose(rows, names)):
+        if name in NUMERIC_COLUMNS:
+            array = np.fromiter((int(value) for value in values),
+                                dtype=np.int32, count=len(values))
+        elif name in TIMESTAMP_COLUMNS:
+            # datetime objects (MySQL) and ISO strings (SQLite) both parse.
+            array = np.array(values, dtype="datetime64[us]")
+        else:
+            array = np.array([value.encode() for value in values], dtype=bytes)
+        fields.append((name, array.dtype))
+        arrays.append(array)
+
+    batch = np.empty(len(rows), dtype=fields)
+    for (name, _), array in zip(fields, arrays):
+        batch[name] = array
+    return batch
+
+
+def to_arrow(rows, names):
+    """Return ``rows`` as a ``pyarrow.RecordBatch``."""
+    import pyarrow as pa
+
+    arrays = []
+    for name, values in zip(names, _transpose(rows, names)):
+        if name in NUMERIC_COLUMNS:
+            arrays.append(pa.array([int(value) for value in values],
+                                   type=pa.int32()))
+        elif name in TIMESTAMP_COLUMNS:
+            if values and isinstance(values[0], str):
+                arrays.append(pa.array(values, type=pa.string())
+                              .cast(pa.timestamp("us")))
+            else:
+                arrays.append(pa.array(values, type=pa.timestamp("us")))
+        else:
+            arrays.append(pa.array(values, type=pa.string()))
+    return pa.RecordBatch.from_arrays(arrays, names=list(names))
+
+
+def convert(rows, names, output):
+    """Convert a batch of tuple rows to ``output`` (see ``OUTPUTS``)."""
+    if output == "numpy":
+        return to_numpy(rows, names)
+    if output == "arrow":
+        return to_arrow(rows, names)
+    raise ValueError(f"Unknown batch output: {output!r}")
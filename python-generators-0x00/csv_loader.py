@@ -0,0 +1,76 @@
+"""Parallel parsing of large seed CSV files.
+
+The file is split into byte ranges that end on line boundaries; each range
+is decoded, parsed and validated (``seed.parse_user_row``, including UUID
+generation) in a worker process. Parsed batches reach the database writer
+through a bounded queue, so parsing overlaps with inserts and at most a few
+chunks are held in memory at once.
+
+Line splitting assumes no quoted field contains a newline, which holds for
+the seed data (name, email, age).
+"""
+import csv
+import functools
+import io
+import os
+
+import pipeline
+from seed import parse_user_row
+
+CHUNK_BYTES = 4 * 1024 * 1024
+
+
+def split_csv(filename, chunk_bytes=CHUNK_BYTES):
+    """Return the header fields and (start, end) byte ranges of the rows."""
+    size = os.path.getsize(filename)
+    with open(filename, "rb") as file:
+        header = next(csv.reader([file.readline().decode("utf-8-sig")]), [])
+        spans = []
+        start = file.tell()
+        while start < size:
+            file.seek(min(start + chunk_bytes, size))
+            file.readline()
+            end = min(file.tell(), size)
+            spans.append((start, end))
+            start = end
+    return header, spans
+
+
+def parse_span(filename, fieldnames, span):
+    """Parse one byte range; returns (rows read, valid INSERT parameters)."""
+    start, end = span
+    with open(filename, "rb") as file:
+        file.seek(start)
+        text = file.read(end - start).decode("utf-8")
+    rows = 0
+    valid = []
+    for row in csv.DictReader(io.StringIO(text, newline=""),
+                              fieldnames=fieldnames):
+        rows += 1
+        value = parse_user_row(row)
+        if value is not None:
+            valid.append(value)
+    return rows, valid
+
+
+def parse_csv_parallel(filename, batch_size=1000, workers=None,
+                       chunk_bytes=CHUNK_BYTES, queue_size=4):
+    """Yield (rows read, valid parameters) batches parsed in a process pool.
+
+    ``queue_size`` bounds the parsed chunks waiting for the writer; each
+    chunk is handed on in slices of at most ``batch_size`` rows.
+    """
+    workers = workers or os.cpu_count() or 1
+    header, spans = split_csv(filename, chunk_bytes)
+    parsed = pipeline.pipeline(
+        spans,
+        pipeline.parallel_map(functools.partial(parse_span, filename, header),
+                              workers=workers, processes=True),
+        buffer=queue_size)
+    for rows, valid in parsed:
+        if not valid:
+            yield rows, valid
+            continue
+        for offset in range(0, len(valid), batch_size):
+            # Count every row read against the first slice of its chunk.
+            yield (rows if offset == 0 else 0), valid[offset:offset + batch_size]
@@ -0,0 +1,109 @@
+"""Filter and projection specs compiled into parameterized SQL.
+
+Build predicates from the column objects and pass them to the batch
+generators so the database only returns the rows and columns needed::
+
+    from filters import Age, Email
+    batch_processing(100, where=(Age > 25) & Email.like("%@gmail.com"),
+                     columns=["name", "email"])
+"""
+
+USER_COLUMNS = ("user_id", "name", "email", "age", "updated_at")
+
+
+class Predicate:
+    """A SQL boolean expression with ``%s`` placeholders and its params."""
+
+    def __init__(self, sql, params=()):
+        self.sql = sql
+        self.params = tuple(params)
+
+    def __and__(self, other):
+        return Predicate(f"({self.sql}) AND ({other.sql})",
+                         self.params + other.params)
+
+    def __or__(self, other):
+        return Predicate(f"({self.sql}) OR ({other.sql})",
+                         self.params + other.params)
+
+    def __invert__(self):
+        return Predicate(f"NOT ({self.sql})", self.params)
+
+    def __repr__(self):
+        return f"Predicate({self.sql!r}, {self.params!r})"
+
+
+class Column:
+    """A user_data column usable on the left-hand side of a comparison."""
+
+    __hash__ = None
+
+    def __init__(self, name):
+        if name not in USER_COLUMNS:
+            raise ValueError(f"Unknown user_data column: {name!r}")
+        self.name = name
+
+    def _compare(self, operator, value):
+        return Predicate(f"{self.name} {operator} %s", (value,))
+
+    def __eq__(self, value):
+        return self._compare("=", value)
+
+    def __ne__(self, value):
+        return self._compare("<>", value)
+
+    def __lt__(self, value):
+        return self._compare("<", value)
+
+    def __le__(self, value):
+        return self._compare("<=", value)
+
+    def __gt__(self, value):
+        return self._compare(">", value)
+
+    def __ge__(self, value):
+        return self._compare(">=", value)
+
+    def between(self, low, high):
+        return Predicate(f"{self.name} BETWEEN %s AND %s", (low, high))
+
+    def isin(self, values):
+        values = tuple(values)
+        if not values:
+            return Predicate("1 = 0")
+        placeholders = ", ".join(["%s"] * len(values))
+        return Predicate(f"{self.name} IN ({placeholders})", values)
+
+    def like(self, pattern):
+        return self._compare("LIKE", pattern)
+
+
+UserId = Column("user_id")
+Name = Column("name")
+Email = Column("email")
+Age = Column("age")
+UpdatedAt = Column("updated_at")
+
+
+def projection(columns=None, required=()):
+    """Return the SELECT list for ``columns``, adding any ``required`` ones."""
+    if columns is None:
+        return "*"
+    selected = list(columns)
+    for name in selected:
+        Column(name)
+    for name in required:
+        if name not in selected:
+            selected.append(name)
+    return ", ".join(selected)
+
+
+def where_clause(where=None, *extra):
+    """Combine predicates into a ``WHERE ...`` string and its params."""
+    predicates = [p for p in (where,) + extra if p is not None]
+    if not predicates:
+        return "", ()
+    combined = predicates[0]
+    for predicate in predicates[1:]:
+        combined = combined & predicate
+    return f" WHERE {combined.sql}", combined.params
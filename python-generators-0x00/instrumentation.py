@@ -0,0 +1,127 @@
+"""Throughput and memory instrumentation for the user_data generators.
+
+``instrument`` wraps any of the generators (``stream_users``,
+``stream_users_in_batches``, ``batch_processing``, ``lazy_pagination``, ...)
+and measures it while it is consumed::
+
+    report = StreamReport()
+    for page in instrument(lazy_pagination(100), report):
+        handle(page)
+    print(report)
+
+Time spent inside the wrapped generator's ``next()`` (waiting on the
+database and building rows) is ``producer_seconds``; time between two items,
+spent in the consumer's loop body, is ``consumer_seconds``.
+"""
+import time
+import tracemalloc
+
+
+class StreamReport:
+    """Metrics filled in by ``instrument``."""
+
+    def __init__(self, name=None):
+        self.name = name
+        self.rows = 0
+        self.batches = 0
+        self.elapsed = 0.0
+        self.producer_seconds = 0.0
+        self.consumer_seconds = 0.0
+        self.first_item_seconds = None
+        self.peak_memory = 0
+        self.finished = False
+
+    @property
+    def rows_per_sec(self):
+        return self.rows / self.elapsed if self.elapsed else 0.0
+
+    @property
+    def batches_per_sec(self):
+        return self.batches / self.elapsed if self.elapsed else 0.0
+
+    def as_dict(self):
+        return {
+            "name": self.name,
+            "rows": self.rows,
+            "batches": self.batches,
+            "elapsed": self.elapsed,
+            "rows_per_sec": self.rows_per_sec,
+            "batches_per_sec": self.batches_per_sec,
+            "producer_seconds": self.producer_seconds,
+            "consumer_seconds": self.consumer_seconds,
+            "first_item_seconds": self.first_item_seconds,
+            "peak_memory": self.peak_memory,
+            "finished": self.finished,
+        }
+
+    def __repr__(self):
+        return f"StreamReport({self.as_dict()})"
+
+
+def is_batch(item):
+    """True for lists of rows and NumPy/Arrow batches, False for single rows."""
+    return isinstance(item, list) or hasattr(item, "num_rows") or (
+        getattr(item, "ndim", 0) == 1)
+
+
+def instrument(stream, report=None, callback=None, trace_memory=True,
+               interval=None):
+    """Yield the items of ``stream`` while recording a ``StreamReport``.
+
+    Items that are batches (see ``is_batch``) count as one batch of
+    ``len(item)`` rows; anything else counts as one row. ``callback(report)``
+    is called every ``interval`` seconds if given, and once when the stream
+    ends, fails or is closed. With ``trace_memory`` the stream runs under
+    ``tracemalloc`` (started here unless already tracing) and
+    ``peak_memory`` is the peak traced allocation in bytes.
+    """
+    report = StreamReport() if report is None else report
+    tracing = False
+    if trace_memory and not tracemalloc.is_tracing():
+        tracemalloc.start()
+        tracing = True
+    iterator = iter(stream)
+    start = last_report = time.perf_counter()
+
+    try:
+        while True:
+            before = time.perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                report.producer_seconds += time.perf_counter() - before
+                report.finished = True
+                return
+            produced = time.perf_counter()
+            report.producer_seconds += produced - before
+            if report.first_item_seconds is None:
+                report.first_item_seconds = produced - start
+            if is_batch(item):
+                report.batches += 1
+                report.rows += len(item)
+            else:
+                report.rows += 1
+            if callback is not None and interval is not None and (
+                    produced - last_report >= interval):
+                report.elapsed = produced - start
+                _sample_memory(report, trace_memory)
+                callback(report)
+                last_report = produced
+            yield item
+            report.consumer_seconds += time.perf_counter() - produced
+    finally:
+        report.elapsed = time.perf_counter() - start
+        _sample_memory(report, trace_memory)
+        if tracing:
+            tracemalloc.stop()
+        close = getattr(iterator, "close", None)
+        if close is not None:
+            close()
+        if callback is not None:
+            callback(report)
+
+
+def _sample_memory(report, trace_memory):
+    if trace_memory and tracemalloc.is_tracing():
+        report.peak_memory = max(report.peak_memory,
+                                 tracemalloc.get_traced_memory()[1])
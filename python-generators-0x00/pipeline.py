@@ -0,0 +1,135 @@
+"""Composable generator stages for processing streams of users.
+
+A stage is a callable that takes an iterator and returns one. ``pipeline``
+runs every stage on its own thread and connects neighbouring stages with
+bounded queues, so a slow stage holds back the ones before it instead of
+letting rows pile up in memory::
+
+    import pipeline as pl
+
+    stream_users = importlib.import_module("0-stream_users").stream_users
+    written = pl.run(
+        stream_users(arraysize=1000),
+        pl.filter(lambda user: user["age"] > 25),
+        pl.parallel_map(score, workers=4),
+        pl.batch(500),
+        pl.sink(write_batch),
+    )
+
+``filter`` and ``map`` deliberately shadow the builtins; import the module
+rather than the names.
+"""
+import builtins
+import collections
+import concurrent.futures
+import itertools
+
+from streaming import prefetch
+
+
+def batch(size):
+    """Group items into lists of ``size`` (the last one may be shorter)."""
+    def stage(items):
+        items = iter(items)
+        while True:
+            chunk = list(itertools.islice(items, size))
+            if not chunk:
+                return
+            yield chunk
+    return stage
+
+
+def filter(predicate):
+    """Keep the items for which ``predicate(item)`` is true."""
+    def stage(items):
+        return builtins.filter(predicate, items)
+    return stage
+
+
+def map(function):
+    """Replace every item with ``function(item)``."""
+    def stage(items):
+        return builtins.map(function, items)
+    return stage
+
+
+def parallel_map(function, workers=4, ordered=True, processes=False):
+    """Apply ``function`` on a pool of ``workers`` threads or processes.
+
+    At most ``2 * workers`` items are in flight at once. With
+    ``processes=True`` the function and items must be picklable; use it for
+    CPU-bound functions that would otherwise be serialized by the GIL.
+    """
+    def stage(items):
+        executor_class = (concurrent.futures.ProcessPoolExecutor if processes
+                          else concurrent.futures.ThreadPoolExecutor)
+        limit = 2 * workers
+        with executor_class(max_workers=workers) as executor:
+            if ordered:
+                pending = collections.deque()
+                for item in items:
+                    pending.append(executor.submit(function, item))
+                    if len(pending) >= limit:
+                        yield pending.popleft().result()
+                while pending:
+                    yield pending.popleft().result()
+            else:
+                pending = set()
+                for item in items:
+                    pending.add(executor.submit(function, item))
+                    if len(pending) >= limit:
+                        done, pending = concurrent.futures.wait(
+                            pending,
+                            return_when=concurrent.futures.FIRST_COMPLETED)
+                        for future in done:
+                            yield future.result()
+                for future in concurrent.futures.as_completed(pending):
+                    yield future.result()
+    return stage
+
+
+def window(size, step=1):
+    """Yield tuples of ``size`` consecutive items, advancing by ``step``."""
+    def stage(items):
+        current = collections.deque(maxlen=size)
+        skip = 0
+        for item in items:
+            current.append(item)
+            if skip:
+                skip -= 1
+                continue
+            if len(current) == size:
+                yield tuple(current)
+                skip = step - 1
+    return stage
+
+
+def sink(function):
+    """Call ``function(item)`` for every item; yields the item count at the end."""
+    def stage(items):
+        count = 0
+        for item in items:
+            function(item)
+            count += 1
+        yield count
+    return stage
+
+
+def pipeline(source, *stages, buffer=64):
+    """Connect ``source`` and ``stages`` with bounded queues of ``buffer`` items.
+
+    Every stage runs on its own thread. Closing the returned generator stops
+    all of them and closes ``source``.
+    """
+    items = prefetch(source, buffer)
+    for stage in stages:
+        items = prefetch(stage(items), buffer)
+    return items
+
+
+def run(source, *stages, buffer=64):
+    """Drain a pipeline and return the last item it produced (or None)."""
+    result = None
+    for result in pipeline(source, *stages, buffer=buffer):
+        pass
+    return result
@@ -0,0 +1,173 @@
+"""Bounded, thread-safe connection pool used behind seed.connect_to_prodev().
+
+The pool is driver agnostic: it takes a zero-argument ``connect`` callable,
+so the same code pools MySQL connections in production and SQLite
+connections in the tests.
+"""
+import threading
+import time
+
+
+class PoolTimeout(Exception):
+    """No connection became available within the checkout timeout."""
+
+
+def ping(connection):
+    """Raise if ``connection`` is no longer usable."""
+    if hasattr(connection, "ping"):
+        connection.ping()
+        return
+    cursor = connection.cursor()
+    cursor.execute("SELECT 1")
+    cursor.fetchall()
+    cursor.close()
+
+
+class PooledConnection:
+    """Proxy for a pooled connection; ``close()`` hands it back to the pool."""
+
+    def __init__(self, pool, connection):
+        self._pool = pool
+        self._connection = connection
+
+    def __getattr__(self, name):
+        return getattr(self._connection, name)
+
+    def close(self):
+        if self._pool is not None:
+            pool, self._pool = self._pool, None
+            pool.release(self._connection)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+class ConnectionPool:
+    """Keep up to ``size`` connections open and lend them out.
+
+    Idle connections are pinged on checkout and replaced if the check fails;
+    connections are rolled back on return so no transaction leaks between
+    borrowers. ``acquire`` blocks while all ``size`` connections are lent
+    out, for at most ``timeout`` seconds if one is given.
+    """
+
+    def __init__(self, connect, size=5, timeout=None, health_check=ping):
+        self._connect = connect
+        self.size = size
+        self.timeout = timeout
+        self._health_check = health_check
+        self._idle = []
+        self._open = 0
+        self._closed = False
+        self._condition = threading.Condition()
+        self._counters = {
+            "created": 0,
+            "checkouts": 0,
+            "reused": 0,
+            "waits": 0,
+            "wait_seconds": 0.0,
+            "failed_checks": 0,
+            "discarded": 0,
+        }
+
+    def acquire(self):
+        deadline = None if self.timeout is None else time.monotonic() + self.timeout
+        while True:
+            connection = self._checkout(deadline)
+            if connection is None:
+                return self._create()
+            try:
+                self._health_check(connection)
+            except Exception:
+                self._discard(connection, "failed_checks")
+                continue
+            with self._condition:
+                self._counters["checkouts"] += 1
+                self._counters["reused"] += 1
+            return PooledConnection(self, connection)
+
+    def _checkout(self, deadline):
+        # Returns an idle connection, or None after reserving a slot for a
+        # new one.
+        with self._condition:
+            waited = None
+            while True:
+                if self._closed:
+                    raise RuntimeError("Connection pool is closed")
+                if self._idle:
+                    connection = self._idle.pop()
+                    break
+                if self._open < self.size:
+                    self._open += 1
+                    connection = None
+                    break
+                if waited is None:
+                    waited = time.monotonic()
+                    self._counters["waits"] += 1
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    self._counters["wait_seconds"] += time.monotonic() - waited
+                    raise PoolTimeout(f"No connection available after {self.timeout}s")
+                self._condition.wait(remaining)
+            if waited is not None:
+                self._counters["wait_seconds"] += time.monotonic() - waited
+            return connection
+
+    def _create(self):
+        try:
+            connection = self._connect()
+        except BaseException:
+            with self._condition:
+                self._open -= 1
+                self._condition.notify()
+            raise
+        with self._condition:
+            self._counters["created"] += 1
+            self._counters["checkouts"] += 1
+        return PooledConnection(self, connection)
+
+    def release(self, connection):
+        try:
+            connection.rollback()
+        except Exception:
+            # e.g. an unbuffered result left unread by a consumer that
+            # stopped early: the connection cannot be reused safely.
+            self._discard(connection, "discarded")
+            return
+        with self._condition:
+            if self._closed:
+                self._open -= 1
+                connection.close()
+            else:
+                self._idle.append(connection)
+            self._condition.notify()
+
+    def _discard(self, connection, counter):
+        try:
+            connection.close()
+        except Exception:
+            pass
+        with self._condition:
+            self._open -= 1
+            self._counters[counter] += 1
+            self._condition.notify()
+
+    def close(self):
+        with self._condition:
+            self._closed = True
+            idle, self._idle = self._idle, []
+            self._open -= len(idle)
+            self._condition.notify_all()
+        for connection in idle:
+            connection.close()
+
+    def stats(self):
+        with self._condition:
+            stats = dict(self._counters)
+            stats.update(size=self.size, open=self._open,
+                         idle=len(self._idle),
+                         in_use=self._open - len(self._idle))
+        return stats
@@ -0,0 +1,89 @@
+"""Row representations for the user_data generators.
+
+A dictionary cursor builds a new dict per row. The other formats convert
+the plain tuples a cursor returns anyway:
+
+- ``"tuples"``: the cursor's tuples, untouched.
+- ``"rows"``: a tuple subclass sharing one column index per schema, so
+  ``row["age"]`` works like a dict at the size of a tuple.
+- ``"records"``: instances of a ``__slots__`` class with one attribute per
+  column (``record.age``, also ``record["age"]``).
+"""
+import functools
+
+ROW_OUTPUTS = ("dicts", "tuples", "rows", "records")
+
+
+@functools.lru_cache(maxsize=None)
+def row_class(names):
+    """Tuple subclass for ``names`` that also accepts column-name keys."""
+    index = {name: position for position, name in enumerate(names)}
+
+    class Row(tuple):
+        __slots__ = ()
+        _fields = names
+
+        def __getitem__(self, key):
+            if isinstance(key, str):
+                key = index[key]
+            return tuple.__getitem__(self, key)
+
+        def get(self, key, default=None):
+            position = index.get(key)
+            return default if position is None else tuple.__getitem__(self, position)
+
+        def keys(self):
+            return names
+
+        def as_dict(self):
+            return dict(zip(names, self))
+
+        def __repr__(self):
+            return f"Row({self.as_dict()!r})"
+
+    return Row
+
+
+@functools.lru_cache(maxsize=None)
+def record_class(names):
+    """``__slots__`` class with one attribute per column in ``names``."""
+    def __init__(self, *values):
+        for name, value in zip(names, values):
+            setattr(self, name, value)
+
+    def __getitem__(self, key):
+        return getattr(self, key)
+
+    def __repr__(self):
+        values = ", ".join(f"{name}={getattr(self, name)!r}" for name in names)
+        return f"UserRecord({values})"
+
+    return type("UserRecord", (), {
+        "__slots__": names,
+        "__init__": __init__,
+        "__getitem__": __getitem__,
+        "__repr__": __repr__,
+    })
+
+
+def row_factory(names, output):
+    """Return a function converting one tuple row to ``output``."""
+    names = tuple(names)
+    if output == "tuples":
+        return tuple
+    if output == "rows":
+        return row_class(names)
+    if output == "records":
+        make = record_class(names)
+        return lambda row: make(*row)
+    if output == "dicts":
+        return lambda row: dict(zip(names, row))
+    raise ValueError(f"Unknown row output: {output!r}")
+
+
+def convert_rows(rows, names, output):
+    """Convert a list of tuple rows to ``output`` (see ``ROW_OUTPUTS``)."""
+    if output == "tuples":
+        return rows
+    make = row_factory(names, output)
+    return [make(row) for row in rows]
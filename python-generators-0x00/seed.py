@@ -1,84 +1,200 @@
-import mysql.connector
 import csv
+import itertools
+import threading
+import time
 import uuid
-from mysql.connector import Error
+from decimal import Decimal, InvalidOperation
+from backends import MySQLBackend
+from pool import ConnectionPool
+
+POOL_SIZE = 5
+# Seconds to wait for a pooled connection: a leaked one raises PoolTimeout
+# instead of blocking forever.
+POOL_TIMEOUT = 30
+
+USER_COLUMNS = ("user_id", "name", "email", "age")
+
+_backend = None
+_pool = None
+_pool_lock = threading.Lock()
+
+def get_backend():
+    global _backend
+    with _pool_lock:
+        if _backend is None:
+            _backend = MySQLBackend()
+    return _backend
+
+def set_backend(backend):
+    # Switch every generator to another backend, e.g. SQLiteBackend(path);
+    # None restores the default MySQL backend.
+    global _backend, _pool
+    with _pool_lock:
+        _backend, old_pool, _pool = backend, _pool, None
+    if old_pool is not None:
+        old_pool.close()
 
 def connect_db():
+    backend = get_backend()
     try:
-        connection = mysql.connector.connect(
-            host='localhost',
-            user='root',
-            password=''
-        )
+        connection = backend.connect_server()
         return connection
-    except Error as e:
+    except backend.Error as e:
         print(f"Error connecting to MySQL: {e}")
         return None
 
 def create_database(connection):
+    backend = get_backend()
     try:
-        cursor = connection.cursor()
-        cursor.execute("CREATE DATABASE IF NOT EXISTS ALX_prodev")
+        backend.create_database(connection)
         print("Database ALX_prodev created successfully")
-    except Error as e:
+    except backend.Error as e:
         print(f"Error creating database: {e}")
-    finally:
-        if cursor:
-            cursor.close()
 
-def connect_to_prodev():
+def get_pool():
+    global _pool
+    backend = get_backend()
+    with _pool_lock:
+        if _pool is None:
+            _pool = ConnectionPool(backend.connect, size=POOL_SIZE,
+                                   timeout=POOL_TIMEOUT)
+    return _pool
+
+def connect_to_prodev(pooled=True, **options):
+    # Pooled connections go back to the pool on close(); extra connection
+    # options always get a dedicated connection.
+    backend = get_backend()
     try:
-        connection = mysql.connector.connect(
-            host='localhost',
-            user='root',
-            password='',
-            database='ALX_prodev'
-        )
+        if pooled and not options:
+            return get_pool().acquire()
+        connection = backend.connect(**options)
         return connection
-    except Error as e:
+    except backend.Error as e:
         print(f"Error connecting to ALX_prodev: {e}")
         return None
 
 def create_table(connection):
+    backend = get_backend()
+    cursor = None
     try:
         cursor = connection.cursor()
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS user_data (
-                user_id VARCHAR(36) PRIMARY KEY,
-                name VARCHAR(255) NOT NULL,
-                email VARCHAR(255) NOT NULL,
-                age DECIMAL(10,0) NOT NULL,
-                INDEX (user_id)
-            )
-        """)
+        cursor.execute(backend.create_table_sql)
+        backend.ensure_change_tracking(connection)
         print("Table user_data created successfully")
-    except Error as e:
+    except backend.Error as e:
         print(f"Error creating table: {e}")
     finally:
         if cursor:
             cursor.close()
 
-def insert_data(connection, filename):
+def insert_data(connection, filename, batch_size=1000):
+    # Existing users are skipped by INSERT IGNORE instead of a SELECT per row.
     try:
-        cursor = connection.cursor()
-        
-        # Read CSV file
-        with open(filename, mode='r') as file:
-            csv_reader = csv.DictReader(file)
-            
-            for row in csv_reader:
-                # Check if user already exists
-                cursor.execute("SELECT 1 FROM user_data WHERE user_id = %s", (row['user_id'],))
-                if cursor.fetchone() is None:
-                    cursor.execute("""
-                        INSERT INTO user_data (user_id, name, email, age)
-                        VALUES (%s, %s, %s, %s)
-                    """, (row['user_id'], row['name'], row['email'], row['age']))
-        
-        connection.commit()
+        insert_data_bulk(connection, filename, batch_size)
         print("Data inserted successfully")
-    except Error as e:
+    except get_backend().Error as e:
         print(f"Error inserting data: {e}")
+
+def read_csv_chunks(filename, batch_size):
+    with open(filename, mode='r', newline='') as file:
+        csv_reader = csv.DictReader(file)
+        while True:
+            chunk = list(itertools.islice(csv_reader, batch_size))
+            if not chunk:
+                break
+            yield chunk
+
+def parse_user_row(row):
+    # Returns the INSERT parameters, or None for a row that must be rejected.
+    try:
+        name = (row.get('name') or '').strip()
+        email = (row.get('email') or '').strip()
+        age = Decimal((row.get('age') or '').strip())
+    except (AttributeError, InvalidOperation):
+        return None
+    if not name or not email or not age.is_finite():
+        return None
+    user_id = (row.get('user_id') or '').strip() or str(uuid.uuid4())
+    return (user_id, name, email, int(age.to_integral_value()))
+
+def insert_data_bulk(connection, filename, batch_size=1000,
+                     on_duplicate="ignore", load_data=False, workers=0):
+    # workers > 0 parses the file in a process pool (csv_loader.py) while
+    # this process inserts the batches already parsed.
+    if load_data:
+        return load_data_infile(connection, filename, on_duplicate)
+    if workers:
+        from csv_loader import parse_csv_parallel
+        batches = parse_csv_parallel(filename, batch_size, workers)
+    else:
+        batches = parse_csv_batches(filename, batch_size)
+    return write_batches(connection, batches, on_duplicate)
+
+def parse_csv_batches(filename, batch_size):
+    # Yields (rows read, valid INSERT parameters) per batch.
+    for chunk in read_csv_chunks(filename, batch_size):
+        values = [parse_user_row(row) for row in chunk]
+        yield len(chunk), [value for value in values if value is not None]
+
+def write_batches(connection, batches, on_duplicate="ignore"):
+    insert_sql = get_backend().insert_sql[on_duplicate]
+    stats = {"rows": 0, "inserted": 0, "rejected": 0}
+    start = time.perf_counter()
+    cursor = connection.cursor()
+    try:
+        for rows, valid in batches:
+            stats["rows"] += rows
+            stats["rejected"] += rows - len(valid)
+            if not valid:
+                continue
+            # mysql.connector rewrites executemany INSERTs into a single
+            # multi-row INSERT: one round-trip and one commit per batch.
+            cursor.executemany(insert_sql, valid)
+            connection.commit()
+            if on_duplicate == "ignore":
+                stats["inserted"] += cursor.rowcount
+                stats["rejected"] += len(valid) - cursor.rowcount
+            else:
+                stats["inserted"] += len(valid)
     finally:
-        if cursor:
-            cursor.close()
\ No newline at end of file
+        cursor.close()
+    return _finish_load(stats, start)
+
+def load_data_infile(connection, filename, on_duplicate="ignore"):
+    # Needs a connection opened with connect_to_prodev(allow_local_infile=True)
+    # and local_infile enabled on the server. Unknown CSV columns are skipped.
+    if not get_backend().supports_load_data:
+        raise ValueError(
+            f"LOAD DATA LOCAL INFILE is not supported by {get_backend().name}")
+    with open(filename, mode='r', newline='') as file:
+        header = next(csv.reader(file), [])
+        rows = sum(1 for _ in file)
+    columns = [name if name in USER_COLUMNS else '@skip' for name in header]
+    assign = "" if "user_id" in header else " SET user_id = UUID()"
+    keyword = "REPLACE" if on_duplicate == "update" else "IGNORE"
+
+    stats = {"rows": rows, "inserted": 0, "rejected": 0}
+    start = time.perf_counter()
+    cursor = connection.cursor()
+    try:
+        cursor.execute(f"""
+            LOAD DATA LOCAL INFILE %s {keyword} INTO TABLE user_data
+            FIELDS TERMINATED BY ',' OPTIONALLY ENCLOSED BY '"'
+            LINES TERMINATED BY '\\n'
+            IGNORE 1 LINES ({", ".join(columns)}){assign}
+        """, (filename,))
+        connection.commit()
+        stats["inserted"] = cursor.rowcount
+        stats["rejected"] = max(0, rows - cursor.rowcount)
+    finally:
+        cursor.close()
+    return _finish_load(stats, start)
+
+def _finish_load(stats, start):
+    stats["seconds"] = time.perf_counter() - start
+    stats["rows_per_sec"] = (stats["rows"] / stats["seconds"]
+                             if stats["seconds"] else 0.0)
+    print(f"Loaded {stats['inserted']} of {stats['rows']} rows "
+          f"({stats['rejected']} rejected) at {stats['rows_per_sec']:.0f} rows/s")
+    return stats
+
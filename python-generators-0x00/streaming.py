@@ -0,0 +1,162 @@
+"""Helpers shared by the user_data streaming generators."""
+import queue
+import threading
+import time
+import tracemalloc
+
+_DONE = object()
+
+
+class StreamStats:
+    """Counters filled in by a chunked stream, used to tune ``arraysize``.
+
+    With ``trace_memory=True`` the stream runs under ``tracemalloc`` and
+    ``peak_memory`` holds the peak traced Python allocation in bytes.
+    """
+
+    def __init__(self, trace_memory=False):
+        self.trace_memory = trace_memory
+        self.chunk_size = 0
+        self.chunks = 0
+        self.rows = 0
+        self.peak_chunk_rows = 0
+        self.peak_memory = 0
+        self.elapsed = 0.0
+
+    @property
+    def rows_per_sec(self):
+        return self.rows / self.elapsed if self.elapsed else 0.0
+
+    def as_dict(self):
+        return {
+            "chunk_size": self.chunk_size,
+            "chunks": self.chunks,
+            "rows": self.rows,
+            "peak_chunk_rows": self.peak_chunk_rows,
+            "peak_memory": self.peak_memory,
+            "elapsed": self.elapsed,
+            "rows_per_sec": self.rows_per_sec,
+        }
+
+    def __repr__(self):
+        return f"StreamStats({self.as_dict()})"
+
+
+def fetch_chunks(cursor, arraysize, stats=None):
+    """Yield lists of up to ``arraysize`` rows read with ``fetchmany``.
+
+    Only one chunk is held at a time, so with an unbuffered cursor client
+    memory is bounded by ``arraysize`` rather than by the table size.
+    """
+    cursor.arraysize = arraysize
+    tracing = False
+    if stats is not None:
+        stats.chunk_size = arraysize
+        if stats.trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            tracing = True
+    start = time.perf_counter()
+
+    try:
+        while True:
+            chunk = cursor.fetchmany(arraysize)
+            if not chunk:
+                break
+            if stats is not None:
+                stats.chunks += 1
+                stats.rows += len(chunk)
+                stats.peak_chunk_rows = max(stats.peak_chunk_rows, len(chunk))
+            yield chunk
+    finally:
+        if stats is not None:
+            stats.elapsed += time.perf_counter() - start
+            if stats.trace_memory and tracemalloc.is_tracing():
+                stats.peak_memory = max(stats.peak_memory,
+                                        tracemalloc.get_traced_memory()[1])
+            if tracing:
+                tracemalloc.stop()
+
+
+class _Failure:
+    def __init__(self, error):
+        self.error = error
+
+
+def _put(items, item, stop):
+    # Block while the buffer is full, but give up once the consumer is gone.
+    while not stop.is_set():
+        try:
+            items.put(item, timeout=0.1)
+            return True
+        except queue.Full:
+            pass
+    return False
+
+
+def _produce(iterable, items, stop):
+    iterator = iter(iterable)
+    try:
+        for item in iterator:
+            if not _put(items, item, stop):
+                return
+        _put(items, _DONE, stop)
+    except BaseException as error:
+        _put(items, _Failure(error), stop)
+    finally:
+        close = getattr(iterator, "close", None)
+        if close is not None:
+            close()
+
+
+def merge_in_background(iterables, buffer=4, ordered=False):
+    """Drain every iterable on its own thread and yield their items.
+
+    Each producer may run at most ``buffer`` items ahead of the consumer.
+    With ``ordered=True`` all items of the first iterable come first, then
+    the second, and so on; otherwise items are yielded as they arrive.
+    Closing the generator stops the producers and closes their iterables.
+    """
+    iterables = list(iterables)
+    stop = threading.Event()
+    if ordered:
+        queues = [queue.Queue(buffer) for _ in iterables]
+    else:
+        queues = [queue.Queue(buffer * max(1, len(iterables)))]
+    threads = [
+        threading.Thread(target=_produce,
+                         args=(iterable, queues[index % len(queues)], stop),
+                         daemon=True)
+        for index, iterable in enumerate(iterables)]
+    for thread in threads:
+        thread.start()
+
+    try:
+        if ordered:
+            for items in queues:
+                yield from _drain(items, 1)
+        else:
+            yield from _drain(queues[0], len(threads))
+    finally:
+        stop.set()
+        for thread in threads:
+            thread.join()
+
+
+def prefetch(iterable, depth=1):
+    """Read up to ``depth`` items of ``iterable`` ahead on a background thread.
+
+    Closing the returned generator stops the reader and closes ``iterable``.
+    """
+    return merge_in_background([iterable], buffer=depth, ordered=True)
+
+
+def _drain(items, producers):
+    while producers:
+        item = items.get()
+        if item is _DONE:
+            producers -= 1
+        elif isinstance(item, _Failure):
+            raise item.error
+        else:
+            yield item
+
@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+"""Tests for the mergeable streaming statistics on the SQLite backend"""
+
+import contextlib
+import csv
+import importlib
+import io
+import os
+import random
+import tempfile
+import unittest
+
+import numpy as np
+
+import seed
+from aggregates import ColumnStats, KLLSketch, Moments, StreamingAggregator
+from backends import SQLiteBackend
+
+stream_ages = importlib.import_module("4-stream_ages")
+
+USERS = 5000
+# Rank error allowed by the KLLSketch docstring for the default k=200.
+RANK_ERROR = 3 / 200
+
+
+def rank_error(values, estimate, q):
+    """Distance between q and the rank range of estimate in values"""
+    low = np.searchsorted(values, estimate, side="left") / values.size
+    high = np.searchsorted(values, estimate, side="right") / values.size
+    if low <= q <= high:
+        return 0.0
+    return min(abs(low - q), abs(high - q))
+
+
+class TestAggregates(unittest.TestCase):
+    """Merge partial states computed over chunks of a seeded database"""
+
+    @classmethod
+    def setUpClass(cls):
+        """Seed a temporary database with USERS random ages"""
+        cls.tmpdir = tempfile.TemporaryDirectory()
+        seed.set_backend(SQLiteBackend(os.path.join(cls.tmpdir.name, "t.db")))
+        generator = random.Random(7)
+        filename = os.path.join(cls.tmpdir.name, "user_data.csv")
+        with open(filename, "w", newline="") as file:
+            writer = csv.writer(file)
+            writer.writerow(["name", "email", "age"])
+            for number in range(USERS):
+                writer.writerow([f"User {number}", f"u{number}@x.com",
+                                 generator.randint(18, 120)])
+        with contextlib.redirect_stdout(io.StringIO()):
+            connection = seed.connect_to_prodev()
+            seed.create_table(connection)
+            seed.insert_data_bulk(connection, filename, 1000)
+            connection.close()
+        cls.chunks = list(stream_ages.stream_column_chunks(arraysize=700))
+        cls.ages = np.array([row[0] for chunk in cls.chunks for row in chunk],
+                            dtype=float)
+
+    @classmethod
+    def tearDownClass(cls):
+        """Drop the pool and the temporary database"""
+        seed.set_backend(None)
+        cls.tmpdir.cleanup()
+
+    def test_merged_moments_match_numpy(self):
+        """Moments merged from per-chunk states equal NumPy's"""
+        self.assertEqual(self.ages.size, USERS)
+        merged = Moments()
+        for chunk in self.chunks:
+            merged.merge(Moments().update([row[0] for row in chunk]))
+        self.assertEqual(merged.count, USERS)
+        self.assertAlmostEqual(merged.mean, self.ages.mean(), places=9)
+        self.assertAlmostEqual(merged.variance, self.ages.var(), places=6)
+        self.assertAlmostEqual(merged.sample_variance,
+                               self.ages.var(ddof=1), places=6)
+        self.assertAlmostEqual(merged.std, self.ages.std(), places=9)
+        self.assertEqual((merged.min, merged.max),
+                         (self.ages.min(), self.ages.max()))
+
+    def test_merged_sketch_quantiles_within_bound(self):
+        """Quantiles of merged KLL sketches are within the stated rank error"""
+        ordered = np.sort(self.ages)
+        for trial in range(5):
+            merged = KLLSketch(seed=trial)
+            for number, chunk in enumerate(self.chunks):
+                part = KLLSketch(seed=trial * 100 + number)
+                merged.merge(part.update([row[0] for row in chunk]))
+            self.assertEqual(merged.count, USERS)
+            for q in (0.05, 0.25, 0.5, 0.75, 0.95, 0.99):
+                self.assertLessEqual(
+                    rank_error(ordered, merged.quantile(q), q), RANK_ERROR)
+
+    def test_streaming_aggregator_merge(self):
+        """Two aggregators over halves merge into the single-pass summary"""
+        whole = StreamingAggregator(seed=1)
+        halves = [StreamingAggregator(seed=2), StreamingAggregator(seed=3)]
+        for number, chunk in enumerate(self.chunks):
+            whole.update(chunk)
+            halves[number % 2].update(chunk)
+        merged = halves[0].merge(halves[1]).summary()["age"]
+        expected = whole.summary()["age"]
+        for name in ("count", "mean", "variance", "std", "min", "max"):
+            self.assertAlmostEqual(merged[name], expected[name], places=6)
+        ordered = np.sort(self.ages)
+        for q in (0.5, 0.95, 0.99):
+            self.assertLessEqual(
+                rank_error(ordered, merged[f"p{q * 100:g}"], q), RANK_ERROR)
+
+    def test_merge_sketch_only_state(self):
+        """Merging a moments=False state drops the moments, keeps the sketch"""
+        full = ColumnStats(seed=1).update(self.ages[:100])
+        sketch_only = ColumnStats(seed=2, moments=False).update(self.ages[100:])
+        full.merge(sketch_only)
+        self.assertIsNone(full.moments)
+        self.assertEqual(full.sketch.count, USERS)
+        self.assertEqual(set(full.summary()), {"p50", "p95", "p99"})
+
+    def test_calculate_age_stats_pushdown(self):
+        """Database moments agree with the scanned ones"""
+        scanned = stream_ages.calculate_age_stats(arraysize=900)["age"]
+        pushed = stream_ages.calculate_age_stats(arraysize=900,
+                                                 pushdown=True)["age"]
+        expected = {"mean": self.ages.mean(), "variance": self.ages.var(),
+                    "std": self.ages.std(), "min": self.ages.min(),
+                    "max": self.ages.max()}
+        self.assertEqual(pushed["count"], USERS)
+        for name, value in expected.items():
+            self.assertAlmostEqual(scanned[name], value, places=6)
+            self.assertAlmostEqual(pushed[name], value, places=6)
+        ordered = np.sort(self.ages)
+        for q in (0.5, 0.95, 0.99):
+            self.assertLessEqual(
+                rank_error(ordered, pushed[f"p{q * 100:g}"], q), RANK_ERROR)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+"""Tests for the generator modules running on the SQLite backend"""
+
+import contextlib
+import csv
+import datetime
+import importlib
+import io
+import itertools
+import os
+import tempfile
+import unittest
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+try:
+    import pyarrow as pa
+except ImportError:
+    pa = None
+
+import seed
+from backends import SQLiteBackend
+from filters import Age
+
+stream_users = importlib.import_module("0-stream_users")
+batch_processing = importlib.import_module("1-batch_processing")
+lazy_paginate = importlib.import_module("2-lazy_paginate")
+stream_ages = importlib.import_module("4-stream_ages")
+
+AGES = [17, 25, 26, 40, 63, 30, 21, 90, 55, 26, 33, 19]
+
+
+class TestSQLiteBackend(unittest.TestCase):
+    """Stream, batch and paginate users from a seeded SQLite database"""
+
+    @classmethod
+    def setUpClass(cls):
+        """Seed a temporary database through seed.insert_data"""
+        cls.tmpdir = tempfile.TemporaryDirectory()
+        seed.set_backend(SQLiteBackend(os.path.join(cls.tmpdir.name, "t.db")))
+        filename = os.path.join(cls.tmpdir.name, "user_data.csv")
+        with open(filename, "w", newline="") as file:
+            writer = csv.writer(file)
+            writer.writerow(["name", "email", "age"])
+            for number, age in enumerate(AGES):
+                writer.writerow([f"User {number}", f"u{number}@x.com", age])
+            writer.writerow(["No Age", "none@x.com", ""])
+        with contextlib.redirect_stdout(io.StringIO()):
+            connection = seed.connect_to_prodev()
+            seed.create_table(connection)
+            cls.load_stats = seed.insert_data_bulk(connection, filename, 5)
+            connection.close()
+
+    @classmethod
+    def tearDownClass(cls):
+        """Drop the pool and the temporary database"""
+        seed.set_backend(None)
+        cls.tmpdir.cleanup()
+
+    def test_bulk_load_rejects_invalid_rows(self):
+        """Valid rows are inserted and the row without an age is rejected"""
+        self.assertEqual(self.load_stats["inserted"], len(AGES))
+        self.assertEqual(self.load_stats["rejected"], 1)
+
+    def test_stream_users_modes_agree(self):
+        """fetchone, fetchmany and partitioned scans return the same users"""
+        expected = sorted(user["user_id"] for user in stream_users.stream_users())
+        self.assertEqual(len(expected), len(AGES))
+        chunked = [user["user_id"]
+                   for user in stream_users.stream_users(arraysize=5)]
+        ordered = [user["user_id"] for user in
+                   stream_users.stream_users_partitioned(3, ordered=True)]
+        self.assertEqual(sorted(chunked), expected)
+        self.assertEqual(ordered, expected)
+
+    def test_row_outputs(self):
+        """Every row output carries the same values as the dict rows"""
+        expected = sorted((user["user_id"], user["age"])
+                          for user in stream_users.stream_users())
+        for output in ("rows", "records"):
+            for arraysize in (None, 5):
+                users = stream_users.stream_users(arraysize, output=output)
+                self.assertEqual(sorted((user["user_id"], user["age"])
+                                        for user in users), expected)
+        batches = batch_processing.stream_users_in_batches(
+            5, keyset=True, columns=["age"], output="tuples")
+        self.assertEqual(sorted(row[0] for batch in batches for row in batch),
+                         sorted(AGES))
+
+    @unittest.skipIf(np is None, "numpy is not installed")
+    def test_numpy_batches(self):
+        """output="numpy" yields structured arrays with compact dtypes"""
+        expected = {user["user_id"]: user
+                    for user in stream_users.stream_users()}
+        batches = list(batch_processing.stream_users_in_batches(
+            5, keyset=True, output="numpy"))
+        self.assertEqual([len(batch) for batch in batches], [5, 5, 2])
+        dtype = batches[0].dtype
+        self.assertEqual(dtype.names,
+                         ("user_id", "name", "email", "age", "updated_at"))
+        self.assertEqual(dtype["age"], np.int32)
+        self.assertEqual(dtype["user_id"], np.dtype("S36"))
+        self.assertEqual(dtype["name"].kind, "S")
+        self.assertEqual(dtype["updated_at"], np.dtype("datetime64[us]"))
+        for row in np.concatenate(batches):
+            user = expected.pop(row["user_id"].decode())
+            self.assertEqual(row["name"].decode(), user["name"])
+            self.assertEqual(row["email"].decode(), user["email"])
+            self.assertEqual(int(row["age"]), user["age"])
+            self.assertEqual(row["updated_at"],
+                             np.datetime64(user["updated_at"], "us"))
+        self.assertEqual(expected, {})
+
+    @unittest.skipIf(pa is None, "pyarrow is not installed")
+    def test_arrow_batches(self):
+        """output="arrow" yields record batches with typed columns"""
+        expected = sorted(stream_users.stream_users(),
+                          key=lambda user: user["user_id"])
+        batches = list(batch_processing.stream_users_in_batches(
+            5, keyset=True, output="arrow"))
+        self.assertEqual([batch.num_rows for batch in batches], [5, 5, 2])
+        table = pa.Table.from_batches(batches)
+        self.assertEqual(table.schema, pa.schema([
+            ("user_id", pa.string()), ("name", pa.string()),
+            ("email", pa.string()), ("age", pa.int32()),
+            ("updated_at", pa.timestamp("us"))]))
+        rows = sorted(table.to_pylist(), key=lambda row: row["user_id"])
+        for row, user in zip(rows, expected):
+            self.assertEqual(
+                (row["user_id"], row["name"], row["email"], row["age"]),
+                (user["user_id"], user["name"], user["email"], user["age"]))
+            self.assertEqual(row["updated_at"],
+                             datetime.datetime.fromisoformat(user["updated_at"]))
+        self.assertEqual(len(rows), len(expected))
+
+    def test_batch_processing_filters_in_sql(self):
+        """batch_processing keeps only users older than 25 in both modes"""
+        expected = sorted(age for age in AGES if age > 25)
+        for keyset in (False, True):
+            ages = sorted(user["age"] for user in
+                          batch_processing.batch_processing(4, keyset=keyset))
+            self.assertEqual(ages, expected)
+
+    def test_projection(self):
+        """Requested columns are the only ones fetched (plus the key)"""
+        batches = batch_processing.stream_users_in_batches(
+            4, keyset=True, where=Age >= 60, columns=["name"])
+        users = [user for batch in batches for user in batch]
+        self.assertEqual(len(users), 2)
+        self.assertEqual(set(users[0]), {"name", "user_id"})
+
+    def test_lazy_pagination_modes_agree(self):
+        """Offset, keyset and prefetching pagination return the same pages"""
+        def ids(pages):
+            return sorted(user["user_id"] for page in pages for user in page)
+
+        expected = ids(lazy_paginate.lazy_pagination(5))
+        self.assertEqual(ids(lazy_paginate.lazy_pagination(5, keyset=True)),
+                         expected)
+        self.assertEqual(ids(lazy_paginate.lazy_pagination(5, prefetch=2)),
+                         expected)
+
+    def test_connections_return_to_pool(self):
+        """Stopping a generator early still returns its connection"""
+        pages = lazy_paginate.lazy_pagination(2, keyset=True, prefetch=1)
+        next(pages)
+        pages.close()
+        batches = batch_processing.stream_users_in_batches(2)
+        next(batches)
+        batches.close()
+        self.assertEqual(seed.get_pool().stats()["in_use"], 0)
+
+    def test_abandoned_row_streams_return_connections(self):
+        """More than POOL_SIZE fetchone streams stopped early do not exhaust the pool"""
+        for _ in range(seed.POOL_SIZE + 1):
+            self.assertEqual(len(list(itertools.islice(stream_users.stream_users(), 2))), 2)
+            ages = stream_ages.stream_user_ages()
+            next(ages)
+            ages.close()
+            for _ in stream_users.stream_users(output="tuples"):
+                break
+        self.assertEqual(seed.get_pool().stats()["in_use"], 0)
+
+    def test_average_age(self):
+        """The streamed ages sum to the seeded ages"""
+        self.assertEqual(sum(stream_ages.stream_user_ages()), sum(AGES))
+        self.assertEqual(sum(stream_ages.stream_user_ages(arraysize=5)),
+                         sum(AGES))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""Tests for incremental "changed since" streaming on the SQLite backend"""
+
+import contextlib
+import importlib
+import io
+import os
+import sqlite3
+import tempfile
+import time
+import unittest
+
+import seed
+from backends import SQLiteBackend
+
+stream_changes = importlib.import_module("5-stream_changes")
+
+
+class TestChangedSince(unittest.TestCase):
+    """Only rows inserted or updated after the watermark are streamed"""
+
+    def setUp(self):
+        """Create a tracked table holding three users"""
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, "t.db")
+        seed.set_backend(SQLiteBackend(self.path))
+        with contextlib.redirect_stdout(io.StringIO()):
+            connection = seed.connect_to_prodev()
+            seed.create_table(connection)
+            connection.close()
+        self.execute(seed.get_backend().insert_sql["ignore"],
+                     ("a", "Ann", "a@x.com", 30), ("b", "Bob", "b@x.com", 40),
+                     ("c", "Cy", "c@x.com", 50))
+
+    def tearDown(self):
+        """Drop the pool and the temporary database"""
+        seed.set_backend(None)
+        self.tmpdir.cleanup()
+
+    def execute(self, query, *rows):
+        """Run a write statement for each row and commit"""
+        time.sleep(0.01)
+        connection = seed.connect_to_prodev()
+        cursor = connection.cursor()
+        cursor.executemany(query, rows)
+        connection.commit()
+        connection.close()
+
+    def changes(self, watermark):
+        """Return the ids streamed since watermark and the new watermark"""
+        ids = []
+        watermark = stream_changes.sync_changes(
+            watermark, lambda user: ids.append(user["user_id"]), batch_size=2)
+        return ids, watermark
+
+    def test_changes_since_watermark(self):
+        """Updates and inserts after the watermark are the only rows seen"""
+        ids, watermark = self.changes(None)
+        self.assertEqual(sorted(ids), ["a", "b", "c"])
+        self.assertEqual(self.changes(watermark), ([], watermark))
+
+        self.execute("UPDATE user_data SET age = %s WHERE user_id = %s",
+                     (31, "a"))
+        self.execute(seed.get_backend().insert_sql["ignore"],
+                     ("d", "Di", "d@x.com", 20))
+        ids, new_watermark = self.changes(watermark)
+        self.assertEqual(ids, ["a", "d"])
+        self.assertEqual(new_watermark[1], "d")
+
+    def test_upsert_touches_row(self):
+        """ON CONFLICT updates from the bulk loader bump updated_at"""
+        _, watermark = self.changes(None)
+        self.execute(seed.get_backend().insert_sql["update"],
+                     ("b", "Bobby", "b@x.com", 41))
+        self.assertEqual(self.changes(watermark)[0], ["b"])
+
+    def test_existing_table_is_migrated(self):
+        """Tables created without updated_at gain the column and index"""
+        path = os.path.join(self.tmpdir.name, "old.db")
+        connection = sqlite3.connect(path)
+        connection.execute("CREATE TABLE user_data (user_id VARCHAR(36) "
+                           "PRIMARY KEY, name TEXT, email TEXT, age INTEGER)")
+        connection.execute("INSERT INTO user_data VALUES ('x', 'X', 'x@x', 1)")
+        connection.commit()
+        connection.close()
+
+        seed.set_backend(SQLiteBackend(path))
+        with contextlib.redirect_stdout(io.StringIO()):
+            connection = seed.connect_to_prodev()
+            seed.create_table(connection)
+            connection.close()
+        ids, watermark = self.changes(None)
+        self.assertEqual(ids, ["x"])
+        self.execute("UPDATE user_data SET age = %s WHERE user_id = %s",
+                     (2, "x"))
+        self.assertEqual(self.changes(watermark)[0], ["x"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""Tests for resumable, checkpointed streams on the SQLite backend"""
+
+import importlib
+import os
+import tempfile
+import unittest
+
+import seed
+from backends import SQLiteBackend
+from checkpoint import FileCheckpoint, TableCheckpoint
+
+batch_processing = importlib.import_module("1-batch_processing")
+lazy_paginate = importlib.import_module("2-lazy_paginate")
+
+USERS = 10
+
+
+class TestCheckpointedStreams(unittest.TestCase):
+    """A stopped job resumes after its last acknowledged batch"""
+
+    def setUp(self):
+        """Create a database with USERS users, all older than 25"""
+        self.tmpdir = tempfile.TemporaryDirectory()
+        seed.set_backend(SQLiteBackend(os.path.join(self.tmpdir.name, "t.db")))
+        connection = seed.connect_to_prodev()
+        cursor = connection.cursor()
+        cursor.execute(seed.get_backend().create_table_sql)
+        cursor.executemany(
+            seed.get_backend().insert_sql["ignore"],
+            [(f"id-{number:02d}", f"User {number}", f"u{number}@x.com", 30)
+             for number in range(USERS)])
+        connection.commit()
+        connection.close()
+        self.state_file = os.path.join(self.tmpdir.name, "state.json")
+
+    def tearDown(self):
+        """Drop the pool and the temporary files"""
+        seed.set_backend(None)
+        self.tmpdir.cleanup()
+
+    def test_pages_resume_after_acknowledged_page(self):
+        """The page being processed when the job stopped is delivered again"""
+        pages = lazy_paginate.lazy_pagination(
+            3, checkpoint=FileCheckpoint(self.state_file, "pages"))
+        seen = [next(pages), next(pages)]
+        pages.close()
+        self.assertEqual(FileCheckpoint(self.state_file, "pages").load(),
+                         "id-02")
+
+        resumed = list(lazy_paginate.lazy_pagination(
+            3, checkpoint=FileCheckpoint(self.state_file, "pages")))
+        self.assertEqual(resumed[0], seen[1])
+        ids = [user["user_id"] for page in resumed for user in page]
+        self.assertEqual(ids, [f"id-{number:02d}" for number in range(3, USERS)])
+
+    def test_finished_pass_clears_checkpoint(self):
+        """A completed run starts the next run from the beginning"""
+        checkpoint = FileCheckpoint(self.state_file, "full")
+        self.assertEqual(len(list(lazy_paginate.lazy_pagination(
+            4, checkpoint=checkpoint))), 3)
+        self.assertIsNone(checkpoint.load())
+
+    def test_every_n_batches_saves_on_close(self):
+        """Acknowledged batches not yet saved are recorded on close"""
+        checkpoint = TableCheckpoint("users", every=10)
+        users = batch_processing.batch_processing(2, checkpoint=checkpoint)
+        for _ in range(5):
+            next(users)
+        users.close()
+        self.assertEqual(checkpoint.load(), "id-03")
+
+        resumed = [user["user_id"] for user in batch_processing.batch_processing(
+            2, checkpoint=TableCheckpoint("users"))]
+        self.assertEqual(resumed[0], "id-04")
+        self.assertEqual(len(resumed), USERS - 4)
+
+
+if __name__ == "__main__":
+    unittest.main()
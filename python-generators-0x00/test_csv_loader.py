@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+"""Unit tests for the parallel CSV loader"""
+
+import csv
+import os
+import tempfile
+import unittest
+
+import seed
+from csv_loader import parse_csv_parallel, split_csv
+
+
+class TestParallelCsv(unittest.TestCase):
+    """Tests for line-aligned splitting and process-pool parsing"""
+
+    def setUp(self):
+        """Write a CSV with a few invalid rows"""
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.filename = os.path.join(self.tmpdir.name, "user_data.csv")
+        with open(self.filename, "w", newline="", encoding="utf-8") as file:
+            writer = csv.writer(file)
+            writer.writerow(["name", "email", "age"])
+            for number in range(500):
+                age = "" if number % 50 == 0 else number % 90
+                writer.writerow([f"Usér, {number}", f"u{number}@x.com", age])
+
+    def tearDown(self):
+        """Remove the temporary CSV"""
+        self.tmpdir.cleanup()
+
+    def test_spans_end_on_line_boundaries(self):
+        """Spans cover the file after the header and each ends with a newline"""
+        header, spans = split_csv(self.filename, chunk_bytes=700)
+        self.assertEqual(header, ["name", "email", "age"])
+        self.assertGreater(len(spans), 5)
+        with open(self.filename, "rb") as file:
+            data = file.read()
+        self.assertEqual(spans[-1][1], len(data))
+        for (_, end), (start, _) in zip(spans, spans[1:]):
+            self.assertEqual(end, start)
+            self.assertEqual(data[end - 1:end], b"\n")
+
+    def test_parallel_matches_serial(self):
+        """Parallel parsing yields the same rows and rejects as the serial path"""
+        def summary(batches):
+            batches = list(batches)
+            values = sorted(value[1:] for _, valid in batches for value in valid)
+            return sum(rows for rows, _ in batches), values, batches
+
+        serial_rows, serial_values, _ = summary(
+            seed.parse_csv_batches(self.filename, 64))
+        rows, values, batches = summary(parse_csv_parallel(
+            self.filename, 64, workers=2, chunk_bytes=2000, queue_size=2))
+        self.assertEqual(rows, 500)
+        self.assertEqual(rows, serial_rows)
+        self.assertEqual(values, serial_values)
+        self.assertEqual(len(values), 490)
+        self.assertTrue(all(len(valid) <= 64 for _, valid in batches))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""Unit tests for the generator instrumentation wrapper"""
+
+import time
+import unittest
+
+from instrumentation import StreamReport, instrument
+
+
+def slow_batches(count, size, delay):
+    """Yield ``count`` batches of ``size`` rows, sleeping before each"""
+    for number in range(count):
+        time.sleep(delay)
+        yield [{"user_id": number, "age": age} for age in range(size)]
+
+
+class TestInstrument(unittest.TestCase):
+    """Tests for instrument() and StreamReport"""
+
+    def test_counts_rows_and_batches(self):
+        """Batches count their rows; single items count as one row"""
+        report = StreamReport()
+        batches = list(instrument(slow_batches(3, 4, 0), report))
+        self.assertEqual(len(batches), 3)
+        self.assertEqual((report.rows, report.batches), (12, 3))
+        self.assertTrue(report.finished)
+
+        rows = StreamReport()
+        list(instrument(iter([{"age": 1}, {"age": 2}]), rows))
+        self.assertEqual((rows.rows, rows.batches), (2, 0))
+
+    def test_producer_and_consumer_time(self):
+        """Time in next() and time in the loop body are measured separately"""
+        report = StreamReport()
+        for _ in instrument(slow_batches(3, 1, 0.02), report):
+            time.sleep(0.04)
+        self.assertGreaterEqual(report.producer_seconds, 0.05)
+        self.assertGreaterEqual(report.consumer_seconds, 0.1)
+        self.assertGreater(report.consumer_seconds, report.producer_seconds)
+        self.assertGreater(report.rows_per_sec, 0)
+
+    def test_peak_memory(self):
+        """The peak traced allocation covers the rows materialized"""
+        report = StreamReport()
+        list(instrument(slow_batches(2, 10000, 0), report))
+        self.assertGreater(report.peak_memory, 10000 * 100)
+
+    def test_callback_on_close(self):
+        """Closing early closes the stream and still emits the report"""
+        closed = []
+
+        def stream():
+            try:
+                yield from slow_batches(10, 1, 0)
+            finally:
+                closed.append(True)
+
+        reports = []
+        items = instrument(stream(), callback=reports.append,
+                           trace_memory=False)
+        next(items)
+        items.close()
+        self.assertEqual(closed, [True])
+        self.assertEqual(len(reports), 1)
+        self.assertFalse(reports[0].finished)
+        self.assertEqual(reports[0].as_dict()["batches"], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""Unit tests for the pipeline stages"""
+
+import threading
+import time
+import unittest
+
+import pipeline as pl
+
+
+def square(value):
+    """Module-level function so process pools can pickle it"""
+    return value * value
+
+
+class TestStages(unittest.TestCase):
+    """Tests for the individual stages run through pipeline()"""
+
+    def test_batch_filter_map(self):
+        """Stages compose in order"""
+        result = list(pl.pipeline(
+            range(10),
+            pl.filter(lambda value: value % 2 == 0),
+            pl.map(lambda value: value + 1),
+            pl.batch(2)))
+        self.assertEqual(result, [[1, 3], [5, 7], [9]])
+
+    def test_window(self):
+        """Sliding and stepped windows"""
+        self.assertEqual(list(pl.window(3)(range(5))),
+                         [(0, 1, 2), (1, 2, 3), (2, 3, 4)])
+        self.assertEqual(list(pl.window(2, step=3)(range(8))),
+                         [(0, 1), (3, 4), (6, 7)])
+
+    def test_parallel_map_ordered(self):
+        """Ordered parallel_map keeps input order across threads"""
+        result = list(pl.pipeline(range(50), pl.parallel_map(square, workers=4)))
+        self.assertEqual(result, [value * value for value in range(50)])
+
+    def test_parallel_map_unordered_processes(self):
+        """Unordered parallel_map on a process pool returns every result"""
+        result = pl.pipeline(range(20), pl.parallel_map(
+            square, workers=2, ordered=False, processes=True))
+        self.assertEqual(sorted(result), [value * value for value in range(20)])
+
+    def test_sink_and_run(self):
+        """run() returns the sink's item count"""
+        seen = []
+        count = pl.run(range(7), pl.batch(3), pl.sink(seen.append))
+        self.assertEqual(count, 3)
+        self.assertEqual(seen, [[0, 1, 2], [3, 4, 5], [6]])
+
+    def test_backpressure_bounds_source(self):
+        """A slow consumer stops the source from running far ahead"""
+        produced = []
+
+        def source():
+            for value in range(1000):
+                produced.append(value)
+                yield value
+
+        items = pl.pipeline(source(), pl.map(lambda value: value), buffer=2)
+        next(items)
+        time.sleep(0.1)
+        self.assertLess(len(produced), 20)
+        items.close()
+
+    def test_close_stops_threads(self):
+        """Closing the pipeline early joins every stage thread"""
+        before = threading.active_count()
+        items = pl.pipeline(iter(range(10 ** 6)), pl.batch(10), buffer=1)
+        next(items)
+        items.close()
+        self.assertEqual(threading.active_count(), before)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""Unit tests for the connection pool, using SQLite as a stand-in backend"""
+
+import sqlite3
+import threading
+import unittest
+
+from pool import ConnectionPool, PoolTimeout
+
+
+def connect_sqlite():
+    """Open an in-memory SQLite connection usable from any thread"""
+    return sqlite3.connect(":memory:", check_same_thread=False)
+
+
+class TestConnectionPool(unittest.TestCase):
+    """Tests for ConnectionPool"""
+
+    def setUp(self):
+        """Create a small pool for each test"""
+        self.pool = ConnectionPool(connect_sqlite, size=2, timeout=0.2)
+
+    def tearDown(self):
+        """Close all idle connections"""
+        self.pool.close()
+
+    def test_close_returns_connection_for_reuse(self):
+        """A closed connection is handed to the next borrower"""
+        first = self.pool.acquire()
+        raw = first._connection
+        first.close()
+        second = self.pool.acquire()
+        self.assertIs(second._connection, raw)
+        second.close()
+        stats = self.pool.stats()
+        self.assertEqual(stats["created"], 1)
+        self.assertEqual(stats["reused"], 1)
+        self.assertEqual(stats["checkouts"], 2)
+
+    def test_proxy_behaves_like_connection(self):
+        """The pooled proxy forwards cursor() and works as a context manager"""
+        with self.pool.acquire() as connection:
+            cursor = connection.cursor()
+            cursor.execute("SELECT 1")
+            self.assertEqual(cursor.fetchone(), (1,))
+        self.assertEqual(self.pool.stats()["idle"], 1)
+
+    def test_size_limit_times_out(self):
+        """Checkout blocks at the size limit and raises after the timeout"""
+        held = [self.pool.acquire(), self.pool.acquire()]
+        with self.assertRaises(PoolTimeout):
+            self.pool.acquire()
+        stats = self.pool.stats()
+        self.assertEqual(stats["in_use"], 2)
+        self.assertEqual(stats["waits"], 1)
+        for connection in held:
+            connection.close()
+
+    def test_waiter_gets_released_connection(self):
+        """A blocked checkout is served as soon as a connection is returned"""
+        held = [self.pool.acquire(), self.pool.acquire()]
+        borrowed = []
+        waiter = threading.Thread(
+            target=lambda: borrowed.append(self.pool.acquire()))
+        waiter.start()
+        held[0].close()
+        waiter.join()
+        self.assertEqual(len(borrowed), 1)
+        self.assertEqual(self.pool.stats()["created"], 2)
+        borrowed[0].close()
+        held[1].close()
+
+    def test_failed_health_check_replaces_connection(self):
+        """An idle connection that fails its ping is discarded on checkout"""
+        connection = self.pool.acquire()
+        raw = connection._connection
+        connection.close()
+        raw.close()
+        replacement = self.pool.acquire()
+        self.assertIsNot(replacement._connection, raw)
+        replacement.close()
+        stats = self.pool.stats()
+        self.assertEqual(stats["failed_checks"], 1)
+        self.assertEqual(stats["open"], 1)
+
+    def test_release_rolls_back_open_transaction(self):
+        """Uncommitted work is rolled back when a connection is returned"""
+        connection = self.pool.acquire()
+        connection.execute("CREATE TABLE t (x INTEGER)")
+        connection.commit()
+        connection.execute("INSERT INTO t VALUES (1)")
+        connection.close()
+        with self.pool.acquire() as connection:
+            count = connection.execute("SELECT COUNT(*) FROM t").fetchone()
+        self.assertEqual(count, (0,))
+
+    def test_double_close_releases_once(self):
+        """Closing a pooled connection twice does not duplicate it"""
+        connection = self.pool.acquire()
+        connection.close()
+        connection.close()
+        self.assertEqual(self.pool.stats()["idle"], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()